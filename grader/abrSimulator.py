@@ -0,0 +1,150 @@
+#!/usr/bin/env python3.12
+
+import logging
+logging.basicConfig(
+    level=logging.INFO,
+    format="[ %(filename)-34s ]:%(lineno)-3d  [%(levelname)4s]  %(message)s"
+)
+
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from pint import Quantity
+
+from utils.AbrSimulator import AbrSimulator, BandwidthTrace, SimulatedTitle
+from utils.ProxyLogFileParser import ProxyLogTable
+
+# Same constants as tests/TestBitrateAdaptation.py
+TEST_BANDWIDTH_BITRATE_MULTIPLIER = 1.8
+
+def checkTargetBitrateReachedButNotExceeded(entries, targetBitrate):
+    if not entries:
+        return "Nothing written to the log"
+    if not np.all(entries.bitrateChosen <= targetBitrate):
+        return "Target bitrate exceeded"
+    if not np.any(entries.bitrateChosen == targetBitrate):
+        return "Target bitrate not reached"
+    return None
+
+def checkBitrateDowngraded(entries, targetBitrate):
+    if not entries:
+        return "Nothing written to the log"
+    bitrates = entries.bitrateChosen
+    if not np.all(bitrates[1:] <= bitrates[:-1]):
+        return "Bitrates are not monotonically decreasing"
+    if not np.any(bitrates[1:] == targetBitrate):
+        return "Target bitrate not reached"
+    return None
+
+def steadyStateScenario(simulator, contentPath):
+    """
+        test01_BitrateAdaptationSteadyState
+    """
+    title = SimulatedTitle.load(contentPath, "/wing_it/wing_it.m3u8")
+    for bitrate in (1300000, 4000000, 13000000):
+        targetBitrate = Quantity(bitrate, "bits / second")
+        simulator.setBandwidth(bitrate * TEST_BANDWIDTH_BITRATE_MULTIPLIER)
+        simulator.openPlayer(title)
+        simulator.playUntil(25)
+        simulator.closePlayer()
+        yield targetBitrate, checkTargetBitrateReachedButNotExceeded(simulator.parseNewEntries(), targetBitrate)
+
+def dynamicScenario(simulator, contentPath):
+    """
+        test02_BitrateAdaptationDynamic
+    """
+    title = SimulatedTitle.load(contentPath, "/charge/charge.m3u8")
+    steps = (
+        (3000000, 10, None, checkTargetBitrateReachedButNotExceeded),
+        (6000000, None, 20, checkTargetBitrateReachedButNotExceeded),
+        (24000000, None, 25, checkTargetBitrateReachedButNotExceeded),
+        (10000000, None, 20, checkBitrateDowngraded),
+        (3000000, None, 20, checkBitrateDowngraded),
+        (40000000, None, 30, checkTargetBitrateReachedButNotExceeded),
+    )
+    for bitrate, until, duration, check in steps:
+        targetBitrate = Quantity(bitrate, "bits / second")
+        simulator.setBandwidth(bitrate * TEST_BANDWIDTH_BITRATE_MULTIPLIER)
+        if until is not None:
+            simulator.openPlayer(title)
+            simulator.playUntil(until)
+        else:
+            simulator.playFor(duration)
+        yield targetBitrate, check(simulator.parseNewEntries(), targetBitrate)
+    simulator.closePlayer()
+
+SCENARIOS = {
+    "steady-state": steadyStateScenario,
+    "dynamic": dynamicScenario,
+}
+
+def formatEntry(entry):
+    """
+        Log line of entry, as miProxy writes it
+    """
+    return " ".join((
+        entry.browserIP,
+        entry.segmentName,
+        entry.adapatationProxyIP,
+        f"{entry.segmentTransferTime.to('seconds').magnitude:.6f}",
+        f"{entry.segmentTransferThroughput.to('kilobits / second').magnitude:.3f}",
+        f"{entry.averageConnectionThroughput.to('kilobits / second').magnitude:.3f}",
+        f"{entry.bitrateChosen.to('kilobits / second').magnitude}",
+    ))
+
+if __name__ == "__main__":
+
+    DEFAULT_CONTENT_PATH = "./www"
+    DEFAULT_ADAPTATION_GAIN = 0.5
+    DEFAULT_ADAPTATION_BITRATE_MULTIPLIER = 1.5
+
+    parser = argparse.ArgumentParser(description="Offline trace-driven simulation of miProxy's bitrate adaptation")
+    parser.add_argument("--content-path", type=str, nargs="?", default=DEFAULT_CONTENT_PATH,
+                        help="path to the web server's content")
+    parser.add_argument("--adaptation-gain", type=float, nargs="?", default=DEFAULT_ADAPTATION_GAIN,
+                        help="weight of the latest segment throughput in the EWMA estimate")
+    parser.add_argument("--adaptation-bitrate-multiplier", type=float, nargs="?",
+                        default=DEFAULT_ADAPTATION_BITRATE_MULTIPLIER,
+                        help="estimated throughput needed per bit/s of the chosen bitrate")
+    parser.add_argument("--latency", type=float, nargs="?", default=0.0,
+                        help="seconds before the first byte of every transfer arrives")
+    parser.add_argument("--scenario", type=str, choices=list(SCENARIOS), default=None,
+                        help="replay a TestBitrateAdaptation test and report its checks")
+    parser.add_argument("--manifest", type=str, nargs="?", default="/wing_it/wing_it.m3u8",
+                        help="URL path of the master playlist to play (without --scenario)")
+    parser.add_argument("--trace", type=str, nargs="?", default=None,
+                        help="file of 'SECONDS RATE' lines giving the link bandwidth over time (without --scenario)")
+    parser.add_argument("--play-until", type=float, nargs="?", default=60,
+                        help="playback position in seconds at which to stop (without --scenario)")
+    parser.add_argument("--log-file-name", type=str, nargs="?", default=None,
+                        help="also write the proxy log lines to this file")
+
+    args = parser.parse_args()
+
+    simulator = AbrSimulator(args.adaptation_gain, args.adaptation_bitrate_multiplier, latency=args.latency)
+    # pint builds its unit registry on first use; keep that out of the timing
+    Quantity(0, "seconds")
+    startedAt = time.perf_counter()
+    failures = 0
+    if args.scenario is not None:
+        for targetBitrate, failure in SCENARIOS[args.scenario](simulator, args.content_path):
+            logging.info(f"[ {targetBitrate} ] {failure or 'OK'}")
+            failures += failure is not None
+    else:
+        if args.trace is None:
+            parser.error("--trace is required without --scenario")
+        simulator.trace = BandwidthTrace.load(args.trace)
+        simulator.openPlayer(SimulatedTitle.load(args.content_path, args.manifest))
+        simulator.playUntil(args.play_until)
+        simulator.closePlayer()
+    elapsed = time.perf_counter() - startedAt
+
+    if args.log_file_name is not None:
+        with open(args.log_file_name, "w") as logFile:
+            logFile.writelines(formatEntry(entry) + "\n" for entry in ProxyLogTable.fromRows(simulator.entries))
+    logging.info(f"{len(simulator.entries)} segments over {simulator.now:.1f} simulated seconds, "
+                 f"{simulator.stalls} stalls ({simulator.stallDuration:.2f} s), simulated in {elapsed * 1000:.1f} ms")
+    sys.exit(1 if failures else 0)
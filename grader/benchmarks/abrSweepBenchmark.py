@@ -0,0 +1,102 @@
+#!/usr/bin/env python3.12
+
+"""
+    Measure how many bitrate decisions per second AbrSweep evaluates, compared to
+    stepping ThroughputEstimator through the same traces one segment at a time.
+
+    Generates random step traces over the ladder of a title (the link switching
+    between 1.8x the title's bitrates, plus some noise) and sweeps a grid of
+    adaptation gains and bitrate multipliers over all of them, timed by the
+    segment durations of the title's lowest bitrate rendition.
+
+    Run from within the grader directory:
+        ./benchmarks/abrSweepBenchmark.py --traces 2000 --segments 200
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.getcwd())
+
+from utils.AbrSweep import AbrSweep
+from utils.HlsPlaylist import parsePlaylist
+from utils.ThroughputEstimator import ThroughputEstimator
+
+def makeTraces(bitrates, traceCount, segmentCount, seed):
+    """
+        Throughputs of traces holding 1.8x a random bitrate for about 12
+        segments at a time, plus up to 10% noise
+    """
+    rng = np.random.default_rng(seed)
+    changes = rng.random((traceCount, segmentCount)) < 1 / 12
+    changes[:, 0] = True
+    levels = rng.integers(0, len(bitrates), size=(traceCount, segmentCount))
+    # Every segment holds the level drawn at the latest change
+    latestChange = np.maximum.accumulate(np.where(changes, np.arange(segmentCount), 0), axis=1)
+    held = np.take_along_axis(levels, latestChange, axis=1)
+    return np.asarray(bitrates)[held] * 1.8 * rng.uniform(1, 1.1, size=(traceCount, segmentCount))
+
+def runScalar(bitrates, gains, multipliers, throughputs):
+    decisions = 0
+    for gain in gains:
+        for multiplier in multipliers:
+            for trace in throughputs:
+                estimator = ThroughputEstimator(gain, multiplier, min(bitrates))
+                for throughput in trace:
+                    estimator.chooseBitrate(bitrates)
+                    estimator.update(throughput)
+                    decisions += 1
+    return decisions
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="AbrSweep decisions per second benchmark")
+    parser.add_argument("--manifest", type=str, default="./www/charge/charge.m3u8",
+                        help="master playlist whose ladder is used")
+    parser.add_argument("--traces", type=int, default=2000,
+                        help="number of random traces")
+    parser.add_argument("--segments", type=int, default=200,
+                        help="segments per trace")
+    parser.add_argument("--gains", type=int, default=10,
+                        help="number of adaptation gains in the grid, spread over (0, 1]")
+    parser.add_argument("--multipliers", type=int, default=11,
+                        help="number of bitrate multipliers in the grid, spread over [1, 2]")
+    parser.add_argument("--scalar-traces", type=int, default=20,
+                        help="number of traces the per-segment loop is timed on")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="seed of the random traces")
+
+    args = parser.parse_args()
+
+    with open(args.manifest, "r") as manifestFile:
+        ladder = parsePlaylist(manifestFile.read()).ladder
+    bitrates = [rendition.bandwidth for rendition in ladder]
+    with open(os.path.join(os.path.dirname(args.manifest), ladder[0].uri), "r") as mediaFile:
+        # Repeated as often as the traces need
+        segmentDurations = np.resize(parsePlaylist(mediaFile.read()).segments.durations, args.segments)
+    gains = np.linspace(0.1, 1, args.gains)
+    multipliers = np.linspace(1, 2, args.multipliers)
+    throughputs = makeTraces(bitrates, args.traces, args.segments, args.seed)
+
+    sweep = AbrSweep(bitrates, gains, multipliers)
+    start = time.perf_counter()
+    result = sweep.run(throughputs, segmentDurations)
+    vectorized = time.perf_counter() - start
+
+    start = time.perf_counter()
+    scalarDecisions = runScalar(bitrates, gains, multipliers, throughputs[:args.scalar_traces])
+    scalar = time.perf_counter() - start
+
+    print(f"{'engine':12}{'decisions':>14}{'seconds':>10}{'decisions/s':>16}")
+    print(f"{'AbrSweep':12}{result.decisions:>14}{vectorized:>10.3f}{result.decisions / vectorized:>16.0f}")
+    print(f"{'per-segment':12}{scalarDecisions:>14}{scalar:>10.3f}{scalarDecisions / scalar:>16.0f}")
+    print()
+    print(f"{'gain':>6}{'multiplier':>12}{'to target s':>13}{'unreached':>11}{'switches':>10}{'overshoot':>11}")
+    best = sorted(result.rows(), key=lambda row: (row["overshoot"] + row["unreached"], row["timeToTarget"]))
+    for row in best[:10]:
+        print(f"{row['gain']:>6.2f}{row['multiplier']:>12.2f}{row['timeToTarget']:>13.2f}{row['unreached']:>11.3f}"
+              f"{row['switches']:>10.1f}{row['overshoot']:>11.3f}")
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3.12
+
+"""
+    Measure the cost of one ProxyLogFileParser.parseNewEntries() call as the
+    proxy log grows, compared to rescanning the log from its first line on
+    every call as the parsers used to.
+
+    Grows a log to a few million lines in steps. At each step, appends a batch
+    of entries (what miProxy logs between two checks of a test) and times the
+    call that parses them.
+
+    Run from within the grader directory:
+        ./benchmarks/logTailBenchmark.py --lines 4000000 --steps 4
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.getcwd())
+
+from pint import Quantity
+
+from utils.ProxyLogFileParser import ProxyLogFileEntry, ProxyLogFileParser
+
+LINE = "10.0.0.{client} /charge/charge_480p_{segment:04d}.ts 10.0.1.100 0.812345 12345.678 11234.567 10000.0\n"
+
+def appendLines(logFile, start, count):
+    chunk = 100000
+    for offset in range(start, start + count, chunk):
+        logFile.write("".join(LINE.format(client=idx % 250 + 1, segment=idx % 45)
+                              for idx in range(offset, min(offset + chunk, start + count))))
+    logFile.flush()
+
+def parseEntry(line):
+    tokens = line.rstrip("\n").split(" ")
+    return ProxyLogFileEntry(
+        browserIP=tokens[0],
+        segmentName=tokens[1],
+        adapatationProxyIP=tokens[2],
+        segmentTransferTime=Quantity(float(tokens[3]), "seconds"),
+        segmentTransferThroughput=Quantity(float(tokens[4]), "kilobits / second"),
+        averageConnectionThroughput=Quantity(float(tokens[5]), "kilobits / second"),
+        bitrateChosen=Quantity(float(tokens[6]), "kilobits / second")
+    )
+
+def rescanNewEntries(parser):
+    """
+        parseNewEntries() as it was: walk the log from its first line and
+        skip the entries parsed before
+    """
+    logEntries = []
+    with open(parser.logFilePath, "r") as logFile:
+        for idx, line in enumerate(logFile):
+            if idx > parser.lastParsedEntryIdx:
+                logEntries.append(parseEntry(line))
+                parser.lastParsedEntryIdx = idx
+    return logEntries
+
+def timeCalls(parseNewEntries, logFile, written, batch, calls):
+    elapsed = 0.0
+    for _ in range(calls):
+        appendLines(logFile, written, batch)
+        written += batch
+        start = time.perf_counter()
+        entries = parseNewEntries()
+        elapsed += time.perf_counter() - start
+        assert len(entries) == batch
+    return elapsed / calls, written
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Log tail-following benchmark")
+    parser.add_argument("--lines", type=int, default=4000000,
+                        help="lines in the log at the last step")
+    parser.add_argument("--steps", type=int, default=4,
+                        help="number of log sizes measured")
+    parser.add_argument("--batch", type=int, default=20,
+                        help="entries appended before every call")
+    parser.add_argument("--calls", type=int, default=5,
+                        help="calls timed per log size and parser")
+    parser.add_argument("--directory", type=str, default=None,
+                        help="where the log is written (default: temporary directory)")
+
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.directory) as directory:
+        logPath = os.path.join(directory, "proxy_log.txt")
+        with open(logPath, "w") as logFile:
+            appendLines(logFile, 0, args.batch)
+            written = args.batch
+            tail = ProxyLogFileParser(logPath)
+            rescan = ProxyLogFileParser(logPath)
+            tail.parseNewEntries()
+            rescanNewEntries(rescan)
+
+            print(f"{'log lines':>12}{'log MB':>9}{'tail ms/call':>15}{'rescan ms/call':>17}")
+            for step in range(1, args.steps + 1):
+                target = args.lines * step // args.steps
+                if target > written:
+                    appendLines(logFile, written, target - written)
+                    written = target
+                # Catch each parser up without parsing the filler into entries
+                tail.logFileTail.readNewLines()
+                tailTime, written = timeCalls(tail.parseNewEntries, logFile, written, args.batch, args.calls)
+                rescan.lastParsedEntryIdx = written - 1
+                rescanTime, written = timeCalls(lambda: rescanNewEntries(rescan), logFile, written,
+                                                args.batch, args.calls)
+                print(f"{written:>12}{os.path.getsize(logPath) / 1e6:>9.0f}{tailTime * 1e3:>15.3f}"
+                      f"{rescanTime * 1e3:>17.1f}")
+            tail.close()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3.12
+
+"""
+    Compare segment delivery throughput of webserver.py with and without sendfile(2),
+    against the original server: a stock SimpleHTTPRequestHandler, whose copyfile()
+    copies bodies through user space with shutil.copyfileobj's default buffer.
+
+    Starts each server as a subprocess, hammers it with keep-alive clients that
+    repeatedly fetch the largest .ts segments under the content path, and reports
+    the bytes/sec delivered per CPU-second consumed by the server process.
+
+    Run from within the grader directory:
+        ./benchmarks/sendfileBenchmark.py --duration 10 --clients 8
+"""
+
+import argparse
+import http.client
+import os
+import resource
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+# webserver.py as it was before sendfile(2), minus its logging
+BASELINE_SERVER = """
+import functools, http.server, sys
+class RequestHandler(http.server.SimpleHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    def log_message(self, format, *args):
+        pass
+handler = functools.partial(RequestHandler, directory=sys.argv[3])
+http.server.ThreadingHTTPServer((sys.argv[1], int(sys.argv[2])), handler).serve_forever()
+"""
+MODES = ("baseline", "copyfileobj", "sendfile")
+
+def findSegments(contentPath, count):
+    segments = []
+    for root, _, files in os.walk(contentPath):
+        for name in files:
+            if name.endswith(".ts"):
+                path = os.path.join(root, name)
+                segments.append((os.path.getsize(path), "/" + os.path.relpath(path, contentPath)))
+    segments.sort(reverse=True)
+    return [urlPath for _, urlPath in segments[:count]]
+
+def findFreePort(host):
+    with socket.socket() as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+def waitForServer(host, port, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"web server on {host}:{port} did not come up")
+
+def runClient(host, port, segments, stopEvent, totals, lock):
+    connection = http.client.HTTPConnection(host, port)
+    received = 0
+    idx = 0
+    while not stopEvent.is_set():
+        connection.request("GET", segments[idx % len(segments)])
+        response = connection.getresponse()
+        while chunk := response.read(1024 * 1024):
+            received += len(chunk)
+        idx += 1
+    connection.close()
+    with lock:
+        totals["bytes"] += received
+        totals["requests"] += idx
+
+def runBenchmark(args, mode):
+    port = findFreePort(args.host)
+    before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    if mode == "baseline":
+        command = [sys.executable, "-c", BASELINE_SERVER, args.host, f"{port}", args.content_path]
+    else:
+        command = [sys.executable, "./webserver.py",
+                   "--host", args.host,
+                   "--port", f"{port}",
+                   "--content-path", args.content_path,
+                   "--sendfile" if mode == "sendfile" else "--no-sendfile"]
+    server = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        waitForServer(args.host, port)
+        segments = findSegments(args.content_path, args.segments)
+        stopEvent = threading.Event()
+        totals = {"bytes": 0, "requests": 0}
+        lock = threading.Lock()
+        clients = [
+            threading.Thread(target=runClient, args=(args.host, port, segments, stopEvent, totals, lock))
+            for _ in range(args.clients)
+        ]
+        start = time.monotonic()
+        for client in clients:
+            client.start()
+        time.sleep(args.duration)
+        stopEvent.set()
+        for client in clients:
+            client.join()
+        elapsed = time.monotonic() - start
+    finally:
+        server.terminate()
+        server.wait()
+    after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpuSeconds = (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime)
+    return totals["bytes"], totals["requests"], elapsed, cpuSeconds
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="webserver.py sendfile benchmark")
+    parser.add_argument("--host", type=str, default="127.0.0.1",
+                        help="address the web server binds to")
+    parser.add_argument("--content-path", type=str, default="./www",
+                        help="path to content to be served")
+    parser.add_argument("--duration", type=float, default=5,
+                        help="seconds to run each configuration for")
+    parser.add_argument("--clients", type=int, default=4,
+                        help="number of concurrent keep-alive clients")
+    parser.add_argument("--segments", type=int, default=16,
+                        help="number of (largest) segments to cycle through")
+
+    args = parser.parse_args()
+
+    if not os.path.exists("./webserver.py"):
+        print("Invoke the benchmark from within the grader directory!")
+        sys.exit(1)
+
+    print(f"{'mode':12}{'requests':>10}{'MB/s':>10}{'server CPU s':>14}{'MB/s per core':>16}")
+    for mode in MODES:
+        nbytes, requests, elapsed, cpuSeconds = runBenchmark(args, mode)
+        throughput = nbytes / elapsed / 1e6
+        perCore = nbytes / cpuSeconds / 1e6 if cpuSeconds > 0 else float("inf")
+        print(f"{mode:12}{requests:>10}{throughput:>10.1f}{cpuSeconds:>14.2f}{perCore:>16.1f}")
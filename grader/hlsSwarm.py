@@ -0,0 +1,96 @@
+#!/usr/bin/env python3.12
+
+import logging
+logging.basicConfig(
+    level=logging.INFO,
+    format="[ %(filename)-34s ]:%(lineno)-3d  [%(levelname)4s]  %(message)s"
+)
+
+import argparse
+import asyncio
+import resource
+import statistics
+import time
+
+from urllib.parse import urlencode
+
+from utils.HlsClient import HlsSession
+
+def makePlayerUrl(baseUrl, manifestPath):
+    return baseUrl + "?" + urlencode({"manifest" : manifestPath})
+
+def raiseOpenFileLimit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return hard
+
+async def runSwarm(args, playerUrl):
+    sessions = [
+        HlsSession(playerUrl, level=args.level, maxBufferLength=args.max_buffer_length,
+                   fetchPlayer=args.fetch_player,
+                   localAddress=args.source_ip[idx % len(args.source_ip)] if args.source_ip else None)
+        for idx in range(args.clients)
+    ]
+    async def runSession(idx, session):
+        await asyncio.sleep(args.ramp_up * idx / max(len(sessions), 1))
+        await session.play(args.play_until)
+    results = await asyncio.gather(*(runSession(idx, session) for idx, session in enumerate(sessions)),
+                                   return_exceptions=True)
+    failures = [result for result in results if isinstance(result, BaseException)]
+    for failure in failures[:5]:
+        logging.warning(f"Session failed: {failure!r}")
+    return [session.stats() for session in sessions], len(failures)
+
+if __name__ == "__main__":
+
+    DEFAULT_BASE_URL = "http://localhost:9000/player.html"
+    DEFAULT_MANIFEST = "/wing_it/wing_it.m3u8"
+
+    parser = argparse.ArgumentParser(description="Swarm of headless HLS players playing through miProxy")
+    parser.add_argument("--base-url", type=str, nargs="?", default=DEFAULT_BASE_URL,
+                        help="URL of player.html on the proxy")
+    parser.add_argument("--manifest", type=str, nargs="?", default=DEFAULT_MANIFEST,
+                        help="URL path of the master playlist to play")
+    parser.add_argument("--clients", type=int, nargs="?", default=100,
+                        help="number of concurrent players")
+    parser.add_argument("--play-until", type=float, nargs="?", default=25,
+                        help="playback position in seconds at which every player stops")
+    parser.add_argument("--ramp-up", type=float, nargs="?", default=0,
+                        help="seconds over which player starts are spread")
+    parser.add_argument("--level", type=int, nargs="?", default=0,
+                        help="rendition requested by the players (index into the master playlist's renditions "
+                             "by increasing bitrate, 0 being the lowest as in hls.js)")
+    parser.add_argument("--max-buffer-length", type=float, nargs="?", default=HlsSession.MAX_BUFFER_LENGTH,
+                        help="seconds of media the players buffer ahead of the playhead")
+    parser.add_argument("--fetch-player", action=argparse.BooleanOptionalAction, default=True,
+                        help="fetch player.html and hls.min.js before the playlists, as a browser does")
+    parser.add_argument("--source-ip", type=str, action="append", default=[],
+                        help="local address players connect from, spread round-robin (repeatable); "
+                             "miProxy adapts per browser IP")
+
+    args = parser.parse_args()
+
+    openFileLimit = raiseOpenFileLimit()
+    if args.clients >= openFileLimit:
+        logging.warning(f"{args.clients} players may exceed the open file limit ({openFileLimit})")
+
+    playerUrl = makePlayerUrl(args.base_url, args.manifest)
+    logging.info(f"Starting {args.clients} players on {playerUrl}")
+    startedAt = time.perf_counter()
+    stats, failures = asyncio.run(runSwarm(args, playerUrl))
+    elapsed = time.perf_counter() - startedAt
+
+    totalBytes = sum(session.bytes for session in stats)
+    startupDelays = sorted(session.startupDelay for session in stats if session.startupDelay is not None)
+    logging.info(f"{len(stats)} players ({failures} failed) in {elapsed:.1f} s: "
+                 f"{sum(session.segments for session in stats)} segments, {totalBytes / 1e6:.1f} MB "
+                 f"({totalBytes * 8 / elapsed / 1e6:.1f} Mbit/s), "
+                 f"{sum(session.errors for session in stats)} failed fetches")
+    if startupDelays:
+        logging.info(f"Startup delay: median {statistics.median(startupDelays):.3f} s, "
+                     f"max {startupDelays[-1]:.3f} s")
+    if stats:
+        logging.info(f"Stalls: {sum(session.stalls for session in stats)} "
+                     f"({sum(session.stallDuration for session in stats):.2f} s in total), "
+                     f"mean position reached {statistics.fmean(session.position for session in stats):.1f} s")
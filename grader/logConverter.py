@@ -0,0 +1,65 @@
+#!/usr/bin/env python3.12
+
+import logging
+logging.basicConfig(
+    level=logging.INFO,
+    format="[ %(filename)-34s ]:%(lineno)-3d  [%(levelname)4s]  %(message)s"
+)
+
+import argparse
+import select
+import time
+
+from utils.BinaryLog import BinaryLogConverter, BinaryLogFormat
+from utils.LogFollower import InotifyWatch, LogFollower
+
+def convert(converter):
+    try:
+        return converter.convertNew()
+    except FileNotFoundError:
+        return 0
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Convert proxy or nameserver logs to the binary log format")
+    parser.add_argument("--kind", type=str, choices=list(BinaryLogFormat.RECORDS), required=True,
+                        help="log written by miProxy (proxy) or by the nameserver")
+    parser.add_argument("--log-file-name", type=str, required=True,
+                        help="text log to convert")
+    parser.add_argument("--binary-file-name", type=str, nargs="?", default=None,
+                        help="binary log appended to (default: the text log's name with .bin appended); "
+                             "conversion resumes where the previous run stopped")
+    parser.add_argument("--follow", action=argparse.BooleanOptionalAction, default=False,
+                        help="keep converting lines as they are written, until interrupted")
+    parser.add_argument("--poll-interval", type=float, nargs="?", default=LogFollower.POLL_INTERVAL,
+                        help="seconds between checks of the text log where inotify is not available")
+
+    args = parser.parse_args()
+
+    binaryFileName = args.binary_file_name or args.log_file_name + ".bin"
+    converter = BinaryLogConverter(args.log_file_name, binaryFileName, args.kind)
+    startedAt = time.perf_counter()
+    converted = convert(converter)
+    elapsed = time.perf_counter() - startedAt
+    logging.info(f"Converted {converted} lines of {args.log_file_name} to {binaryFileName} in {elapsed:.2f} s")
+
+    if args.follow:
+        try:
+            watch = InotifyWatch(args.log_file_name)
+        except OSError as error:
+            logging.info(f"Polling {args.log_file_name} every {args.poll_interval}s ({error})")
+            watch = None
+        try:
+            while True:
+                if watch is not None:
+                    select.select([watch.fd], [], [], LogFollower.RESCAN_INTERVAL)
+                    watch.changed()
+                else:
+                    time.sleep(args.poll_interval)
+                convert(converter)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if watch is not None:
+                watch.close()
+    converter.close()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3.12
+
+import logging
+logging.basicConfig(
+    level=logging.INFO,
+    format="[ %(filename)-34s ]:%(lineno)-3d  [%(levelname)4s]  %(message)s"
+)
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from utils.BinaryLog import BinaryLogFormat, BinaryLogReader
+from utils.LogFileTail import LogFileTail
+from utils.ProxyLogFileParser import ProxyLogTable
+from utils.QoeAnalytics import QoeAnalytics, SegmentDurations
+
+CHUNK_SIZE = 16 * 1024 * 1024 # bytes of a text log parsed at a time
+
+def loadProxyLog(path):
+    """
+        ProxyLogTable of a text proxy log, or of a binary one written by
+        logConverter.py
+    """
+    try:
+        BinaryLogFormat.readHeader(path)
+    except ValueError:
+        pass
+    else:
+        return BinaryLogReader(path).proxyTable()
+    tail = LogFileTail(path)
+    tables = []
+    while lines := tail.readNewLines(CHUNK_SIZE):
+        tables.append(ProxyLogTable.fromLines(lines))
+    tables.append(ProxyLogTable.fromLines(tail.readNewLines(includePartial=True)))
+    tail.close()
+    return ProxyLogTable.concatenate(tables)
+
+def formatValue(value, digits):
+    return "-" if value is None else f"{value:.{digits}f}"
+
+def printSummaries(summaries):
+    print(f"{'proxy log':28}{'sessions':>9}{'segments':>10}{'hours':>8}{'Kbps':>10}{'switches':>10}"
+          f"{'switch Kbps':>13}{'steady s':>10}{'never':>7}{'risky':>8}{'deficit s':>11}{'est. err':>10}{'bias':>8}")
+    for logFileName, summary in summaries.items():
+        print(f"{logFileName[-28:]:28}{summary['sessions']:>9}{summary['segments']:>10}"
+              f"{formatValue(summary['mediaHours'], 2):>8}{formatValue(summary['averageBitrate'], 0):>10}"
+              f"{formatValue(summary['switchesPerSession'], 1):>10}{formatValue(summary['switchMagnitude'], 0):>13}"
+              f"{formatValue(summary['medianTimeToSteady'], 1):>10}{summary['neverSteady']:>7}"
+              f"{formatValue(summary['riskyFraction'], 3):>8}{formatValue(summary['rebufferDeficit'], 1):>11}"
+              f"{formatValue(summary['estimateError'], 3):>10}{formatValue(summary['estimateBias'], 3):>8}")
+
+def printClients(clients):
+    print(f"{'proxy log':28}{'browser IP':>16}{'segments':>10}{'media s':>9}{'Kbps':>10}{'switches':>10}"
+          f"{'switch Kbps':>13}{'steady s':>10}{'risky':>8}{'deficit s':>11}{'est. err':>10}{'bias':>8}")
+    for client in clients:
+        print(f"{client['proxy'][-28:]:28}{client['browserIP']:>16}{client['segments']:>10}"
+              f"{formatValue(client['mediaTime'], 0):>9}{formatValue(client['averageBitrate'], 0):>10}"
+              f"{client['switches']:>10}{formatValue(client['switchMagnitude'], 0):>13}"
+              f"{formatValue(client['timeToSteady'], 1):>10}{formatValue(client['riskyFraction'], 3):>8}"
+              f"{formatValue(client['rebufferDeficit'], 1):>11}{formatValue(client['estimateError'], 3):>10}"
+              f"{formatValue(client['estimateBias'], 3):>8}")
+
+if __name__ == "__main__":
+
+    DEFAULT_CONTENT_PATH = "./www"
+
+    parser = argparse.ArgumentParser(description="Quality of experience report over miProxy logs")
+    parser.add_argument("--log-file-name", type=str, action="append", required=True,
+                        help="proxy log, text or binary (see logConverter.py); repeat for every proxy")
+    parser.add_argument("--content-path", type=str, nargs="?", default=DEFAULT_CONTENT_PATH,
+                        help="path to the web server's content, whose media playlists give segment durations")
+    parser.add_argument("--segment-duration", type=float, nargs="?", default=float("nan"),
+                        help="seconds assumed for segments no playlist under the content path lists")
+    parser.add_argument("--steady-run", type=int, nargs="?", default=QoeAnalytics.STEADY_RUN,
+                        help="consecutive segments at one bitrate from which a session counts as steady")
+    parser.add_argument("--clients", type=int, nargs="?", default=20,
+                        help="number of client sessions listed, lowest average bitrate first")
+    parser.add_argument("--format", type=str, choices=("text", "json"), default="text",
+                        help="print tables, or everything as JSON (all client sessions included)")
+
+    args = parser.parse_args()
+
+    analytics = QoeAnalytics(SegmentDurations(args.content_path), args.segment_duration, args.steady_run)
+    summaries = {}
+    clients = []
+    for logFileName in args.log_file_name:
+        startedAt = time.perf_counter()
+        table = loadProxyLog(logFileName)
+        loadedAt = time.perf_counter()
+        result = analytics.sessions(table)
+        logging.info(f"{logFileName}: {len(table)} entries loaded in {loadedAt - startedAt:.2f} s, "
+                     f"{len(result.browserIPs)} sessions analysed in {time.perf_counter() - loadedAt:.2f} s")
+        unknown = int(np.isnan(result.mediaTime).sum())
+        if unknown:
+            logging.warning(f"{logFileName}: {unknown} sessions have segments of unknown duration "
+                            f"(see --content-path and --segment-duration)")
+        summaries[logFileName] = result.summary()
+        clients.extend(dict(row, proxy=logFileName) for row in result.rows())
+
+    clients.sort(key=lambda client: (client["averageBitrate"] is None, client["averageBitrate"] or 0))
+    if args.format == "json":
+        print(json.dumps({"proxies": summaries, "clients": clients}, indent=2, allow_nan=False))
+    else:
+        printSummaries(summaries)
+        print()
+        printClients(clients[:args.clients])
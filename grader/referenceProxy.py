@@ -0,0 +1,425 @@
+#!/usr/bin/env python3.12
+
+import logging
+logging.basicConfig(
+    level=logging.DEBUG,
+    format="[ %(filename)-34s ]:%(lineno)-3d  [%(levelname)4s]  %(message)s"
+)
+
+import argparse
+import asyncio
+import http.client
+import io
+import ipaddress
+import posixpath
+import re
+import signal
+import socket
+import time
+import urllib.parse
+
+from http import HTTPStatus
+
+from utils import DnsClient
+from utils.HlsPlaylist import MasterPlaylist, PlaylistCache, parsePlaylist
+from utils.ThroughputEstimator import ThroughputEstimator
+from utils.UpstreamPool import UpstreamPool
+
+class ReferenceProxy:
+    """
+        Reference implementation of miProxy, the bitrate adaptation proxy
+        graded by the tests, on a single asyncio event loop.
+
+        Every browser request is forwarded to the upstream web server over a
+        keep-alive connection from the UpstreamPool, so that no segment
+        transfer pays for a TCP handshake, and every response is relayed back
+        unmodified. Master playlists are parsed on their way through to learn
+        the bitrates (BANDWIDTH) and rendition names (NAME) of their title;
+        parsed playlists are cached by URL path and validator (ETag or
+        Last-Modified), so that the body of a playlist seen before is relayed
+        without being buffered or parsed again.
+        Segment requests of a known title (e.g. charge_1080p_0003.ts) are
+        rewritten to the rendition picked by the browser's ThroughputEstimator
+        (e.g. charge_240p_0003.ts), and their transfer is timed to update the
+        estimate and logged as
+
+            <browser IP> <segment path> <server IP> <duration s> <throughput Kbps> <average throughput Kbps> <bitrate Kbps>
+
+        Conditional request headers are dropped from playlist and segment
+        requests so that every one of them is answered, and timed, in full.
+    """
+
+    MAX_REQUEST_HEADER_BYTES = 64 * 1024
+    LISTEN_BACKLOG = 2048
+    COPY_BUFFER_SIZE = 256 * 1024
+    SEGMENT_PATTERN = re.compile(r"_(\d+)p_(\d+\.ts)$")
+    HOP_BY_HOP_HEADERS = frozenset(("connection", "keep-alive", "proxy-connection", "proxy-authorization",
+                                    "te", "trailer", "upgrade"))
+    CONDITIONAL_HEADERS = frozenset(("if-none-match", "if-modified-since", "if-range", "if-match",
+                                     "if-unmodified-since"))
+    BODYLESS_STATUSES = frozenset((HTTPStatus.NO_CONTENT, HTTPStatus.NOT_MODIFIED))
+
+    def __init__(self, host, port, upstreamIp, upstreamPort, gain, multiplier, logFile, backlog=None, pool=None):
+        self.host = host
+        self.port = port
+        self.upstreamIp = upstreamIp
+        self.upstreamPort = upstreamPort
+        self.gain = gain
+        self.multiplier = multiplier
+        self.logFile = logFile
+        self.backlog = backlog if backlog is not None else self.LISTEN_BACKLOG
+        self.pool = pool if pool is not None else UpstreamPool()
+        # Title directory (e.g. /charge) -> [(bandwidth, NAME)] by increasing bandwidth
+        self.titles = {}
+        # Browser IP -> ThroughputEstimator
+        self.estimators = {}
+        self.playlistCache = PlaylistCache()
+        self.segmentsServed = 0
+        self._stopRequested = None
+        self._connectionTasks = set()
+
+    async def serve(self):
+        self._stopRequested = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, self._stopRequested.set)
+        server = await asyncio.start_server(
+            self._handleConnection,
+            host=self.host,
+            port=self.port,
+            backlog=self.backlog,
+            limit=self.MAX_REQUEST_HEADER_BYTES
+        )
+        logging.info(f"Proxy running on {self.host}:{self.port}, upstream {self.upstreamIp}:{self.upstreamPort}")
+        await self._stopRequested.wait()
+        server.close()
+        for task in list(self._connectionTasks):
+            task.cancel()
+        if self._connectionTasks:
+            await asyncio.wait(list(self._connectionTasks))
+        self.pool.closeIdle()
+        logging.info(f"Upstream pool stats: {self.pool.stats()}")
+        logging.info(f"Proxy stats: {self.segmentsServed} segments served to {len(self.estimators)} browsers, "
+                     f"playlist cache {self.playlistCache.stats()}")
+
+    async def _handleConnection(self, reader, writer):
+        task = asyncio.current_task()
+        self._connectionTasks.add(task)
+        try:
+            while await self._handleOneRequest(reader, writer):
+                pass
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.CancelledError):
+            pass
+        finally:
+            self._connectionTasks.discard(task)
+            writer.close()
+
+    async def _handleOneRequest(self, reader, writer):
+        """
+            Relay one request from the browser and its response. Returns
+            whether the browser connection should be kept open for the next one
+        """
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError:
+            return False
+        lines = head.decode("iso-8859-1").split("\r\n")
+        words = lines[0].split()
+        if len(words) != 3 or not words[2].startswith("HTTP/"):
+            await self._sendError(writer, HTTPStatus.BAD_REQUEST)
+            return False
+        method, target, version = words
+        headers = http.client.parse_headers(io.BytesIO(head[len(lines[0]) + 2:]))
+        connectionHeader = headers.get("Connection", "").lower()
+        if version == "HTTP/1.1":
+            keepAlive = connectionHeader != "close"
+        else:
+            keepAlive = connectionHeader == "keep-alive"
+        if "Transfer-Encoding" in headers:
+            await self._sendError(writer, HTTPStatus.NOT_IMPLEMENTED)
+            return False
+        contentLength = (headers.get("Content-Length") or "0").strip()
+        if not (contentLength.isascii() and contentLength.isdigit()):
+            await self._sendError(writer, HTTPStatus.BAD_REQUEST)
+            return False
+        body = await reader.readexactly(int(contentLength))
+
+        parts = urllib.parse.urlsplit(target)
+        urlPath = parts.path
+        browserIp = writer.get_extra_info("peername")[0]
+        segment = self._adaptSegment(browserIp, urlPath)
+        if segment is not None:
+            urlPath = segment[0]
+        isPlaylist = urlPath.endswith(".m3u8")
+        upstreamTarget = urllib.parse.urlunsplit(("", "", urlPath or "/", parts.query, ""))
+
+        requestLines = [f"{method} {upstreamTarget} HTTP/1.1", f"Host: {self.upstreamIp}:{self.upstreamPort}"]
+        for name, value in headers.items():
+            lowerName = name.lower()
+            if lowerName in self.HOP_BY_HOP_HEADERS or lowerName == "host":
+                continue
+            if (segment is not None or isPlaylist) and lowerName in self.CONDITIONAL_HEADERS:
+                continue
+            if isPlaylist and lowerName == "accept-encoding":
+                # Playlists are parsed on the way through
+                continue
+            requestLines.append(f"{name}: {value}")
+        request = ("\r\n".join(requestLines) + "\r\n\r\n").encode("latin-1") + body
+
+        try:
+            upstream, startedAt, status, responseHead, responseHeaders = await self._sendUpstream(request)
+        except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            await self._sendError(writer, HTTPStatus.BAD_GATEWAY)
+            return False
+
+        relayedHead, framing, upstreamReusable = self._responseFraming(method, status, responseHead, responseHeaders)
+        if framing == "close":
+            keepAlive = False
+        if not keepAlive:
+            relayedHead.append("Connection: close")
+        writer.write(("\r\n".join(relayedHead) + "\r\n\r\n").encode("latin-1"))
+        validator = responseHeaders.get("ETag") or responseHeaders.get("Last-Modified")
+        cachedPlaylist = None
+        if isPlaylist and status == HTTPStatus.OK and validator is not None:
+            cachedPlaylist = self.playlistCache.get(urlPath, validator)
+        collected = [] if isPlaylist and status == HTTPStatus.OK and cachedPlaylist is None else None
+        try:
+            bodyBytes = await self._relayBody(upstream.reader, writer, framing, responseHeaders, collected)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            # Upstream broke off or mangled the body; the browser can only be told by closing
+            self.pool.release(upstream, reusable=False)
+            return False
+        except BaseException:
+            self.pool.release(upstream, reusable=False)
+            raise
+        finishedAt = time.perf_counter()
+        self.pool.release(upstream, upstreamReusable)
+
+        if cachedPlaylist is not None:
+            self._learnTitle(browserIp, urlPath, cachedPlaylist)
+        elif collected is not None:
+            try:
+                playlist = parsePlaylist(b"".join(collected).decode("utf-8"))
+            except (UnicodeDecodeError, ValueError):
+                playlist = None
+            if playlist is not None and validator is not None:
+                self.playlistCache.put(urlPath, validator, playlist)
+            self._learnTitle(browserIp, urlPath, playlist)
+        if segment is not None and status == HTTPStatus.OK:
+            self._segmentFinished(browserIp, urlPath, segment[1], bodyBytes, finishedAt - startedAt)
+        return keepAlive
+
+    async def _sendUpstream(self, request):
+        """
+            Send request over a pooled connection and read the response head;
+            returns (connection, time the request was sent, status, head lines,
+            headers). A request on a reused connection that upstream closed in
+            the meantime is retried once on another one
+        """
+        for attempt in range(2):
+            connection = await self.pool.acquire(self.upstreamIp, self.upstreamPort)
+            reused = connection.requests > 0
+            try:
+                sentAt = time.perf_counter()
+                connection.writer.write(request)
+                await connection.writer.drain()
+                head = await connection.reader.readuntil(b"\r\n\r\n")
+            except (ConnectionError, asyncio.IncompleteReadError) as error:
+                self.pool.release(connection, reusable=False)
+                if not reused or getattr(error, "partial", b""):
+                    raise
+                continue
+            except BaseException:
+                self.pool.release(connection, reusable=False)
+                raise
+            lines = head.decode("iso-8859-1").split("\r\n")
+            words = lines[0].split(None, 2)
+            if len(words) < 2 or not words[0].startswith("HTTP/") or not words[1].isdigit():
+                self.pool.release(connection, reusable=False)
+                raise ValueError(f"bad status line {lines[0]!r}")
+            headers = http.client.parse_headers(io.BytesIO(head[len(lines[0]) + 2:]))
+            return connection, sentAt, int(words[1]), lines, headers
+
+    def _adaptSegment(self, browserIp, urlPath):
+        """
+            (rewritten path, chosen bitrate) for a segment request of a title
+            whose master playlist was seen, None for any other request
+        """
+        match = self.SEGMENT_PATTERN.search(urlPath)
+        if match is None:
+            return None
+        renditions = self.titles.get(posixpath.dirname(urlPath))
+        if not renditions:
+            return None
+        estimator = self._estimator(browserIp, renditions)
+        bitrate = estimator.chooseBitrate([bandwidth for bandwidth, _ in renditions])
+        name = next(name for bandwidth, name in renditions if bandwidth == bitrate)
+        return urlPath[:match.start()] + f"_{name}p_{match.group(2)}", bitrate
+
+    def _estimator(self, browserIp, renditions):
+        estimator = self.estimators.get(browserIp)
+        if estimator is None:
+            estimator = self.estimators[browserIp] = ThroughputEstimator(self.gain, self.multiplier,
+                                                                         renditions[0][0])
+        return estimator
+
+    def _learnTitle(self, browserIp, urlPath, playlist):
+        if not isinstance(playlist, MasterPlaylist):
+            return
+        renditions = sorted({(rendition.bandwidth, rendition.name)
+                             for rendition in playlist.ladder if rendition.name and rendition.bandwidth > 0})
+        if renditions:
+            self.titles[posixpath.dirname(urlPath)] = renditions
+            self._estimator(browserIp, renditions)
+
+    def _segmentFinished(self, browserIp, segmentPath, bitrate, bodyBytes, duration):
+        throughput = bodyBytes * 8 / max(duration, 1e-6)
+        average = self.estimators[browserIp].update(throughput)
+        self.segmentsServed += 1
+        self.logFile.write(f"{browserIp} {segmentPath} {self.upstreamIp} {duration:.6f} "
+                           f"{throughput / 1000:.3f} {average / 1000:.3f} {bitrate / 1000}\n")
+
+    def _responseFraming(self, method, status, responseHead, responseHeaders):
+        """
+            (head lines to relay, body framing, whether the upstream connection
+            can be reused), the framing being "none", "length", "chunked" or
+            "close" (the body ends when upstream closes)
+        """
+        statusLine = responseHead[0]
+        relayedHead = [statusLine]
+        relayedHead.extend(f"{name}: {value}" for name, value in responseHeaders.items()
+                           if name.lower() not in self.HOP_BY_HOP_HEADERS)
+        connectionHeader = responseHeaders.get("Connection", "").lower()
+        if statusLine.startswith("HTTP/1.1"):
+            reusable = connectionHeader != "close"
+        else:
+            reusable = connectionHeader == "keep-alive"
+        if method == "HEAD" or status in self.BODYLESS_STATUSES or 100 <= status < 200:
+            return relayedHead, "none", reusable
+        if "chunked" in responseHeaders.get("Transfer-Encoding", "").lower():
+            return relayedHead, "chunked", reusable
+        if responseHeaders.get("Content-Length") is not None:
+            return relayedHead, "length", reusable
+        return relayedHead, "close", False
+
+    async def _relayBody(self, upstreamReader, writer, framing, responseHeaders, collected):
+        """
+            Copy the response body to the browser as it arrives. Returns the
+            number of body bytes (chunk framing excluded)
+        """
+        bodyBytes = 0
+        if framing == "length":
+            remaining = int(responseHeaders["Content-Length"])
+            while remaining > 0:
+                data = await upstreamReader.read(min(remaining, self.COPY_BUFFER_SIZE))
+                if not data:
+                    raise asyncio.IncompleteReadError(b"", remaining)
+                remaining -= len(data)
+                bodyBytes += len(data)
+                self._forward(writer, data, collected)
+                await writer.drain()
+        elif framing == "chunked":
+            while True:
+                sizeLine = await upstreamReader.readuntil(b"\r\n")
+                writer.write(sizeLine)
+                size = int(sizeLine.split(b";")[0], 16)
+                if size == 0:
+                    # Trailer section, up to the empty line
+                    while (line := await upstreamReader.readuntil(b"\r\n")) != b"\r\n":
+                        writer.write(line)
+                    writer.write(line)
+                    break
+                bodyBytes += size
+                self._forward(writer, await upstreamReader.readexactly(size), collected)
+                writer.write(await upstreamReader.readexactly(2))
+                await writer.drain()
+        elif framing == "close":
+            while data := await upstreamReader.read(self.COPY_BUFFER_SIZE):
+                bodyBytes += len(data)
+                self._forward(writer, data, collected)
+                await writer.drain()
+        await writer.drain()
+        return bodyBytes
+
+    def _forward(self, writer, data, collected):
+        writer.write(data)
+        if collected is not None:
+            collected.append(data)
+
+    async def _sendError(self, writer, status):
+        message = f"{status.value} {status.phrase}\n".encode()
+        writer.write((
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            "Content-Type: text/plain\r\n"
+            f"Content-Length: {len(message)}\r\n"
+            "Connection: close\r\n\r\n"
+        ).encode("latin-1") + message)
+        await writer.drain()
+
+def resolveUpstream(host, nameserverIp, nameserverPort):
+    """
+        IP address of the upstream web server: host itself if it is an IP
+        address, else the first A record the nameserver (or, without one,
+        the system resolver) returns for it
+    """
+    try:
+        return str(ipaddress.ip_address(host))
+    except ValueError:
+        pass
+    if nameserverIp is not None:
+        return DnsClient.resolve(host, nameserverIp, nameserverPort)[0]
+    return socket.gethostbyname(host)
+
+if __name__ == "__main__":
+
+    DEFAULT_PROXY_HOST = "localhost"
+    DEFAULT_PROXY_PORT = 9000
+    DEFAULT_UPSTREAM_SERVER_HOST = "localhost"
+    DEFAULT_UPSTREAM_SERVER_PORT = 8000
+    DEFAULT_LOG_FILE_NAME = "proxy_log.txt"
+
+    parser = argparse.ArgumentParser(description="Reference bitrate adaptation proxy (miProxy)")
+    parser.add_argument("--proxy-host", type=str, nargs="?", default=DEFAULT_PROXY_HOST,
+                        help="hostname/ip where to accept browser connections")
+    parser.add_argument("--proxy-port", type=int, nargs="?", default=DEFAULT_PROXY_PORT,
+                        help="port number where to accept browser connections")
+    parser.add_argument("--upstream-server-host", type=str, nargs="?", default=DEFAULT_UPSTREAM_SERVER_HOST,
+                        help="ip or domain name of the web server (resolved through --nameserver-ip if given)")
+    parser.add_argument("--upstream-server-port", type=int, nargs="?", default=DEFAULT_UPSTREAM_SERVER_PORT,
+                        help="port number of the web server")
+    parser.add_argument("--adaptation-gain", type=float, nargs="?", required=True,
+                        help="weight of the latest segment throughput in the EWMA estimate (0 < gain <= 1)")
+    parser.add_argument("--adaptation-bitrate-multiplier", type=float, nargs="?", required=True,
+                        help="estimated throughput needed per bit/s of the chosen bitrate")
+    parser.add_argument("--nameserver-ip", type=str, nargs="?", default=None,
+                        help="ip of the nameserver resolving --upstream-server-host")
+    parser.add_argument("--nameserver-port", type=int, nargs="?", default=53,
+                        help="port number of the nameserver")
+    parser.add_argument("--upstream-max-idle", type=int, nargs="?", default=UpstreamPool.MAX_IDLE,
+                        help="idle keep-alive connections kept open to the web server")
+    parser.add_argument("--upstream-max-connections", type=int, nargs="?", default=UpstreamPool.MAX_PER_HOST,
+                        help="connections to the web server in use at once; further requests wait for one")
+    parser.add_argument("--upstream-idle-timeout", type=float, nargs="?", default=UpstreamPool.IDLE_TIMEOUT,
+                        help="seconds after which idle connections to the web server are closed")
+    parser.add_argument("--log-file-name", type=str, nargs="?", default=DEFAULT_LOG_FILE_NAME,
+                        help="file where every segment transfer is logged")
+
+    args = parser.parse_args()
+
+    if not 0 < args.adaptation_gain <= 1:
+        parser.error("--adaptation-gain must be in (0, 1]")
+    if args.adaptation_bitrate_multiplier <= 0:
+        parser.error("--adaptation-bitrate-multiplier must be positive")
+
+    upstreamIp = resolveUpstream(args.upstream_server_host, args.nameserver_ip, args.nameserver_port)
+    logging.info(f"{args.upstream_server_host} resolved to {upstreamIp}")
+
+    # Line buffered, so that every entry is on disk as soon as it is logged
+    with open(args.log_file_name, "w", buffering=1) as logFile:
+        pool = UpstreamPool(maxIdle=args.upstream_max_idle, maxPerHost=args.upstream_max_connections,
+                            idleTimeout=args.upstream_idle_timeout)
+        proxy = ReferenceProxy(args.proxy_host, args.proxy_port, upstreamIp, args.upstream_server_port,
+                               args.adaptation_gain, args.adaptation_bitrate_multiplier, logFile, pool=pool)
+        asyncio.run(proxy.serve())
+
+    logging.info(f"{args.proxy_host}:{args.proxy_port} shutting down")
@@ -104,6 +104,7 @@ class Application:
                 "--host", f"{self.WEB_SERVER_IP}",
                 "--port", f"{self.WEB_SERVER_PORT}",
                 "--content-path", f"{self.WEB_SERVER_CONTENT_PATH}",
+                "--cache-profile", "grader",
             ],
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE
@@ -129,6 +129,7 @@ class Application:
                 "--host", f"{self.WEB_SERVER1_IP}",
                 "--port", f"{self.WEB_SERVER1_PORT}",
                 "--content-path", f"{self.WEB_SERVER1_CONTENT_PATH}",
+                "--cache-profile", "grader",
             ],
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE
@@ -139,6 +140,7 @@ class Application:
                 "--host", f"{self.WEB_SERVER2_IP}",
                 "--port", f"{self.WEB_SERVER2_PORT}",
                 "--content-path", f"{self.WEB_SERVER2_CONTENT_PATH}",
+                "--cache-profile", "grader",
             ],
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE
@@ -8,6 +8,7 @@ from mininet.node import OVSController
 from mininet.log import setLogLevel
 
 from playwright.sync_api import sync_playwright
+import numpy as np
 from urllib.parse import urlencode
 from pint import Quantity
 
@@ -109,6 +110,7 @@ class IntegrationGeolocation(unittest.TestCase):
                 "--host", f"{cls.WEBSERVER1_IP}",
                 "--port", f"{cls.WEBSERVER_PORT}",
                 "--content-path", f"{cls.WEBSERVER1_CONTENT_PATH}",
+                "--cache-profile", "grader",
             ],
             stdout=sys.stdout,
             stderr=sys.stderr
@@ -118,6 +120,7 @@ class IntegrationGeolocation(unittest.TestCase):
                 "--host", f"{cls.WEBSERVER2_IP}",
                 "--port", f"{cls.WEBSERVER_PORT}",
                 "--content-path", f"{cls.WEBSERVER2_CONTENT_PATH}",
+                "--cache-profile", "grader",
             ],
             stdout=sys.stdout,
             stderr=sys.stderr
@@ -212,9 +215,9 @@ class IntegrationGeolocation(unittest.TestCase):
                 raise RuntimeError
         self.assertTrue(len(logEntries) > 0,
                         "Nothing written to the log")
-        self.assertTrue(all(entry.bitrateChosen <= targetBitrate for entry in logEntries),
+        self.assertTrue(np.all(logEntries.bitrateChosen <= targetBitrate),
                         "Target bitrate exceeded")
-        self.assertTrue(any(entry.bitrateChosen == targetBitrate for entry in logEntries),
+        self.assertTrue(np.any(logEntries.bitrateChosen == targetBitrate),
                         "Target bitrate not reached")
 
     def test01_CheckServerMapping(self):
@@ -8,6 +8,7 @@ from mininet.node import OVSController
 from mininet.log import setLogLevel
 
 from playwright.sync_api import sync_playwright
+import numpy as np
 from urllib.parse import urlencode
 from pint import Quantity
 
@@ -110,6 +111,7 @@ class IntegrationRoundRobin(unittest.TestCase):
                 "--host", f"{cls.WEBSERVER1_IP}",
                 "--port", f"{cls.WEBSERVER1_PORT}",
                 "--content-path", f"{cls.WEBSERVER1_CONTENT_PATH}",
+                "--cache-profile", "grader",
             ],
             stdout=sys.stdout,
             stderr=sys.stderr
@@ -119,6 +121,7 @@ class IntegrationRoundRobin(unittest.TestCase):
                 "--host", f"{cls.WEBSERVER2_IP}",
                 "--port", f"{cls.WEBSERVER2_PORT}",
                 "--content-path", f"{cls.WEBSERVER2_CONTENT_PATH}",
+                "--cache-profile", "grader",
             ],
             stdout=sys.stdout,
             stderr=sys.stderr
@@ -198,9 +201,9 @@ class IntegrationRoundRobin(unittest.TestCase):
                 raise RuntimeError
         self.assertTrue(len(logEntries) > 0,
                         "Nothing written to the log")
-        self.assertTrue(all(entry.bitrateChosen <= targetBitrate for entry in logEntries),
+        self.assertTrue(np.all(logEntries.bitrateChosen <= targetBitrate),
                         "Target bitrate exceeded")
-        self.assertTrue(any(entry.bitrateChosen == targetBitrate for entry in logEntries),
+        self.assertTrue(np.any(logEntries.bitrateChosen == targetBitrate),
                         "Target bitrate not reached")
 
     def test01_CheckServerMapping(self):
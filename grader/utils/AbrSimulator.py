@@ -0,0 +1,311 @@
+import bisect
+import logging
+import math
+import os
+import posixpath
+
+from typing import NamedTuple
+
+from utils.BandwidthShaper import BandwidthShaper
+from utils.HlsPlaylist import MasterPlaylist, MediaPlaylist, PlaylistCache
+from utils.ProxyLogFileParser import ProxyLogTable
+from utils.ThroughputEstimator import ThroughputEstimator
+
+class BandwidthTrace:
+    """
+        Piecewise-constant link bandwidth over (simulated) time: the rate of
+        step i applies from its start time until the start of step i + 1.
+        Rates are in bits/second.
+    """
+
+    def __init__(self, steps):
+        steps = sorted(steps)
+        if not steps or steps[0][0] != 0 or any(rate <= 0 for _, rate in steps):
+            raise ValueError
+        self.times = [float(time) for time, _ in steps]
+        self.rates = [float(rate) for _, rate in steps]
+
+    @classmethod
+    def constant(cls, rate):
+        return cls([(0, rate)])
+
+    @classmethod
+    def parse(cls, text):
+        """
+            Parse lines of "SECONDS RATE" (e.g. "12.5 4mbit"), '#' starting a
+            comment
+        """
+        steps = []
+        for line in text.splitlines():
+            line = line.partition("#")[0].strip()
+            if not line:
+                continue
+            time, rate = line.split()
+            rate = BandwidthShaper.parseRate(rate)
+            if rate is None:
+                raise ValueError(f"invalid trace line {line!r}")
+            steps.append((float(time), rate))
+        return cls(steps)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r") as traceFile:
+            return cls.parse(traceFile.read())
+
+    def rateAt(self, time):
+        return self.rates[bisect.bisect_right(self.times, time) - 1]
+
+    def setRate(self, time, rate):
+        """
+            Change the bandwidth from time on, dropping the steps after it
+        """
+        if rate <= 0:
+            raise ValueError
+        idx = bisect.bisect_left(self.times, time)
+        del self.times[idx:], self.rates[idx:]
+        self.times.append(float(time))
+        self.rates.append(float(rate))
+
+    def transferEnd(self, start, bits):
+        """
+            Time at which a transfer of bits started at start completes
+        """
+        idx = bisect.bisect_right(self.times, start) - 1
+        time = start
+        while True:
+            boundary = self.times[idx + 1] if idx + 1 < len(self.times) else math.inf
+            capacity = self.rates[idx] * (boundary - time)
+            if bits <= capacity:
+                return time + bits / self.rates[idx]
+            bits -= capacity
+            time = boundary
+            idx += 1
+
+# Shared by every SimulatedTitle.load() not given a cache of its own
+_playlistCache = PlaylistCache()
+
+class SimulatedTitle(NamedTuple):
+    path: str                # URL path of the master playlist
+    playlistSizes: tuple     # bytes of the master and of the requested media playlist
+    renditions: tuple        # (bandwidth, NAME, segment URIs, segment sizes) in playlist order
+    segmentDurations: tuple  # of the requested rendition, the lowest bitrate one
+
+    @classmethod
+    def load(cls, contentPath, masterUrlPath, playlistCache=None):
+        """
+            Load a title from the web server's content path, with segment
+            sizes taken from the files. Missing segment files are sized after
+            their rendition's BANDWIDTH. Playlists are parsed through
+            playlistCache (a shared one by default), so that loading a title
+            again only stats its playlists
+        """
+        def localPath(urlPath):
+            return os.path.join(contentPath, urlPath.lstrip("/"))
+        if playlistCache is None:
+            playlistCache = _playlistCache
+        directory = posixpath.dirname(masterUrlPath)
+        masterStat = os.stat(localPath(masterUrlPath))
+        master = playlistCache.load(localPath(masterUrlPath), masterStat)
+        if not isinstance(master, MasterPlaylist) or not master.renditions:
+            raise ValueError(f"{masterUrlPath} is not a master playlist")
+        # hls.js sorts its levels by bitrate and starts at the lowest
+        requested = master.ladder[0]
+        renditions = []
+        playlistSizes = [masterStat.st_size]
+        segmentDurations = None
+        missing = 0
+        for rendition in master.renditions:
+            mediaPath = localPath(posixpath.join(directory, rendition.uri))
+            mediaStat = os.stat(mediaPath)
+            media = playlistCache.load(mediaPath, mediaStat)
+            if not isinstance(media, MediaPlaylist):
+                raise ValueError(f"{rendition.uri} is not a media playlist")
+            if rendition is requested:
+                playlistSizes.append(mediaStat.st_size)
+                segmentDurations = tuple(media.segments.durations)
+            uris = []
+            sizes = []
+            for segment in media.segments:
+                uris.append(posixpath.join(directory, segment.uri))
+                try:
+                    sizes.append(os.path.getsize(localPath(uris[-1])))
+                except FileNotFoundError:
+                    sizes.append(int(rendition.bandwidth * segment.duration / 8))
+                    missing += 1
+            renditions.append((rendition.bandwidth, rendition.name, tuple(uris), tuple(sizes)))
+        if missing:
+            logging.warning(f"{missing} segment files of {masterUrlPath} missing, sized after their BANDWIDTH")
+        return cls(path=masterUrlPath, playlistSizes=tuple(playlistSizes), renditions=tuple(renditions),
+                   segmentDurations=segmentDurations)
+
+class AbrSimulator:
+    """
+        Discrete-event simulation of a browser playing a title through miProxy
+        over a link of varying bandwidth, in simulated time.
+
+        The player behaves as player.html configures hls.js: it requests the
+        lowest bitrate rendition's segments one after the other for as long as less
+        than maxBufferLength seconds are buffered ahead of the playhead, and
+        starts playing once the first segment arrived. The proxy rewrites
+        every request to the bitrate chosen by its ThroughputEstimator, whose
+        state outlives players as it does in miProxy, and logs the transfer
+        as a row of a ProxyLogTable. A transfer takes one latency and then its
+        bytes at the link bandwidth of the moment.
+
+        The calls mirror VideoPlayer and BandwidthController so that grader
+        scenarios translate line by line:
+
+            simulator.setBandwidth(1.8 * 1300000)
+            simulator.openPlayer(title)
+            simulator.playUntil(25)
+            entries = simulator.parseNewEntries()
+    """
+
+    MAX_BUFFER_LENGTH = 10 # seconds, maxMaxBufferLength in player.html
+    EPSILON = 1e-9
+
+    def __init__(self, gain, multiplier, trace=None, latency=0.0, maxBufferLength=MAX_BUFFER_LENGTH,
+                 browserIp="10.0.3.100", serverIp="10.0.1.100"):
+        self.gain = gain
+        self.multiplier = multiplier
+        self.trace = trace
+        self.latency = latency
+        self.maxBufferLength = maxBufferLength
+        self.browserIp = browserIp
+        self.serverIp = serverIp
+        self.estimator = None
+        self.now = 0.0
+        self.entries = [] # rows of ProxyLogTable.fromRows()
+        self.lastParsedEntryIdx = -1
+        self.title = None
+        self.position = 0.0
+        self.buffered = 0.0
+        self.index = 0
+        self.download = None
+        self.started = False
+        self.stalled = False
+        self.stalls = 0
+        self.stallDuration = 0.0
+
+    def setBandwidth(self, rate):
+        """
+            Set the link bandwidth (bits/second) from the current time on
+        """
+        if self.trace is None:
+            self.trace = BandwidthTrace.constant(rate)
+        else:
+            self.trace.setRate(self.now, rate)
+        if self.download is not None:
+            self.download = self.download._replace(end=self._transferEnd(self.download.start, self.download.size))
+
+    def openPlayer(self, title):
+        """
+            Load a title in a new player: fetch its master and lowest bitrate
+            media playlist, after which segments are requested
+        """
+        if self.trace is None:
+            raise ValueError("no bandwidth set")
+        self.title = title
+        self.position = 0.0
+        self.buffered = 0.0
+        self.index = 0
+        self.download = None
+        self.started = False
+        self.stalled = False
+        for size in title.playlistSizes:
+            self.now = self._transferEnd(self.now, size)
+        if self.estimator is None:
+            self.estimator = ThroughputEstimator(self.gain, self.multiplier,
+                                                 min(bandwidth for bandwidth, _, _, _ in title.renditions))
+
+    def closePlayer(self):
+        self.title = None
+        self.download = None
+
+    def playFor(self, duration):
+        self.playUntil(self.position + duration)
+
+    def playUntil(self, position):
+        """
+            Play until the playhead reaches position, or the title ends
+        """
+        if self.title is None:
+            raise ValueError("no player open")
+        segmentCount = len(self.title.segmentDurations)
+        while True:
+            if (self.download is None and self.index < segmentCount
+                    and self.buffered - self.position < self.maxBufferLength + self.EPSILON):
+                self._startDownload()
+            if self.position >= position - self.EPSILON:
+                return
+            steps = []
+            if self.download is not None:
+                steps.append(self.download.end - self.now)
+            playable = self.buffered - self.position
+            if self.started and playable > 0:
+                steps.append(min(playable, position - self.position))
+                if self.download is None and self.index < segmentCount:
+                    steps.append(playable - self.maxBufferLength)
+            if not steps:
+                # Played to the end
+                return
+            self._advance(max(min(steps), 0))
+            if self.download is not None and self.now >= self.download.end - self.EPSILON:
+                self._finishDownload()
+
+    def parseNewEntries(self):
+        """
+            Log entries since the last call, like ProxyLogFileParser
+        """
+        entries = ProxyLogTable.fromRows(self.entries[self.lastParsedEntryIdx + 1:])
+        self.lastParsedEntryIdx = len(self.entries) - 1
+        return entries
+
+    def _transferEnd(self, start, size):
+        return self.trace.transferEnd(start + self.latency, size * 8)
+
+    def _advance(self, duration):
+        if self.started:
+            playable = self.buffered - self.position
+            if duration <= playable + self.EPSILON:
+                self.position = min(self.position + duration, self.buffered)
+            else:
+                self.position = self.buffered
+                if not self.stalled:
+                    self.stalls += 1
+                    self.stalled = True
+                self.stallDuration += duration - playable
+        self.now += duration
+
+    def _startDownload(self):
+        bitrates = [bandwidth for bandwidth, _, _, _ in self.title.renditions]
+        bitrate = self.estimator.chooseBitrate(bitrates)
+        _, _, uris, sizes = self.title.renditions[bitrates.index(bitrate)]
+        if self.index < len(sizes):
+            uri, size = uris[self.index], sizes[self.index]
+        else:
+            # The rendition is a segment short of the requested one
+            uri = uris[-1]
+            size = int(bitrate * self.title.segmentDurations[self.index] / 8)
+        self.download = _Download(self.index, uri, bitrate, size, self.now, self._transferEnd(self.now, size))
+
+    def _finishDownload(self):
+        download = self.download
+        duration = download.end - download.start
+        throughput = download.size * 8 / duration
+        average = self.estimator.update(throughput)
+        self.entries.append((self.browserIp, download.uri, self.serverIp, duration, throughput / 1000,
+                             average / 1000, download.bitrate / 1000))
+        self.buffered += self.title.segmentDurations[download.index]
+        self.index += 1
+        self.started = True
+        self.stalled = False
+        self.download = None
+
+class _Download(NamedTuple):
+    index: int
+    uri: str
+    bitrate: int
+    size: int
+    start: float
+    end: float
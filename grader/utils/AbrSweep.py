@@ -0,0 +1,151 @@
+from typing import NamedTuple
+
+import numpy as np
+
+class SweepResult(NamedTuple):
+    gains: np.ndarray         # (G,)
+    multipliers: np.ndarray   # (M,)
+    timeToTarget: np.ndarray  # (G, M) mean media seconds from a change of target bitrate until it is chosen
+    unreached: np.ndarray     # (G, M) fraction of target bitrates never chosen before the next change
+    switches: np.ndarray      # (G, M) mean bitrate switches per trace
+    overshoot: np.ndarray     # (G, M) fraction of decisions above the target bitrate
+    decisions: int
+
+    def rows(self):
+        for g, gain in enumerate(self.gains):
+            for m, multiplier in enumerate(self.multipliers):
+                yield {
+                    "gain": float(gain),
+                    "multiplier": float(multiplier),
+                    "timeToTarget": float(self.timeToTarget[g, m]),
+                    "unreached": float(self.unreached[g, m]),
+                    "switches": float(self.switches[g, m]),
+                    "overshoot": float(self.overshoot[g, m]),
+                }
+
+class AbrSweep:
+    """
+        Evaluates miProxy's bitrate adaptation (see ThroughputEstimator) for
+        every (gain, multiplier) pair of a grid over many throughput traces
+        at once, with array operations only.
+
+        A trace gives the throughput measured for each successive segment,
+        which with the grader's links does not depend on the bitrates chosen.
+        The EWMA is then a linear filter of the trace; it is evaluated
+        blockSize segments at a time as a product with the lower triangular
+        matrix of weights gain * (1 - gain)^(i - j), plus the estimate carried
+        over from the previous block. Every decision picks the highest bitrate
+        b with estimate >= multiplier * b, the estimate starting at the lowest
+        bitrate.
+
+        The target bitrate of a segment is the highest one the link sustains
+        with targetHeadroom to spare, as the grader sets the bandwidth of its
+        tests to TEST_BANDWIDTH_BITRATE_MULTIPLIER times the target. Time to
+        target is counted in seconds of media, the durations of the segments
+        fetched from the change until the target is chosen.
+    """
+
+    BLOCK_SIZE = 64
+    TARGET_HEADROOM = 1.8
+
+    def __init__(self, bitrates, gains, multipliers, targetHeadroom=TARGET_HEADROOM, blockSize=BLOCK_SIZE):
+        self.bitrates = np.sort(np.asarray(bitrates, dtype=np.float64))
+        self.gains = np.asarray(gains, dtype=np.float64)
+        self.multipliers = np.asarray(multipliers, dtype=np.float64)
+        if (not self.bitrates.size or np.any(self.gains <= 0) or np.any(self.gains > 1)
+                or np.any(self.multipliers <= 0)):
+            raise ValueError
+        self.targetHeadroom = targetHeadroom
+        self.blockSize = blockSize
+        lags = np.arange(blockSize)
+        retained = 1 - self.gains[:, None, None]
+        exponents = lags[:, None] - lags[None, :]
+        # weights[g, i, j]: weight of throughput j of a block in estimate i of that block
+        self.weights = np.where(exponents >= 0,
+                                self.gains[:, None, None] * retained ** np.maximum(exponents, 0), 0.0)
+        # carry[g, i]: weight of the estimate preceding the block in estimate i
+        self.carry = retained[:, :, 0] ** (lags + 1)
+
+    def estimates(self, throughputs):
+        """
+            (G, N, K) estimate each of the K decisions of the N traces is
+            based on, for every gain
+        """
+        throughputs = np.asarray(throughputs, dtype=np.float64)
+        traceCount, segmentCount = throughputs.shape
+        estimates = np.empty((len(self.gains), traceCount, segmentCount + 1))
+        estimates[:, :, 0] = self.bitrates[0]
+        for start in range(0, segmentCount, self.blockSize):
+            block = throughputs[:, start:start + self.blockSize]
+            size = block.shape[1]
+            carried = estimates[:, :, start, None] * self.carry[:, None, :size]
+            estimates[:, :, start + 1:start + size + 1] = (
+                np.matmul(block, self.weights[:, :size, :size].transpose(0, 2, 1)) + carried)
+        return estimates[:, :, :segmentCount]
+
+    def choose(self, estimates, multiplier):
+        """
+            Index into bitrates of every decision
+        """
+        return np.maximum(np.searchsorted(self.bitrates * multiplier, estimates, side="right") - 1, 0)
+
+    def run(self, throughputs, segmentDurations):
+        """
+            Sweep the (N, K) throughputs of N traces of K segments, whose
+            segmentDurations (seconds, a scalar, (K,) or (N, K)) are those of
+            the title played
+        """
+        throughputs = np.asarray(throughputs, dtype=np.float64)
+        traceCount, segmentCount = throughputs.shape
+        durations = np.broadcast_to(np.asarray(segmentDurations, dtype=np.float64), throughputs.shape).ravel()
+        # Media time each segment starts at, over the traces laid end to end
+        mediaTimes = np.cumsum(durations) - durations
+        targets = self.choose(throughputs, self.targetHeadroom)
+        # Runs of segments with the same target, over the traces laid end to end
+        runStarts = np.ones(throughputs.shape, dtype=bool)
+        runStarts[:, 1:] = targets[:, 1:] != targets[:, :-1]
+        runStarts = np.flatnonzero(runStarts)
+        positions = np.arange(traceCount * segmentCount)
+        noHit = traceCount * segmentCount
+
+        estimates = self.estimates(throughputs)
+        shape = (len(self.gains), len(self.multipliers))
+        timeToTarget = np.full(shape, np.nan)
+        unreached = np.empty(shape)
+        switches = np.empty(shape)
+        overshoot = np.empty(shape)
+        for m, multiplier in enumerate(self.multipliers):
+            choices = self.choose(estimates, multiplier)
+            overshoot[:, m] = (choices > targets).mean(axis=(1, 2))
+            switches[:, m] = (choices[:, :, 1:] != choices[:, :, :-1]).sum(axis=2).mean(axis=1)
+            hits = np.where((choices == targets).reshape(len(self.gains), -1), positions, noHit)
+            firstHits = np.minimum.reduceat(hits, runStarts, axis=1)
+            reached = firstHits < noHit
+            unreached[:, m] = 1 - reached.mean(axis=1)
+            delays = np.where(reached, mediaTimes[np.minimum(firstHits, noHit - 1)] - mediaTimes[runStarts], 0.0)
+            reachedCount = reached.sum(axis=1)
+            np.divide(delays.sum(axis=1), reachedCount, out=timeToTarget[:, m], where=reachedCount > 0)
+        return SweepResult(
+            gains=self.gains,
+            multipliers=self.multipliers,
+            timeToTarget=timeToTarget,
+            unreached=unreached,
+            switches=switches,
+            overshoot=overshoot,
+            decisions=len(self.gains) * len(self.multipliers) * throughputs.size
+        )
+
+def sampleTraces(traces, segmentDurations):
+    """
+        (N, K) throughputs of the K segments of segmentDurations (seconds)
+        played back to back over each of the BandwidthTraces: the rate of the
+        link when segment k is fetched, the durations of segments 0 to k - 1
+        seconds in
+    """
+    segmentDurations = np.asarray(segmentDurations, dtype=np.float64)
+    times = np.cumsum(segmentDurations) - segmentDurations
+    throughputs = np.empty((len(traces), len(segmentDurations)))
+    for n, trace in enumerate(traces):
+        steps = np.searchsorted(trace.times, times, side="right") - 1
+        throughputs[n] = np.asarray(trace.rates)[steps]
+    return throughputs
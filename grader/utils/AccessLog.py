@@ -0,0 +1,66 @@
+import logging
+import random
+import sys
+import time
+
+class AccessLog:
+    """
+        Decides which requests are logged and how.
+
+        "classic" keeps http.server's request line logged through the root
+        logger, "compact" writes one structured line per finished request
+        (timestamp, client, method, path, status, body bytes, duration)
+        through its own logger and "off" logs no requests at all. With
+        sampleRate < 1 only that fraction of requests is logged; error
+        responses are always logged.
+    """
+
+    FORMATS = ("classic", "compact", "off")
+    LOGGER_NAME = "webserver.access"
+
+    def __init__(self, format="classic", sampleRate=1.0):
+        if format not in self.FORMATS or not 0 <= sampleRate <= 1:
+            raise ValueError
+        self.format = format
+        self.sampleRate = sampleRate
+        self.logger = logging.getLogger(self.LOGGER_NAME)
+        if format == "compact" and not self.logger.handlers:
+            handler = logging.StreamHandler(sys.stderr)
+            handler.setFormatter(self.CompactFormatter())
+            self.logger.addHandler(handler)
+            self.logger.setLevel(logging.INFO)
+            self.logger.propagate = False
+
+    @property
+    def classic(self):
+        return self.format == "classic"
+
+    @property
+    def compact(self):
+        return self.format == "compact"
+
+    def sample(self, status):
+        if self.format == "off":
+            return False
+        return self.sampleRate >= 1 or int(status) >= 400 or random.random() < self.sampleRate
+
+    def logRequest(self, client, method, target, status, bytesSent, duration):
+        """
+            Log a finished request in the compact format
+        """
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
+        message = (f"client={client} method={method} path={target} status={int(status)} "
+                   f"bytes={bytesSent} duration={duration:.6f}")
+        # Built by hand to skip the caller lookup Logger.info() would do
+        record = self.logger.makeRecord(self.LOGGER_NAME, logging.INFO, __file__, 0, message, None, None,
+                                        extra={"structured": True})
+        self.logger.handle(record)
+
+    class CompactFormatter(logging.Formatter):
+
+        def __init__(self):
+            super().__init__("ts=%(asctime)s %(message)s")
+
+        def formatTime(self, record, datefmt=None):
+            return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z"
@@ -0,0 +1,288 @@
+import asyncio
+import email.utils
+import http.client
+import io
+import logging
+import sys
+import time
+
+from http import HTTPStatus
+
+from utils.AccessLog import AccessLog
+from utils.CachePolicy import CachePolicy
+from utils.ConnectionLimiter import ConnectionLimiter
+from utils.StaticContent import FileBody, MappedBody, iterBodyChunks
+
+class AsyncWebServer:
+    """
+        Single event loop HTTP/1.1 server serving static content.
+
+        Mirrors what WebServer (ThreadingHTTPServer + SimpleHTTPRequestHandler)
+        does for GET/HEAD of files (both resolve requests through StaticContent),
+        but keeps every connection as a coroutine instead of an OS thread, so
+        thousands of idle keep-alive players cost a few kilobytes each.
+        Directory listings are not supported; a directory is served through
+        its index.html. Opening files and copying their bodies (without
+        sendfile) run on the loop's default executor, so that a slow disk
+        doesn't stall the other connections.
+    """
+
+    SERVER_VERSION = f"AsyncHTTP/0.1 Python/{sys.version.split()[0]}"
+    MAX_REQUEST_HEADER_BYTES = 64 * 1024
+    MAX_REQUEST_BODY_BYTES = 1024 * 1024 # request bodies are read and discarded
+    LISTEN_BACKLOG = 2048
+    COPY_BUFFER_SIZE = 256 * 1024
+    SHED_LINGER_TIMEOUT = 2 # seconds to wait for shed clients to close
+
+    def __init__(self, host, port, content, extraHeaders=(), useSendfile=True, reusePort=False, shaper=None,
+                 metrics=None, accessLog=None, cachePolicy=None, limiter=None, backlog=None):
+        self.host = host
+        self.port = port
+        self.content = content
+        self.extraHeaders = tuple(extraHeaders)
+        self.useSendfile = useSendfile
+        self.reusePort = reusePort
+        self.shaper = shaper
+        self.metrics = metrics
+        self.accessLog = accessLog if accessLog is not None else AccessLog()
+        self.cachePolicy = cachePolicy if cachePolicy is not None else CachePolicy()
+        self.limiter = limiter if limiter is not None else ConnectionLimiter()
+        self.backlog = backlog if backlog is not None else self.LISTEN_BACKLOG
+        self._rejectionResponse = self.limiter.rejectionResponse(self.extraHeaders)
+        self.server = None
+        self._loop = None
+        self._stopRequested = None
+        self._shutdownPending = False
+        self._idleWriters = set()
+        self._connectionTasks = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.server_close()
+
+    def serve_forever(self):
+        asyncio.run(self.serve())
+
+    def server_close(self):
+        if self.content.segmentCache is not None:
+            logging.info(f"Segment cache stats: {self.content.segmentCache.stats()}")
+        logging.info(f"Connection stats: {self.limiter.stats()}")
+
+    def shutdown(self):
+        """
+            Stop accepting connections and return from serve_forever() once the
+            responses in flight are written. Safe to call from any thread
+        """
+        self._shutdownPending = True
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._stopRequested.set)
+
+    async def serve(self):
+        self._loop = asyncio.get_running_loop()
+        self._stopRequested = asyncio.Event()
+        if self._shutdownPending:
+            self._stopRequested.set()
+        self.server = await asyncio.start_server(
+            self._handleConnection,
+            host=self.host,
+            port=self.port,
+            backlog=self.backlog,
+            limit=self.MAX_REQUEST_HEADER_BYTES,
+            reuse_port=self.reusePort
+        )
+        logging.info(f"Web server running on {self.host}:{self.port} (asyncio engine)")
+        await self._stopRequested.wait()
+        self.server.close()
+        # Idle keep-alive connections are simply dropped, busy ones finish their
+        # current response and then close
+        for writer in list(self._idleWriters):
+            writer.close()
+        if self._connectionTasks:
+            await asyncio.wait(list(self._connectionTasks))
+
+    async def _handleConnection(self, reader, writer):
+        if not self.limiter.tryAcquire():
+            await self._shedConnection(reader, writer)
+            return
+        task = asyncio.current_task()
+        self._connectionTasks.add(task)
+        if self.metrics is not None:
+            self.metrics.connectionOpened()
+        try:
+            while not self._stopRequested.is_set():
+                self._idleWriters.add(writer)
+                keepAlive = await self._handleOneRequest(reader, writer)
+                if not keepAlive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            self._idleWriters.discard(writer)
+            self._connectionTasks.discard(task)
+            if self.metrics is not None:
+                self.metrics.connectionClosed()
+            self.limiter.release()
+            writer.close()
+
+    async def _shedConnection(self, reader, writer):
+        # Send the 503 straight away, then discard the request until the client
+        # closes, so that unread request bytes don't reset the connection
+        # before the client gets the response
+        try:
+            async with asyncio.timeout(self.SHED_LINGER_TIMEOUT):
+                writer.write(self._rejectionResponse)
+                writer.write_eof()
+                while await reader.read(self.COPY_BUFFER_SIZE):
+                    pass
+        except (TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _handleOneRequest(self, reader, writer):
+        """
+            Serve one request from the connection. Returns whether the
+            connection should be kept open for the next one
+        """
+        try:
+            async with asyncio.timeout(self.limiter.idleTimeout):
+                head = await reader.readuntil(b"\r\n\r\n")
+        except TimeoutError:
+            self.limiter.idleTimedOut()
+            return False
+        except asyncio.IncompleteReadError as error:
+            if error.partial.strip() and not writer.is_closing():
+                await self._sendError(writer, None, HTTPStatus.BAD_REQUEST, "Bad request syntax")
+            return False
+        receivedAt = time.perf_counter()
+        self._idleWriters.discard(writer)
+        lines = head.decode("iso-8859-1").split("\r\n")
+        requestLine = lines[0]
+        words = requestLine.split()
+        if len(words) != 3 or not words[2].startswith("HTTP/"):
+            await self._sendError(writer, requestLine, HTTPStatus.BAD_REQUEST, f"Bad request syntax ({requestLine!r})")
+            return False
+        method, target, version = words
+        headers = http.client.parse_headers(io.BytesIO(head[len(lines[0]) + 2:]))
+        connectionHeader = headers.get("Connection", "").lower()
+        if version == "HTTP/1.1":
+            keepAlive = connectionHeader != "close"
+        else:
+            keepAlive = connectionHeader == "keep-alive"
+        contentLength = headers.get("Content-Length")
+        if contentLength:
+            contentLength = contentLength.strip()
+            if not (contentLength.isascii() and contentLength.isdigit()):
+                await self._sendError(writer, requestLine, HTTPStatus.BAD_REQUEST,
+                                      f"Bad Content-Length ({contentLength!r})")
+                return False
+            if int(contentLength) > self.MAX_REQUEST_BODY_BYTES:
+                await self._sendError(writer, requestLine, HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                                      "Request body too large")
+                return False
+            await reader.readexactly(int(contentLength))
+        await self._sendContent(writer, requestLine, method, target, headers, keepAlive, receivedAt)
+        return keepAlive
+
+    async def _sendContent(self, writer, requestLine, method, target, headers, keepAlive, receivedAt):
+        loop = asyncio.get_running_loop()
+        response = await loop.run_in_executor(None, self.content.resolve, method, target, headers)
+        if response is None:
+            response = self.content.errorResponse(HTTPStatus.NOT_FOUND, "No permission to list directory")
+        try:
+            if response.message is not None:
+                self.logMessage(f"code {response.status.value}, message {response.message}")
+            await self._sendResponseHead(writer, target, response.status, response.headers, keepAlive)
+            headSentAt = time.perf_counter()
+            if method != "HEAD":
+                await self._writeBody(writer, response.body)
+        finally:
+            response.close()
+        bytesSent = response.contentLength if method != "HEAD" else 0
+        if self.metrics is not None:
+            self.metrics.requestFinished(target, response.status, bytesSent, receivedAt, headSentAt)
+        if self.accessLog.sample(response.status):
+            if self.accessLog.classic:
+                self.logRequest(requestLine, response.status)
+            else:
+                client = writer.get_extra_info("peername")[0]
+                self.accessLog.logRequest(client, method, target, response.status, bytesSent,
+                                          time.perf_counter() - receivedAt)
+
+    async def _writeBody(self, writer, body):
+        if self.shaper is not None and self.shaper.active:
+            await self._writeShapedBody(writer, body)
+            return
+        if isinstance(body, FileBody) and self.useSendfile:
+            # Falls back to read()/write() itself when the transport can't sendfile
+            await asyncio.get_running_loop().sendfile(writer.transport, body.file, body.offset, body.count)
+        elif isinstance(body, FileBody):
+            async for chunk in self._bodyChunks(body, self.COPY_BUFFER_SIZE):
+                writer.write(chunk)
+                await writer.drain()
+        elif isinstance(body, MappedBody):
+            # The transport may keep slices of the mapping queued; wait until they
+            # are all flushed so that the mapping can be closed afterwards
+            writer.transport.set_write_buffer_limits(high=0)
+            writer.write(body.view)
+            await writer.drain()
+            writer.transport.set_write_buffer_limits()
+        elif body is not None:
+            writer.write(body)
+            await writer.drain()
+
+    async def _writeShapedBody(self, writer, body):
+        clientIp = writer.get_extra_info("peername")[0]
+        # Drain every chunk completely so that pacing reflects what actually left
+        writer.transport.set_write_buffer_limits(high=0)
+        try:
+            async for chunk in self._bodyChunks(body, self.shaper.CHUNK_SIZE):
+                delay = self.shaper.reserve(clientIp, len(chunk))
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                writer.write(chunk)
+                await writer.drain()
+        finally:
+            writer.transport.set_write_buffer_limits()
+
+    async def _bodyChunks(self, body, chunkSize):
+        # iterBodyChunks(), reading files on the executor
+        chunks = iterBodyChunks(body, chunkSize)
+        if not isinstance(body, FileBody):
+            for chunk in chunks:
+                yield chunk
+            return
+        loop = asyncio.get_running_loop()
+        while (chunk := await loop.run_in_executor(None, next, chunks, None)) is not None:
+            yield chunk
+
+    async def _sendResponseHead(self, writer, target, status, headers, keepAlive):
+        lines = [
+            f"HTTP/1.1 {status.value} {status.phrase}",
+            f"Server: {self.SERVER_VERSION}",
+            f"Date: {email.utils.formatdate(time.time(), usegmt=True)}",
+        ]
+        lines.extend(f"{name}: {value}" for name, value in headers)
+        if not keepAlive:
+            lines.append("Connection: close")
+        lines.append(f"Cache-Control: {self.cachePolicy.cacheControl(target, status)}")
+        lines.extend(f"{name}: {value}" for name, value in self.extraHeaders)
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1", "strict"))
+        await writer.drain()
+
+    async def _sendError(self, writer, requestLine, status, message, keepAlive=False):
+        response = self.content.errorResponse(status, message)
+        self.logMessage(f"code {status.value}, message {message}")
+        await self._sendResponseHead(writer, "", status, response.headers, keepAlive)
+        writer.write(response.body)
+        await writer.drain()
+        if requestLine is not None and self.accessLog.classic:
+            self.logRequest(requestLine, status)
+
+    def logRequest(self, requestLine, status):
+        self.logMessage(f"\"{requestLine}\" {status.value} -")
+
+    def logMessage(self, message):
+        logging.info(message)
@@ -0,0 +1,131 @@
+import re
+import threading
+import time
+import urllib.parse
+
+from http import HTTPStatus
+
+from utils.TokenBucket import TokenBucket
+
+class BandwidthShaper:
+    """
+        Paces response bodies with token buckets: one shared by all clients
+        and one per client IP. A stand-in for BandwidthController that needs
+        neither Mininet, root nor tc.
+
+        Limits are in bits/second and can be changed at runtime through the
+        control endpoint, if added (it is unauthenticated):
+            GET  /_server/shaping                               current limits
+            POST /_server/shaping?global=20mbit&perClient=4mbit set limits ("off" or 0 removes one)
+        With --workers every worker shapes (and is configured) independently.
+    """
+
+    CONTROL_ENDPOINT = "/_server/shaping"
+    CHUNK_SIZE = 16 * 1024 # bytes sent per pacing step
+    BURST_DURATION = 0.05 # seconds worth of traffic a bucket may burst
+    CLIENT_IDLE_TIMEOUT = 60 # seconds before an idle client's bucket is dropped
+    RATE_PATTERN = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([kmg]?)(?:bit|bps|b)?(?:/s)?\s*$", re.IGNORECASE)
+    RATE_MULTIPLIERS = {"": 1, "k": 1e3, "m": 1e6, "g": 1e9}
+
+    def __init__(self, globalRate=None, perClientRate=None):
+        self.globalRate = None
+        self.perClientRate = None
+        self.globalBucket = None
+        self._clientBuckets = {}
+        self._lock = threading.Lock()
+        self.configure(globalRate, perClientRate)
+
+    @property
+    def active(self):
+        return self.globalRate is not None or self.perClientRate is not None
+
+    @classmethod
+    def parseRate(cls, text):
+        """
+            Parse a rate such as "4000000", "4mbit" or "1.5M" into bits/second.
+            "off" and 0 mean no limit (None)
+        """
+        if text is None or text.strip().lower() in ("", "off", "none", "0"):
+            return None
+        match = cls.RATE_PATTERN.match(text)
+        if not match:
+            raise ValueError(f"invalid rate {text!r}")
+        rate = float(match.group(1)) * cls.RATE_MULTIPLIERS[match.group(2).lower()]
+        return rate if rate > 0 else None
+
+    def configure(self, globalRate, perClientRate):
+        with self._lock:
+            self.globalRate = globalRate
+            self.perClientRate = perClientRate
+            if globalRate is None:
+                self.globalBucket = None
+            elif self.globalBucket is None:
+                self.globalBucket = TokenBucket(*self._bucketParameters(globalRate))
+            else:
+                self.globalBucket.configure(*self._bucketParameters(globalRate))
+            if perClientRate is None:
+                self._clientBuckets.clear()
+            for bucket, _ in self._clientBuckets.values():
+                bucket.configure(*self._bucketParameters(perClientRate))
+
+    def reserve(self, clientIp, amount):
+        """
+            Take amount bytes from the buckets that apply to clientIp and return
+            how many seconds to wait before sending them
+        """
+        delay = 0.0
+        globalBucket = self.globalBucket
+        if globalBucket is not None:
+            delay = globalBucket.reserve(amount)
+        with self._lock:
+            perClientRate = self.perClientRate
+        if perClientRate is not None:
+            delay = max(delay, self._clientBucket(clientIp, perClientRate).reserve(amount))
+        return delay
+
+    def _clientBucket(self, clientIp, perClientRate):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._clientBuckets.get(clientIp)
+            if entry is None:
+                self._pruneIdleClients(now)
+                bucket = TokenBucket(*self._bucketParameters(perClientRate))
+            else:
+                bucket = entry[0]
+            self._clientBuckets[clientIp] = (bucket, now)
+            return bucket
+
+    def _pruneIdleClients(self, now):
+        idleClients = [
+            clientIp for clientIp, (_, lastUsed) in self._clientBuckets.items()
+            if now - lastUsed > self.CLIENT_IDLE_TIMEOUT
+        ]
+        for clientIp in idleClients:
+            del self._clientBuckets[clientIp]
+
+    def _bucketParameters(self, rate):
+        bytesPerSecond = rate / 8
+        return bytesPerSecond, max(bytesPerSecond * self.BURST_DURATION, self.CHUNK_SIZE)
+
+    def describe(self):
+        with self._lock:
+            return {
+                "global": self.globalRate,
+                "perClient": self.perClientRate,
+                "shapedClients": len(self._clientBuckets),
+            }
+
+    def addControlEndpoint(self, content):
+        def handleControlRequest(method, target, headers):
+            if method == "POST":
+                query = urllib.parse.parse_qs(urllib.parse.urlsplit(target).query)
+                try:
+                    globalRate = self.parseRate(query["global"][0]) if "global" in query else self.globalRate
+                    perClientRate = self.parseRate(query["perClient"][0]) if "perClient" in query else self.perClientRate
+                except ValueError as error:
+                    return content.errorResponse(HTTPStatus.BAD_REQUEST, str(error))
+                self.configure(globalRate, perClientRate)
+            elif method not in ("GET", "HEAD"):
+                return content.errorResponse(HTTPStatus.METHOD_NOT_ALLOWED, "Use GET or POST", [("Allow", "GET, POST")])
+            return content.jsonResponse(self.describe())
+        content.addEndpoint(self.CONTROL_ENDPOINT, handleControlRequest)
@@ -0,0 +1,254 @@
+import os
+import struct
+
+import numpy as np
+
+from utils.LogFileTail import LogFileTail
+from utils.NameserverLogFileParser import NameserverLogFileEntry
+from utils.ProxyLogFileParser import InternedColumn, ProxyLogTable, splitColumns
+
+class BinaryLogFormat:
+    """
+        Fixed-width binary form of the proxy and nameserver logs.
+
+        The record file starts with a HEADER (magic, log kind, record size,
+        and the COMMIT: the offset of the text log converted up to and the
+        number of records), followed by one record per log line. Records
+        past the committed count are leftovers of an interrupted append.
+        Strings (IPs, segment and domain names) are stored as uint32 ids into
+        the string table, a sidecar file (<path>.strings) of one string per
+        line in id order. Numbers are float64 in the units of the text log.
+    """
+
+    MAGIC = b"VSBLOG\x00\x02"
+    HEADER = struct.Struct("<8s16sIIQQ") # magic, kind, record size, reserved, source offset, record count
+    COMMIT = struct.Struct("<QQ")        # source offset, record count
+    COMMIT_POSITION = HEADER.size - COMMIT.size
+    STRINGS_SUFFIX = ".strings"
+
+    RECORDS = {
+        "proxy": np.dtype([
+            ("browserIP", "<u4"),
+            ("segmentName", "<u4"),
+            ("adapatationProxyIP", "<u4"),
+            ("segmentTransferTime", "<f8"),
+            ("segmentTransferThroughput", "<f8"),
+            ("averageConnectionThroughput", "<f8"),
+            ("bitrateChosen", "<f8"),
+        ]),
+        "nameserver": np.dtype([
+            ("clientIP", "<u4"),
+            ("domainName", "<u4"),
+            ("answers", "<u4"),
+        ]),
+    }
+
+    @classmethod
+    def readHeader(cls, path):
+        """
+            (kind, record dtype, source offset, record count); raises
+            ValueError if path is not a binary log
+        """
+        with open(path, "rb") as logFile:
+            header = logFile.read(cls.HEADER.size)
+        if len(header) < cls.HEADER.size:
+            raise ValueError(f"{path} is not a binary log")
+        magic, kind, recordSize, _, sourceOffset, recordCount = cls.HEADER.unpack(header)
+        kind = kind.rstrip(b"\0").decode("ascii")
+        if magic != cls.MAGIC or kind not in cls.RECORDS or cls.RECORDS[kind].itemsize != recordSize:
+            raise ValueError(f"{path} is not a binary log")
+        return kind, cls.RECORDS[kind], sourceOffset, recordCount
+
+class BinaryLogWriter:
+    """
+        Appends log lines to a binary log, creating it if needed. Reopening
+        an existing one carries on with its string table.
+
+        Every append() writes the new strings, then the records, syncs both
+        to disk and only then commits them by rewriting the COMMIT of the
+        header, so that a reader never sees an id it cannot resolve, and a
+        crash at any point leaves the log as of the previous commit. What an
+        interrupted append wrote past it is cut off on reopening.
+    """
+
+    def __init__(self, path, kind):
+        if kind not in BinaryLogFormat.RECORDS:
+            raise ValueError(f"unknown log kind {kind!r}")
+        self.path = path
+        self.kind = kind
+        self.dtype = BinaryLogFormat.RECORDS[kind]
+        self.numberFields = [name for name in self.dtype.names if self.dtype[name].kind == "f"]
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        self.stringIds = {}
+        created = os.fstat(self.fd).st_size == 0
+        if created:
+            header = BinaryLogFormat.HEADER.pack(BinaryLogFormat.MAGIC, kind.encode("ascii"), self.dtype.itemsize,
+                                                 0, 0, 0)
+            os.pwrite(self.fd, header, 0)
+            os.fsync(self.fd)
+            self.sourceOffset = recordCount = 0
+        else:
+            existingKind, _, self.sourceOffset, recordCount = BinaryLogFormat.readHeader(path)
+            if existingKind != kind:
+                raise ValueError(f"{path} holds a {existingKind} log")
+        self.recordCount = recordCount
+        self.end = BinaryLogFormat.HEADER.size + recordCount * self.dtype.itemsize
+        os.ftruncate(self.fd, self.end)
+        self.stringsFile = open(path + BinaryLogFormat.STRINGS_SUFFIX, "ab+")
+        self.stringsFile.seek(0)
+        data = self.stringsFile.read()
+        # Drop a string left incomplete by an interrupted append; no commit refers to it
+        complete = 0 if created else data.rfind(b"\n") + 1
+        self.stringsFile.truncate(complete)
+        for string in data[:complete].decode("utf-8").splitlines():
+            self.stringIds[string] = len(self.stringIds)
+
+    def append(self, lines, sourceOffset=None):
+        """
+            Append the records of lines; sourceOffset, if given, is recorded
+            as the offset of the text log they were read up to
+        """
+        columns = splitColumns(lines, len(self.dtype.names))
+        count = len(columns[0])
+        if count:
+            records = np.empty(count, dtype=self.dtype)
+            newStrings = []
+            for idx, name in enumerate(self.dtype.names):
+                if name in self.numberFields:
+                    records[name] = np.array(columns[idx], dtype=np.float64)
+                    continue
+                column = InternedColumn.fromStrings(columns[idx])
+                remap = np.empty(len(column.values), dtype=np.uint32)
+                for code, value in enumerate(column.values):
+                    stringId = self.stringIds.get(value)
+                    if stringId is None:
+                        stringId = self.stringIds[value] = len(self.stringIds)
+                        newStrings.append(value)
+                    remap[code] = stringId
+                records[name] = remap[column.codes]
+            if newStrings:
+                self.stringsFile.write("".join(string + "\n" for string in newStrings).encode("utf-8"))
+                self.stringsFile.flush()
+                os.fsync(self.stringsFile.fileno())
+            data = records.tobytes()
+            os.pwrite(self.fd, data, self.end)
+            os.fdatasync(self.fd)
+        if count or sourceOffset is not None:
+            if sourceOffset is not None:
+                self.sourceOffset = sourceOffset
+            os.pwrite(self.fd, BinaryLogFormat.COMMIT.pack(self.sourceOffset, self.recordCount + count),
+                      BinaryLogFormat.COMMIT_POSITION)
+            self.recordCount += count
+            self.end += count * self.dtype.itemsize
+        return count
+
+    def close(self):
+        self.stringsFile.close()
+        os.close(self.fd)
+
+class BinaryLogConverter:
+    """
+        Converts a text log to a binary one incrementally: every convertNew()
+        appends the lines written since the previous call (see LogFileTail),
+        and the offset reached is kept in the binary log's header, so that a
+        later run resumes where this one stopped
+    """
+
+    CHUNK_SIZE = 16 * 1024 * 1024 # bytes of text converted at a time
+
+    def __init__(self, textPath, binaryPath, kind, chunkSize=CHUNK_SIZE):
+        self.writer = BinaryLogWriter(binaryPath, kind)
+        self.tail = LogFileTail(textPath, startOffset=self.writer.sourceOffset)
+        self.chunkSize = chunkSize
+
+    def convertNew(self):
+        """
+            Number of lines converted; raises FileNotFoundError until the
+            text log is created
+        """
+        converted = 0
+        while True:
+            before = self.tail.offset
+            lines = self.tail.readNewLines(self.chunkSize)
+            converted += self.writer.append(lines, self.tail.offset - len(self.tail.partial))
+            if self.tail.offset - before < self.chunkSize:
+                return converted
+
+    def close(self):
+        self.tail.close()
+        self.writer.close()
+
+class BinaryLogReader:
+    """
+        Memory-mapped view of a binary log: records() is a NumPy structured
+        array backed by the file, so only the pages a computation touches are
+        read. The log may keep growing; every call maps the records committed
+        at that time.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.kind, self.dtype, _, _ = BinaryLogFormat.readHeader(path)
+        self.strings = []
+        self.stringIds = {}
+        self._stringsOffset = 0
+
+    def __len__(self):
+        return BinaryLogFormat.readHeader(self.path)[3]
+
+    def records(self, start=0, stop=None):
+        count = len(self)
+        start, stop, _ = slice(start, stop).indices(count)
+        if stop <= start:
+            return np.empty(0, dtype=self.dtype)
+        return np.memmap(self.path, dtype=self.dtype, mode="r",
+                         offset=BinaryLogFormat.HEADER.size + start * self.dtype.itemsize, shape=(stop - start,))
+
+    def string(self, stringId):
+        if stringId >= len(self.strings):
+            self._loadStrings()
+        return self.strings[stringId]
+
+    def stringId(self, value):
+        """
+            Id of value for comparisons with the string fields of records(),
+            None if it never occurs in the log
+        """
+        if value not in self.stringIds:
+            self._loadStrings()
+        return self.stringIds.get(value)
+
+    def _loadStrings(self):
+        with open(self.path + BinaryLogFormat.STRINGS_SUFFIX, "rb") as stringsFile:
+            stringsFile.seek(self._stringsOffset)
+            data = stringsFile.read()
+        complete = data.rfind(b"\n") + 1
+        for string in data[:complete].decode("utf-8").splitlines():
+            self.stringIds[string] = len(self.strings)
+            self.strings.append(string)
+        self._stringsOffset += complete
+
+    def proxyTable(self, start=0, stop=None):
+        """
+            ProxyLogTable of records start to stop of a proxy log, its numeric
+            columns still backed by the file
+        """
+        if self.kind != "proxy":
+            raise ValueError(f"{self.path} holds a {self.kind} log")
+        records = self.records(start, stop)
+        self._loadStrings()
+        values = tuple(self.strings)
+        return ProxyLogTable(
+            {field: InternedColumn(records[field].astype(np.int32), values) for field in ProxyLogTable.STRING_FIELDS},
+            {field: records[field] for field in ProxyLogTable.UNITS}
+        )
+
+    def nameserverEntries(self, start=0, stop=None):
+        if self.kind != "nameserver":
+            raise ValueError(f"{self.path} holds a {self.kind} log")
+        records = self.records(start, stop)
+        self._loadStrings()
+        return [
+            NameserverLogFileEntry(*(self.strings[stringId] for stringId in record))
+            for record in records.tolist()
+        ]
@@ -0,0 +1,65 @@
+import email.utils
+
+from typing import NamedTuple
+
+class ByteRange(NamedTuple):
+    start: int
+    end: int # inclusive
+
+    @property
+    def length(self):
+        return self.end - self.start + 1
+
+    def contentRange(self, size):
+        return f"bytes {self.start}-{self.end}/{size}"
+
+    @classmethod
+    def parse(cls, header, size):
+        """
+            Parse a Range header against a representation of the given size.
+
+            Returns None when the header must be ignored (not a bytes range or
+            malformed) and raises ValueError when the range can't be satisfied,
+            which includes multi-range requests since we never send
+            multipart/byteranges responses
+        """
+        unit, _, rangeSet = header.partition("=")
+        if unit.strip().lower() != "bytes" or not rangeSet.strip():
+            return None
+        if "," in rangeSet:
+            raise ValueError("multiple ranges are not supported")
+        first, dash, last = rangeSet.strip().partition("-")
+        if not dash or not (first.isdigit() or first == "") or not (last.isdigit() or last == ""):
+            return None
+        if first == "":
+            # Suffix range: the last N bytes
+            if last == "":
+                return None
+            suffixLength = int(last)
+            if suffixLength == 0 or size == 0:
+                raise ValueError("empty suffix range")
+            return cls(max(size - suffixLength, 0), size - 1)
+        start = int(first)
+        if last != "" and int(last) < start:
+            return None
+        if start >= size:
+            raise ValueError("range starts past the end of the representation")
+        end = int(last) if last != "" else size - 1
+        return cls(start, min(end, size - 1))
+
+    @staticmethod
+    def ifRangeMatches(ifRange, etag, lastModified):
+        """
+            Evaluate an If-Range precondition against the current validators
+            (lastModified as a POSIX timestamp). Weak entity tags never match
+        """
+        ifRange = ifRange.strip()
+        if ifRange.startswith("W/"):
+            return False
+        if ifRange.startswith("\""):
+            return ifRange == etag
+        try:
+            date = email.utils.parsedate_to_datetime(ifRange)
+        except (TypeError, ValueError, IndexError):
+            return False
+        return int(date.timestamp()) == int(lastModified)
@@ -0,0 +1,111 @@
+import gzip
+import logging
+import os
+import threading
+
+from typing import NamedTuple
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+class CompressedVariant(NamedTuple):
+    data: bytes
+    encoding: str
+    etag: str
+    sourceMtimeNs: int
+    sourceSize: int
+
+class CompressedAssetStore:
+    """
+        Keeps gzip (and brotli, if the brotli package is installed) variants
+        of text assets such as playlists and the player's HTML/JS.
+
+        Variants are built once per file version, either up front from the
+        content index or on the first request, and picked per request based
+        on Accept-Encoding. Media segments are never compressed.
+    """
+
+    COMPRESSIBLE_EXTENSIONS = (".m3u8", ".html", ".htm", ".js", ".css", ".json", ".txt", ".svg")
+    MIN_SIZE = 256 # bytes; smaller bodies aren't worth the Content-Encoding
+    GZIP_LEVEL = 9
+    BROTLI_QUALITY = 11
+
+    def __init__(self):
+        self.encodings = ("br", "gzip") if brotli is not None else ("gzip",)
+        self._variants = {}
+        self._lock = threading.Lock()
+
+    def isCompressible(self, path, size):
+        return size >= self.MIN_SIZE and os.path.splitext(path)[1].lower() in self.COMPRESSIBLE_EXTENSIONS
+
+    def negotiate(self, acceptEncoding):
+        """
+            Pick the best encoding we have among those accepted by the client,
+            or None if the identity encoding should be sent
+        """
+        if not acceptEncoding:
+            return None
+        qualities = {}
+        for item in acceptEncoding.split(","):
+            coding, *parameters = [part.strip() for part in item.split(";")]
+            quality = 1.0
+            for parameter in parameters:
+                name, _, value = parameter.partition("=")
+                if name.strip().lower() == "q":
+                    try:
+                        quality = float(value)
+                    except ValueError:
+                        quality = 0.0
+            qualities[coding.lower()] = quality
+        best = None
+        for encoding in self.encodings:
+            quality = qualities.get(encoding, qualities.get("*", 0.0))
+            if quality > 0 and (best is None or quality > best[1]):
+                best = (encoding, quality)
+        return best[0] if best is not None else None
+
+    def get(self, info, encoding, readContent):
+        """
+            Return the variant of the file described by info (a ContentIndexEntry)
+            in the given encoding, compressing readContent() if the stored one is
+            missing or stale
+        """
+        key = (info.path, encoding)
+        variant = self._variants.get(key)
+        if variant is not None and variant.sourceMtimeNs == info.mtimeNs and variant.sourceSize == info.size:
+            return variant
+        variant = CompressedVariant(
+            data=self._compress(bytes(readContent()), encoding),
+            encoding=encoding,
+            etag=info.etag[:-1] + f"-{encoding}\"",
+            sourceMtimeNs=info.mtimeNs,
+            sourceSize=info.size
+        )
+        with self._lock:
+            self._variants[key] = variant
+        return variant
+
+    def precompress(self, contentIndex):
+        count = 0
+        for info in list(contentIndex.files.values()):
+            if not self.isCompressible(info.path, info.size):
+                continue
+            def readContent():
+                with open(info.path, "rb") as file:
+                    return file.read()
+            try:
+                for encoding in self.encodings:
+                    self.get(info, encoding, readContent)
+            except OSError:
+                continue
+            count += 1
+        logging.info(f"Precompressed {count} assets ({', '.join(self.encodings)})")
+
+    def _compress(self, data, encoding):
+        if encoding == "br":
+            return brotli.compress(data, quality=self.BROTLI_QUALITY)
+        if encoding == "gzip":
+            return gzip.compress(data, compresslevel=self.GZIP_LEVEL, mtime=0)
+        raise ValueError(f"unsupported encoding {encoding!r}")
@@ -0,0 +1,88 @@
+import threading
+
+from http import HTTPStatus
+
+class ConnectionLimiter:
+    """
+        Connection admission and keep-alive limits shared by both engines.
+
+        Connections beyond maxConnections are shed right away with a canned
+        503 carrying Retry-After instead of queueing up behind the busy ones.
+        Connections idle for longer than idleTimeout seconds between requests
+        are closed. Counts how often each limit was hit. With --workers every
+        worker applies the limits to its own connections.
+    """
+
+    ENDPOINT = "/_server/connections"
+    REJECTION_MESSAGE = b"Server busy, retry later\n"
+
+    def __init__(self, maxConnections=None, idleTimeout=None, retryAfter=1, metrics=None):
+        if maxConnections is not None and maxConnections < 1:
+            raise ValueError
+        if idleTimeout is not None and idleTimeout <= 0:
+            raise ValueError
+        self.maxConnections = maxConnections
+        self.idleTimeout = idleTimeout
+        self.retryAfter = retryAfter
+        self.metrics = metrics
+        self.activeConnections = 0
+        self.peakConnections = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.idleTimeouts = 0
+        self._lock = threading.Lock()
+
+    def tryAcquire(self):
+        """
+            Admit a new connection, or return False if it must be shed. Every
+            admitted connection must be release()d
+        """
+        with self._lock:
+            if self.maxConnections is not None and self.activeConnections >= self.maxConnections:
+                self.rejected += 1
+                admitted = False
+            else:
+                self.activeConnections += 1
+                self.peakConnections = max(self.peakConnections, self.activeConnections)
+                self.accepted += 1
+                admitted = True
+        if not admitted and self.metrics is not None:
+            self.metrics.limitHit("max_connections")
+        return admitted
+
+    def release(self):
+        with self._lock:
+            self.activeConnections -= 1
+
+    def idleTimedOut(self):
+        with self._lock:
+            self.idleTimeouts += 1
+        if self.metrics is not None:
+            self.metrics.limitHit("idle_timeout")
+
+    def rejectionResponse(self, extraHeaders=()):
+        lines = [
+            f"HTTP/1.1 {HTTPStatus.SERVICE_UNAVAILABLE.value} {HTTPStatus.SERVICE_UNAVAILABLE.phrase}",
+            "Content-Type: text/plain",
+            f"Content-Length: {len(self.REJECTION_MESSAGE)}",
+            f"Retry-After: {self.retryAfter}",
+            "Cache-Control: no-store",
+            "Connection: close",
+        ]
+        lines.extend(f"{name}: {value}" for name, value in extraHeaders)
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + self.REJECTION_MESSAGE
+
+    def stats(self):
+        with self._lock:
+            return {
+                "activeConnections": self.activeConnections,
+                "peakConnections": self.peakConnections,
+                "maxConnections": self.maxConnections,
+                "idleTimeout": self.idleTimeout,
+                "accepted": self.accepted,
+                "rejected": self.rejected,
+                "idleTimeouts": self.idleTimeouts,
+            }
+
+    def addEndpoint(self, content):
+        content.addEndpoint(self.ENDPOINT, lambda method, target, headers: content.jsonResponse(self.stats()))
@@ -0,0 +1,160 @@
+import email.utils
+import logging
+import os
+import posixpath
+import threading
+import time
+import urllib.parse
+
+from typing import NamedTuple
+
+from utils.HlsPlaylist import MasterPlaylist, MediaPlaylist, PlaylistCache, SegmentTable, segmentUrlPaths
+
+class ContentIndexEntry(NamedTuple):
+    path: str
+    size: int
+    mtime: float
+    mtimeNs: int
+    contentType: str
+    etag: str
+    lastModified: str
+
+    @classmethod
+    def create(cls, path, size, mtime, mtimeNs, contentType):
+        return cls(
+            path=path,
+            size=size,
+            mtime=mtime,
+            mtimeNs=mtimeNs,
+            contentType=contentType,
+            etag=makeETag(mtimeNs, size),
+            lastModified=email.utils.formatdate(mtime, usegmt=True)
+        )
+
+    @classmethod
+    def fromStat(cls, path, fileStat, contentType):
+        return cls.create(path, fileStat.st_size, fileStat.st_mtime, fileStat.st_mtime_ns, contentType)
+
+def makeETag(mtimeNs, size):
+    return f"\"{mtimeNs:x}-{size:x}\""
+
+def normalizeUrlPath(urlPath):
+    """
+        Map a request path to the key it is indexed under, applying the
+        same rules as SimpleHTTPRequestHandler.translate_path()
+    """
+    urlPath = urllib.parse.unquote(urlPath, errors="surrogatepass")
+    urlPath = posixpath.normpath(urlPath)
+    words = [
+        word for word in urlPath.split("/")
+        if word and not os.path.dirname(word) and word not in (os.curdir, os.pardir)
+    ]
+    return "/" + "/".join(words)
+
+class ContentIndex:
+    """
+        Snapshot of every file under the content root, keyed by URL path.
+
+        Holds the size, mtime, MIME type and precomputed validators of each
+        file, plus the parsed .m3u8 playlists, so that requests can be resolved
+        without stat()ing or guessing anything. Files added after the index was
+        built are not served until reload() is called. Media playlists carry
+        the byte size of each of their segments (-1 if missing), and only
+        playlists that changed since the previous reload are parsed again.
+    """
+
+    def __init__(self, contentPath, guessType):
+        self.contentPath = os.fspath(contentPath)
+        self.guessType = guessType
+        self.files = {}
+        self.directories = set()
+        self.playlists = {}
+        self.builtAt = None
+        self.playlistCache = PlaylistCache(maxEntries=None)
+        self._reloadLock = threading.Lock()
+        self.reload()
+
+    def reload(self):
+        with self._reloadLock:
+            start = time.monotonic()
+            files = {}
+            directories = set()
+            playlists = {}
+            for root, _, fileNames in os.walk(self.contentPath):
+                relativeRoot = os.path.relpath(root, self.contentPath)
+                urlRoot = "/" if relativeRoot == os.curdir else "/" + relativeRoot.replace(os.sep, "/")
+                directories.add(urlRoot)
+                for fileName in fileNames:
+                    path = os.path.join(root, fileName)
+                    try:
+                        fileStat = os.stat(path)
+                    except OSError:
+                        continue
+                    urlPath = posixpath.join(urlRoot, fileName)
+                    files[urlPath] = ContentIndexEntry.fromStat(path, fileStat, self.guessType(path))
+                    if fileName.endswith(".m3u8"):
+                        try:
+                            playlists[urlPath] = self.playlistCache.load(path, fileStat)
+                        except (OSError, ValueError, UnicodeDecodeError):
+                            logging.warning(f"Could not parse playlist {path}")
+            for urlPath, playlist in playlists.items():
+                if isinstance(playlist, MediaPlaylist):
+                    sizes = [
+                        entry.size if (entry := files.get(segmentPath)) is not None else SegmentTable.UNKNOWN_SIZE
+                        for segmentPath in segmentUrlPaths(urlPath, playlist)
+                    ]
+                    playlists[urlPath] = playlist._replace(segments=playlist.segments.withSizes(sizes))
+            # Swap the new tables in at once so that concurrent lookups see either
+            # the old or the new index, never a mix
+            self.files, self.directories, self.playlists = files, directories, playlists
+            self.builtAt = time.time()
+            logging.info(f"Indexed {len(files)} files ({len(playlists)} playlists) under {self.contentPath} "
+                         f"in {time.monotonic() - start:.3f}s")
+
+    def lookup(self, urlPath):
+        return self.files.get(urlPath)
+
+    def isDirectory(self, urlPath):
+        return (urlPath.rstrip("/") or "/") in self.directories
+
+    def refresh(self, urlPath, entry, size, mtime, mtimeNs):
+        """
+            Return entry if it still describes a file of the given size and
+            mtime, otherwise an updated entry (which replaces the stale one)
+        """
+        if entry.mtimeNs == mtimeNs and entry.size == size:
+            return entry
+        entry = ContentIndexEntry.create(entry.path, size, mtime, mtimeNs, entry.contentType)
+        self.files[urlPath] = entry
+        return entry
+
+    def describe(self):
+        """
+            Summary of the indexed titles for the introspection endpoint: every
+            master playlist with its renditions and their media playlists
+        """
+        playlists = self.playlists
+        masters = {}
+        for urlPath, playlist in sorted(playlists.items()):
+            if not isinstance(playlist, MasterPlaylist):
+                continue
+            renditions = []
+            for rendition in playlist.renditions:
+                mediaUrlPath = posixpath.normpath(posixpath.join(posixpath.dirname(urlPath), rendition.uri))
+                media = playlists.get(mediaUrlPath)
+                description = rendition._asdict()
+                description["playlist"] = mediaUrlPath
+                if isinstance(media, MediaPlaylist):
+                    sizes = media.segments.sizes
+                    description["segments"] = len(media.segments)
+                    description["duration"] = round(media.duration, 6)
+                    description["bytes"] = sum(size for size in sizes if size >= 0)
+                    description["missingSegments"] = sizes.count(SegmentTable.UNKNOWN_SIZE)
+                renditions.append(description)
+            masters[urlPath] = renditions
+        return {
+            "contentPath": self.contentPath,
+            "builtAt": email.utils.formatdate(self.builtAt, usegmt=True),
+            "files": len(self.files),
+            "titles": masters,
+        }
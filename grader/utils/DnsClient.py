@@ -0,0 +1,95 @@
+import random
+import socket
+import struct
+
+TYPE_A = 1
+CLASS_IN = 1
+FLAG_RECURSION_DESIRED = 0x0100
+FLAG_RESPONSE = 0x8000
+RCODE_MASK = 0x000f
+HEADER = struct.Struct("!HHHHHH")
+QUESTION_TAIL = struct.Struct("!HH")
+ANSWER_TAIL = struct.Struct("!HHIH")
+
+def buildQuery(queryId, domainName):
+    """
+        DNS query message with a single A question for domainName
+    """
+    question = b""
+    for label in domainName.rstrip(".").split("."):
+        encoded = label.encode("idna")
+        if not 0 < len(encoded) < 64:
+            raise ValueError(f"invalid domain name {domainName!r}")
+        question += bytes([len(encoded)]) + encoded
+    question += b"\x00" + QUESTION_TAIL.pack(TYPE_A, CLASS_IN)
+    return HEADER.pack(queryId, FLAG_RECURSION_DESIRED, 1, 0, 0, 0) + question
+
+def _skipName(message, offset):
+    while True:
+        if offset >= len(message):
+            raise ValueError("truncated DNS message")
+        length = message[offset]
+        if length & 0xc0 == 0xc0:
+            # Compression pointer, which always ends the name
+            return offset + 2
+        if length == 0:
+            return offset + 1
+        offset += 1 + length
+
+def parseResponse(queryId, message):
+    """
+        IPv4 addresses of the A records answering query queryId, in the
+        order of the message. Raises ValueError on a malformed or mismatched
+        message and LookupError if the server reported an error
+    """
+    if len(message) < HEADER.size:
+        raise ValueError("truncated DNS message")
+    responseId, flags, questionCount, answerCount, _, _ = HEADER.unpack_from(message)
+    if responseId != queryId or not flags & FLAG_RESPONSE:
+        raise ValueError("unexpected DNS message")
+    if flags & RCODE_MASK:
+        raise LookupError(f"DNS error (rcode {flags & RCODE_MASK})")
+    offset = HEADER.size
+    for _ in range(questionCount):
+        offset = _skipName(message, offset) + QUESTION_TAIL.size
+    addresses = []
+    for _ in range(answerCount):
+        offset = _skipName(message, offset)
+        if offset + ANSWER_TAIL.size > len(message):
+            raise ValueError("truncated DNS message")
+        recordType, recordClass, _, dataLength = ANSWER_TAIL.unpack_from(message, offset)
+        offset += ANSWER_TAIL.size
+        data = message[offset:offset + dataLength]
+        if len(data) != dataLength:
+            raise ValueError("truncated DNS message")
+        if recordType == TYPE_A and recordClass == CLASS_IN and dataLength == 4:
+            addresses.append(socket.inet_ntoa(data))
+        offset += dataLength
+    return addresses
+
+def resolve(domainName, nameserverIp, nameserverPort=53, timeout=2.0, attempts=3):
+    """
+        Resolve domainName to its IPv4 addresses with an A query over UDP to
+        the given nameserver, retrying on timeouts. Raises LookupError if the
+        name has no address
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect((nameserverIp, nameserverPort))
+        for attempt in range(attempts):
+            queryId = random.getrandbits(16)
+            sock.send(buildQuery(queryId, domainName))
+            try:
+                while True:
+                    try:
+                        addresses = parseResponse(queryId, sock.recv(65535))
+                        break
+                    except ValueError:
+                        # Stale answer to an earlier attempt or garbage; keep waiting
+                        continue
+            except TimeoutError:
+                continue
+            if not addresses:
+                raise LookupError(f"{domainName} has no A record")
+            return addresses
+    raise TimeoutError(f"no answer from nameserver {nameserverIp}:{nameserverPort}")
@@ -0,0 +1,267 @@
+import asyncio
+import http.client
+import io
+import urllib.parse
+
+from typing import NamedTuple
+
+from utils.HlsPlaylist import MasterPlaylist, MediaPlaylist, parsePlaylist
+
+class SessionStats(NamedTuple):
+    segments: int
+    bytes: int
+    errors: int
+    startupDelay: float    # seconds from the player URL being opened until playback started, None if it never did
+    position: float        # playback position reached, seconds
+    stalls: int
+    stallDuration: float   # seconds
+
+class HttpError(Exception):
+
+    def __init__(self, status, urlPath):
+        super().__init__(f"{status} for {urlPath}")
+        self.status = status
+
+class _HttpConnection:
+    """
+        Keep-alive HTTP/1.1 connection issuing one GET at a time, reopened on
+        demand
+    """
+
+    COPY_BUFFER_SIZE = 256 * 1024
+
+    def __init__(self, host, port, localAddress=None):
+        self.host = host
+        self.port = port
+        self.localAddress = localAddress
+        self.reader = None
+        self.writer = None
+
+    async def get(self, urlPath, keepBody=True):
+        """
+            Returns the body of a 200 response (its length if not keepBody),
+            raises HttpError for any other status
+        """
+        for attempt in range(2):
+            reused = self.writer is not None
+            if not reused:
+                localAddr = (self.localAddress, 0) if self.localAddress is not None else None
+                self.reader, self.writer = await asyncio.open_connection(self.host, self.port, local_addr=localAddr)
+            try:
+                self.writer.write(f"GET {urlPath} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n\r\n".encode("latin-1"))
+                await self.writer.drain()
+                head = await self.reader.readuntil(b"\r\n\r\n")
+                break
+            except (ConnectionError, asyncio.IncompleteReadError):
+                # A reused connection may have been closed by the server while idle
+                self.close()
+                if not reused:
+                    raise
+        lines = head.decode("iso-8859-1").split("\r\n")
+        status = int(lines[0].split()[1])
+        headers = http.client.parse_headers(io.BytesIO(head[len(lines[0]) + 2:]))
+        body = await self._readBody(headers, keepBody)
+        if headers.get("Connection", "").lower() == "close":
+            self.close()
+        if status != 200:
+            raise HttpError(status, urlPath)
+        return body
+
+    async def _readBody(self, headers, keepBody):
+        chunks = [] if keepBody else None
+        length = 0
+        if "chunked" in headers.get("Transfer-Encoding", "").lower():
+            while size := int((await self.reader.readuntil(b"\r\n")).split(b";")[0], 16):
+                data = await self.reader.readexactly(size)
+                await self.reader.readexactly(2)
+                length += size
+                if keepBody:
+                    chunks.append(data)
+            while await self.reader.readuntil(b"\r\n") != b"\r\n":
+                pass
+        elif headers.get("Content-Length") is not None:
+            remaining = int(headers["Content-Length"])
+            while remaining > 0:
+                data = await self.reader.read(min(remaining, self.COPY_BUFFER_SIZE))
+                if not data:
+                    raise asyncio.IncompleteReadError(b"", remaining)
+                remaining -= len(data)
+                length += len(data)
+                if keepBody:
+                    chunks.append(data)
+        else:
+            while data := await self.reader.read(self.COPY_BUFFER_SIZE):
+                length += len(data)
+                if keepBody:
+                    chunks.append(data)
+            self.close()
+        return b"".join(chunks) if keepBody else length
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+class HlsSession:
+    """
+        Headless stand-in for player.html: plays a title the way hls.js is
+        configured there, without decoding anything.
+
+        Opening the player URL (built like the tests' _makePlayerUrl) fetches
+        the page and hls.min.js, then the master playlist named by its
+        manifest parameter and the media playlist of rendition level of its
+        ladder (0, the lowest bitrate, as hls.js's startLevel on its levels
+        sorted by bitrate). Segments are then fetched one after the other over a
+        single keep-alive connection for as long as less than maxBufferLength
+        seconds are buffered ahead of the playhead. Playback starts once the
+        first segment arrived, advances in real time and stalls whenever the
+        playhead catches up with the buffer. Live playlists (without
+        #EXT-X-ENDLIST) are reloaded every target duration once their
+        segments are all fetched.
+    """
+
+    MAX_BUFFER_LENGTH = 10 # seconds, maxMaxBufferLength in player.html
+    PLAYER_ASSETS = ("hls.min.js",)
+    SEGMENT_ATTEMPTS = 3
+    LIVE_START_SEGMENTS = 3 # live playback starts this many segments from the end
+
+    def __init__(self, playerUrl, level=0, maxBufferLength=MAX_BUFFER_LENGTH, fetchPlayer=True, localAddress=None):
+        self.playerUrl = playerUrl
+        parts = urllib.parse.urlsplit(playerUrl)
+        manifest = urllib.parse.parse_qs(parts.query).get("manifest")
+        if not manifest:
+            raise ValueError(f"no manifest in {playerUrl!r}")
+        self.manifestUrl = urllib.parse.urljoin(playerUrl, manifest[0])
+        self.level = level
+        self.maxBufferLength = maxBufferLength
+        self.fetchPlayer = fetchPlayer
+        self.connection = _HttpConnection(parts.hostname, parts.port or 80, localAddress)
+        self.segments = 0
+        self.bytes = 0
+        self.errors = 0
+        self.startupDelay = None
+        self.position = 0.0
+        self.buffered = 0.0
+        self.playing = False
+        self.stalled = False
+        self.stalls = 0
+        self.stallDuration = 0.0
+        self.until = None
+        self._openedAt = None
+        self._lastUpdate = None
+
+    def stats(self):
+        return SessionStats(
+            segments=self.segments,
+            bytes=self.bytes,
+            errors=self.errors,
+            startupDelay=self.startupDelay,
+            position=self.position,
+            stalls=self.stalls,
+            stallDuration=self.stallDuration
+        )
+
+    async def play(self, until):
+        """
+            Open the player and play until the playhead reaches until seconds
+            or the title ends
+        """
+        loop = asyncio.get_running_loop()
+        self.until = until
+        self._openedAt = self._lastUpdate = loop.time()
+        try:
+            await self._play(loop, until)
+        finally:
+            self._advance(loop.time())
+            self.playing = False
+            self.connection.close()
+
+    async def _play(self, loop, until):
+        if self.fetchPlayer:
+            await self.connection.get(self._path(self.playerUrl))
+            for asset in self.PLAYER_ASSETS:
+                await self.connection.get(self._path(urllib.parse.urljoin(self.playerUrl, asset)), keepBody=False)
+        master = parsePlaylist((await self.connection.get(self._path(self.manifestUrl))).decode("utf-8"))
+        if isinstance(master, MasterPlaylist):
+            mediaUrl = urllib.parse.urljoin(self.manifestUrl, master.ladder[self.level].uri)
+            playlist = parsePlaylist((await self.connection.get(self._path(mediaUrl))).decode("utf-8"))
+        else:
+            mediaUrl, playlist = self.manifestUrl, master
+        if not isinstance(playlist, MediaPlaylist):
+            raise ValueError(f"{mediaUrl} is not a media playlist")
+        nextSequence = playlist.mediaSequence
+        if not playlist.endList:
+            nextSequence += max(len(playlist.segments) - self.LIVE_START_SEGMENTS, 0)
+
+        while True:
+            self._advance(loop.time())
+            if self.position >= until:
+                return
+            index = nextSequence - playlist.mediaSequence
+            if index < len(playlist.segments):
+                ahead = self.buffered - self.position
+                if ahead >= self.maxBufferLength:
+                    await asyncio.sleep(min(ahead - self.maxBufferLength, until - self.position) + 0.01)
+                    continue
+                segment = playlist.segments[index]
+                fetched = await self._fetchSegment(urllib.parse.urljoin(mediaUrl, segment.uri))
+                self._advance(loop.time())
+                nextSequence += 1
+                if not fetched:
+                    continue
+                self.buffered += segment.duration
+                if not self.playing:
+                    self.playing = True
+                    self.startupDelay = loop.time() - self._openedAt
+            elif playlist.endList:
+                # Play out what is buffered
+                remaining = min(self.buffered, until) - self.position
+                if remaining > 0 and self.playing:
+                    await asyncio.sleep(remaining)
+                    self._advance(loop.time())
+                return
+            else:
+                await asyncio.sleep(max(playlist.targetDuration, 1))
+                reloaded = parsePlaylist((await self.connection.get(self._path(mediaUrl))).decode("utf-8"))
+                if isinstance(reloaded, MediaPlaylist):
+                    if nextSequence < reloaded.mediaSequence:
+                        # Fell behind the live window
+                        nextSequence = reloaded.mediaSequence
+                    playlist = reloaded
+
+    async def _fetchSegment(self, segmentUrl):
+        """
+            Whether the segment was fetched; once all attempts failed it is
+            skipped, as hls.js does once it gives up on a fragment, and adds
+            nothing to the buffer
+        """
+        for attempt in range(self.SEGMENT_ATTEMPTS):
+            try:
+                self.bytes += await self.connection.get(self._path(segmentUrl), keepBody=False)
+                self.segments += 1
+                return True
+            except (HttpError, OSError, asyncio.IncompleteReadError):
+                self.errors += 1
+                self.connection.close()
+        return False
+
+    def _advance(self, now):
+        if self.playing:
+            # The player pauses once it reaches until, as VideoPlayer.playVideoUntil() does
+            elapsed = min(now - self._lastUpdate, self.until - self.position)
+            playable = self.buffered - self.position
+            if elapsed <= playable:
+                self.position += elapsed
+                self.stalled = False
+            else:
+                self.position = self.buffered
+                if not self.stalled:
+                    self.stalls += 1
+                    self.stalled = True
+                self.stallDuration += elapsed - max(playable, 0)
+        self._lastUpdate = now
+
+    @staticmethod
+    def _path(url):
+        parts = urllib.parse.urlsplit(url)
+        return urllib.parse.urlunsplit(("", "", parts.path or "/", parts.query, ""))
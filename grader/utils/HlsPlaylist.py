@@ -0,0 +1,214 @@
+import array
+import collections
+import math
+import os
+import posixpath
+import re
+import threading
+
+from typing import NamedTuple
+
+class Rendition(NamedTuple):
+    bandwidth: int
+    resolution: str
+    name: str
+    uri: str
+
+class MasterPlaylist(NamedTuple):
+    renditions: list
+
+    @property
+    def ladder(self):
+        """
+            Renditions by increasing BANDWIDTH
+        """
+        return sorted(self.renditions, key=lambda rendition: rendition.bandwidth)
+
+class MediaSegment(NamedTuple):
+    duration: float
+    uri: str
+    size: int = -1 # bytes, -1 if unknown
+
+class SegmentTable:
+    """
+        Segments of a media playlist stored column by column: durations and
+        byte sizes in arrays, URIs in a tuple. Indexing and iterating yield
+        MediaSegments, so that a table stands in for a list of them
+    """
+
+    __slots__ = ("durations", "uris", "sizes", "totalDuration")
+
+    UNKNOWN_SIZE = -1
+
+    def __init__(self, durations, uris, sizes=None):
+        self.durations = array.array("d", durations)
+        self.uris = tuple(uris)
+        if sizes is None:
+            sizes = array.array("q", [self.UNKNOWN_SIZE]) * len(self.uris)
+        self.sizes = array.array("q", sizes)
+        if not len(self.durations) == len(self.uris) == len(self.sizes):
+            raise ValueError
+        self.totalDuration = math.fsum(self.durations)
+
+    def withSizes(self, sizes):
+        return SegmentTable(self.durations, self.uris, sizes)
+
+    def __len__(self):
+        return len(self.uris)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return SegmentTable(self.durations[idx], self.uris[idx], self.sizes[idx])
+        return MediaSegment(self.durations[idx], self.uris[idx], self.sizes[idx])
+
+    def __iter__(self):
+        return map(MediaSegment, self.durations, self.uris, self.sizes)
+
+    def __eq__(self, other):
+        if not isinstance(other, SegmentTable):
+            return NotImplemented
+        return self.uris == other.uris and self.durations == other.durations and self.sizes == other.sizes
+
+    def __repr__(self):
+        return f"SegmentTable({len(self)} segments, {self.totalDuration:.3f}s)"
+
+class MediaPlaylist(NamedTuple):
+    targetDuration: float
+    mediaSequence: int
+    segments: SegmentTable
+    endList: bool
+
+    @property
+    def duration(self):
+        return self.segments.totalDuration
+
+ATTRIBUTE_PATTERN = re.compile(r'([A-Z0-9-]+)=("[^"]*"|[^,]*)')
+
+def parseAttributes(attributeList):
+    """
+        Parse an HLS attribute list (e.g. BANDWIDTH=1300000,NAME="240")
+        into a dict, with quotes stripped from quoted-string values
+    """
+    return {key: value.strip('"') for key, value in ATTRIBUTE_PATTERN.findall(attributeList)}
+
+def parsePlaylist(text):
+    """
+        Parse the text of a master or media .m3u8 playlist. Raises
+        ValueError if text is not an HLS playlist
+    """
+    lines = [line.strip() for line in text.splitlines()]
+    lines = [line for line in lines if line]
+    if not lines or lines[0] != "#EXTM3U":
+        raise ValueError("not an HLS playlist")
+    if any(line.startswith("#EXT-X-STREAM-INF:") for line in lines):
+        return _parseMasterPlaylist(lines)
+    return _parseMediaPlaylist(lines)
+
+def _parseMasterPlaylist(lines):
+    renditions = []
+    attributes = None
+    for line in lines[1:]:
+        if line.startswith("#EXT-X-STREAM-INF:"):
+            attributes = parseAttributes(line.partition(":")[2])
+        elif not line.startswith("#") and attributes is not None:
+            renditions.append(Rendition(
+                bandwidth=int(attributes.get("BANDWIDTH", 0)),
+                resolution=attributes.get("RESOLUTION", ""),
+                name=attributes.get("NAME", ""),
+                uri=line
+            ))
+            attributes = None
+    return MasterPlaylist(renditions=renditions)
+
+def _parseMediaPlaylist(lines):
+    targetDuration = 0.0
+    mediaSequence = 0
+    durations = []
+    uris = []
+    endList = False
+    duration = None
+    for line in lines[1:]:
+        if line.startswith("#EXT-X-TARGETDURATION:"):
+            targetDuration = float(line.partition(":")[2])
+        elif line.startswith("#EXT-X-MEDIA-SEQUENCE:"):
+            mediaSequence = int(line.partition(":")[2])
+        elif line.startswith("#EXTINF:"):
+            duration = float(line.partition(":")[2].partition(",")[0])
+        elif line == "#EXT-X-ENDLIST":
+            endList = True
+        elif not line.startswith("#") and duration is not None:
+            durations.append(duration)
+            uris.append(line)
+            duration = None
+    return MediaPlaylist(
+        targetDuration=targetDuration,
+        mediaSequence=mediaSequence,
+        segments=SegmentTable(durations, uris),
+        endList=endList
+    )
+
+def segmentUrlPaths(playlistUrlPath, playlist):
+    """
+        URL paths of the segments of a media playlist served at
+        playlistUrlPath
+    """
+    directory = posixpath.dirname(playlistUrlPath)
+    return [posixpath.normpath(posixpath.join(directory, uri)) for uri in playlist.segments.uris]
+
+class PlaylistCache:
+    """
+        Parsed playlists, each parsed again only once it changes: files are
+        keyed by path and checked against their mtime and size, playlists
+        fetched over HTTP by URL and their validator (ETag or Last-Modified).
+        Holds at most maxEntries playlists (None for no limit), dropping the
+        least recently used.
+    """
+
+    MAX_ENTRIES = 4096
+
+    def __init__(self, maxEntries=MAX_ENTRIES):
+        self.maxEntries = maxEntries
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def load(self, path, fileStat=None):
+        """
+            Parsed playlist of the file at path; fileStat saves a stat() when
+            the caller already has it. Raises OSError, UnicodeDecodeError or
+            ValueError like reading and parsing the file would
+        """
+        if fileStat is None:
+            fileStat = os.stat(path)
+        version = (fileStat.st_mtime_ns, fileStat.st_size)
+        playlist = self.get(path, version)
+        if playlist is None:
+            with open(path, "r") as playlistFile:
+                playlist = parsePlaylist(playlistFile.read())
+            self.put(path, version, playlist)
+        return playlist
+
+    def get(self, key, version):
+        """
+            Cached playlist of key if it was parsed at version, None otherwise
+        """
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] == version:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def put(self, key, version, playlist):
+        with self._lock:
+            self.entries[key] = (version, playlist)
+            self.entries.move_to_end(key)
+            while self.maxEntries is not None and len(self.entries) > self.maxEntries:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,138 @@
+import bisect
+import collections
+import itertools
+import math
+import threading
+import time
+import urllib.parse
+
+from http import HTTPStatus
+
+from utils.ContentIndex import ContentIndexEntry, normalizeUrlPath
+from utils.HlsPlaylist import MediaPlaylist
+
+class LiveWindow:
+    """
+        Sliding window over a VOD media playlist replayed in a loop as if it
+        were being published in real time.
+
+        Segment n (the media sequence number) is published once the segments
+        before it and itself have played out since the stream started; the
+        window holds the last windowSize published ones. Every time the VOD
+        playlist starts over, the segment is preceded by #EXT-X-DISCONTINUITY.
+        The playlist is kept as a deque of pre-rendered segment entries, only
+        newly published segments are rendered, and the text is cached until
+        the next segment is published.
+    """
+
+    def __init__(self, playlist, startTime, windowSize):
+        if not playlist.segments or windowSize < 1:
+            raise ValueError
+        self.uris = playlist.segments.uris
+        self.durations = playlist.segments.durations
+        self.segmentEnds = list(itertools.accumulate(self.durations))
+        self.loopDuration = self.segmentEnds[-1]
+        # Durations rounded to the nearest integer must not exceed it
+        self.targetDuration = max(math.ceil(playlist.targetDuration), round(max(self.durations)))
+        self.windowSize = windowSize
+        # Start with a full window rather than an empty playlist
+        self.origin = startTime - self.publishTime(min(windowSize, len(self.uris)) - 1)
+        self.published = 0
+        self.entries = collections.deque()
+        self.text = None
+        self._lock = threading.Lock()
+
+    def publishTime(self, sequence):
+        """
+            Time at which segment sequence has played out, relative to origin
+        """
+        loops, index = divmod(sequence, len(self.uris))
+        return loops * self.loopDuration + self.segmentEnds[index]
+
+    def publishedCount(self, now):
+        loops, remainder = divmod(now - self.origin, self.loopDuration)
+        return int(loops) * len(self.uris) + bisect.bisect_right(self.segmentEnds, remainder)
+
+    def render(self, now):
+        """
+            Return (playlist bytes, time its last segment was published)
+        """
+        published = self.publishedCount(now)
+        with self._lock:
+            if published != self.published or self.text is None:
+                self._advance(published)
+            return self.text, self.origin + self.publishTime(self.published - 1)
+
+    def _advance(self, published):
+        first = max(published - self.windowSize, 0)
+        if published - self.published >= self.windowSize:
+            self.entries.clear()
+            start = first
+        else:
+            start = self.published
+        for sequence in range(start, published):
+            self.entries.append(self._renderEntry(sequence))
+        while len(self.entries) > published - first:
+            self.entries.popleft()
+        self.published = published
+        # Discontinuities that already slid out of the window
+        discontinuitySequence = max(first - 1, 0) // len(self.uris)
+        header = (
+            "#EXTM3U\n"
+            "#EXT-X-VERSION:3\n"
+            f"#EXT-X-TARGETDURATION:{self.targetDuration}\n"
+            f"#EXT-X-MEDIA-SEQUENCE:{first}\n"
+            f"#EXT-X-DISCONTINUITY-SEQUENCE:{discontinuitySequence}\n"
+        )
+        self.text = (header + "".join(self.entries)).encode("utf-8")
+
+    def _renderEntry(self, sequence):
+        index = sequence % len(self.uris)
+        discontinuity = "#EXT-X-DISCONTINUITY\n" if index == 0 and sequence > 0 else ""
+        return f"{discontinuity}#EXTINF:{self.durations[index]:.6f},\n{self.uris[index]}\n"
+
+class LiveContent:
+    """
+        Exposes every indexed VOD title as a live stream under /live/:
+        /live/charge/charge.m3u8 is the master playlist of charge, whose media
+        playlists are served as sliding windows (see LiveWindow) advancing in
+        real time since the server started. Everything else under /live/ is
+        the file at the same path without the prefix. With --workers every
+        worker serves the same windows, as they share the start time.
+    """
+
+    PREFIX = "/live/"
+
+    def __init__(self, content, windowSize=6, startTime=None):
+        if content.contentIndex is None:
+            raise ValueError("live playlists need the content index")
+        self.content = content
+        self.windowSize = windowSize
+        self.startTime = startTime if startTime is not None else time.time()
+        self.windows = {}
+        self._lock = threading.Lock()
+        content.addPrefixEndpoint(self.PREFIX, self.resolve)
+
+    def resolve(self, method, target, headers):
+        parts = urllib.parse.urlsplit(target)
+        vodPath = parts.path[len(self.PREFIX) - 1:]
+        playlist = self.content.contentIndex.playlists.get(normalizeUrlPath(vodPath))
+        if not isinstance(playlist, MediaPlaylist) or not playlist.segments:
+            vodTarget = urllib.parse.urlunsplit(("", "", vodPath, parts.query, ""))
+            return self.content.resolve(method, vodTarget, headers)
+        if method not in ("GET", "HEAD"):
+            return self.content.errorResponse(HTTPStatus.NOT_IMPLEMENTED, f"Unsupported method ({method!r})")
+        window = self.window(normalizeUrlPath(vodPath), playlist)
+        text, publishedAt = window.render(time.time())
+        info = ContentIndexEntry.create(parts.path, len(text), publishedAt, int(publishedAt * 10**9),
+                                        self.content.guessType(vodPath))
+        return self.content.respondFromMemory(method, headers, info, text)
+
+    def window(self, urlPath, playlist):
+        window = self.windows.get(urlPath)
+        if window is None:
+            with self._lock:
+                window = self.windows.get(urlPath)
+                if window is None:
+                    window = self.windows[urlPath] = LiveWindow(playlist, self.startTime, self.windowSize)
+        return window
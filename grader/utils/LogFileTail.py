@@ -0,0 +1,102 @@
+import logging
+import os
+
+class LogFileTail:
+    """
+        Follows a log file as it grows, like tail -F: every readNewLines()
+        seeks to where the previous one stopped and returns the lines
+        completed since. A trailing line still being written is held back
+        until its newline arrives, unless includePartial asks for it: it is
+        then returned as it stands, and never again, whatever is appended to
+        it later (as the parsers did when they read the whole file).
+
+        A file that shrank below the offset read so far (truncated, or
+        reopened with "w") is read again from its start. A file replaced at
+        the same path (rotated) is read to its end before the new one is
+        followed from its start.
+
+        startOffset resumes following a log from a previous run, the offset
+        being where its lines were consumed up to (offset - len(partial));
+        it is ignored if the file is shorter.
+    """
+
+    def __init__(self, path, startOffset=0):
+        self.path = path
+        self.startOffset = startOffset
+        self.logFile = None
+        self.identity = None # (st_dev, st_ino) of the file being followed
+        self.offset = 0      # bytes read from it, held back partial line included
+        self.partial = b""
+        self.partialReturned = False
+        self.lineCount = 0   # lines returned from it
+        self.restarts = 0
+
+    def readNewLines(self, maxBytes=-1, includePartial=False):
+        """
+            Lines (without their newline) completed since the last call, out
+            of at most maxBytes more bytes of the file if given, followed by
+            the trailing unterminated line if includePartial; raises
+            FileNotFoundError until the log file is created
+        """
+        if self.logFile is None:
+            self._open(self.startOffset)
+            self.startOffset = 0
+            return self._readLines(maxBytes, includePartial=includePartial)
+        try:
+            pathStat = os.stat(self.path)
+        except FileNotFoundError:
+            # Rotated away, its successor not created yet
+            return self._readLines(maxBytes, includePartial=includePartial)
+        lines = []
+        if (pathStat.st_dev, pathStat.st_ino) != self.identity:
+            lines = self._readLines(final=True)
+            self.logFile.close()
+            self._open()
+            self.restarts += 1
+            logging.info(f"{self.path} was replaced, following the new file")
+        elif pathStat.st_size < self.offset:
+            self.logFile.seek(0)
+            self.offset = 0
+            self.partial = b""
+            self.partialReturned = False
+            self.lineCount = 0
+            self.restarts += 1
+            logging.info(f"{self.path} was truncated, reading it again from the start")
+        lines.extend(self._readLines(maxBytes, includePartial=includePartial))
+        return lines
+
+    def close(self):
+        if self.logFile is not None:
+            self.logFile.close()
+            self.logFile = None
+
+    def _open(self, offset=0):
+        self.logFile = open(self.path, "rb")
+        fileStat = os.fstat(self.logFile.fileno())
+        self.identity = (fileStat.st_dev, fileStat.st_ino)
+        if offset > fileStat.st_size:
+            offset = 0
+        self.logFile.seek(offset)
+        self.offset = offset
+        self.partial = b""
+        self.partialReturned = False
+        self.lineCount = 0
+
+    def _readLines(self, maxBytes=-1, final=False, includePartial=False):
+        data = self.logFile.read(-1 if final else maxBytes)
+        self.offset += len(data)
+        lines = (self.partial + data).split(b"\n")
+        self.partial = lines.pop()
+        if self.partialReturned and lines:
+            # Completes the line already returned
+            del lines[0]
+            self.partialReturned = False
+        if self.partial and not self.partialReturned and (final or includePartial):
+            lines.append(self.partial)
+            self.partialReturned = True
+        if final:
+            # Nothing more will be appended to a rotated file
+            self.partial = b""
+            self.partialReturned = False
+        self.lineCount += len(lines)
+        return [line.decode("utf-8") for line in lines]
@@ -0,0 +1,230 @@
+import asyncio
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+import threading
+
+class InotifyWatch:
+    """
+        inotify(7) watch, through ctypes, on the directory of a file: reports
+        whether the file was written, truncated, created or moved into place
+        since the last call to changed(). Watching the directory rather than
+        the file catches the file being created, or replaced on rotation
+    """
+
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_Q_OVERFLOW = 0x00004000
+    IN_NONBLOCK = os.O_NONBLOCK
+    IN_CLOEXEC = os.O_CLOEXEC
+    MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+    EVENT_HEADER = struct.Struct("iIII") # wd, mask, cookie, len
+    READ_SIZE = 64 * 1024
+
+    _libc = None
+
+    def __init__(self, path):
+        """
+            Raises OSError where inotify is not available
+        """
+        libc = self._loadLibc()
+        directory, self.fileName = os.path.split(os.path.abspath(path))
+        self.fileName = os.fsencode(self.fileName)
+        self.fd = libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            code = ctypes.get_errno()
+            raise OSError(code, os.strerror(code))
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), self.MASK) < 0:
+            code = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(code, os.strerror(code), directory)
+
+    @classmethod
+    def _loadLibc(cls):
+        if cls._libc is None:
+            try:
+                libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+                libc.inotify_init1.argtypes = (ctypes.c_int,)
+                libc.inotify_add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+            except (OSError, AttributeError) as error:
+                raise OSError(errno.ENOSYS, f"inotify not available: {error}")
+            cls._libc = libc
+        return cls._libc
+
+    def changed(self):
+        """
+            Drain the pending events; True if any concerned the file
+        """
+        changed = False
+        while True:
+            try:
+                data = os.read(self.fd, self.READ_SIZE)
+            except BlockingIOError:
+                return changed
+            offset = 0
+            while offset < len(data):
+                _, mask, _, length = self.EVENT_HEADER.unpack_from(data, offset)
+                offset += self.EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b"\0")
+                offset += length
+                if mask & self.IN_Q_OVERFLOW or name == self.fileName:
+                    changed = True
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+class LogFollower:
+    """
+        Follows a log through its parser (ProxyLogFileParser or
+        NameserverLogFileParser) and hands out what parseNewEntries() returns
+        every time the binaries write new lines, as soon as inotify reports
+        the write. Where inotify is not available (or usePolling is set) the
+        log is checked every pollInterval seconds instead. With inotify the log
+        is also checked every RESCAN_INTERVAL seconds, in case the directory
+        itself was replaced.
+
+        follow() is an async generator of the batches and iterate() its
+        blocking equivalent, both until stop() is called, which wakes them
+        from any thread; start() runs iterate() on a thread of its own,
+        calling back with every batch. Used as a context manager, the
+        follower is stopped on exit.
+
+        The follower consumes the parser's entries: a test following a log
+        must not also call parseNewEntries() on the same parser. Lines are
+        handed out once their newline is written.
+    """
+
+    POLL_INTERVAL = 0.05 # seconds
+    RESCAN_INTERVAL = 1.0 # seconds
+
+    def __init__(self, parser, pollInterval=POLL_INTERVAL, usePolling=False):
+        self.parser = parser
+        self.pollInterval = pollInterval
+        self.usePolling = usePolling
+        self._stopRequested = threading.Event()
+        self._lock = threading.Lock()
+        self._wakeups = set() # callables waking a running follow() or iterate()
+        self._thread = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def _openWatch(self):
+        if self.usePolling:
+            return None
+        try:
+            return InotifyWatch(self.parser.logFilePath)
+        except OSError as error:
+            logging.info(f"Polling {self.parser.logFilePath} every {self.pollInterval}s ({error})")
+            return None
+
+    def _parseNewEntries(self):
+        try:
+            return self.parser.parseNewEntries(includePartial=False)
+        except FileNotFoundError:
+            # Not created yet, or rotated away
+            return None
+
+    def _addWakeup(self, wakeup):
+        with self._lock:
+            self._wakeups.add(wakeup)
+        if self._stopRequested.is_set():
+            wakeup()
+
+    def _removeWakeup(self, wakeup):
+        with self._lock:
+            self._wakeups.discard(wakeup)
+
+    async def follow(self):
+        loop = asyncio.get_running_loop()
+        watch = self._openWatch()
+        event = asyncio.Event()
+        if watch is not None:
+            loop.add_reader(watch.fd, event.set)
+        def wakeup():
+            loop.call_soon_threadsafe(event.set)
+        self._addWakeup(wakeup)
+        timeout = self.pollInterval if watch is None else self.RESCAN_INTERVAL
+        try:
+            while not self._stopRequested.is_set():
+                entries = self._parseNewEntries()
+                if entries:
+                    yield entries
+                    continue
+                while not self._stopRequested.is_set():
+                    try:
+                        await asyncio.wait_for(event.wait(), timeout)
+                    except TimeoutError:
+                        break
+                    event.clear()
+                    if watch is not None and watch.changed():
+                        break
+        finally:
+            self._removeWakeup(wakeup)
+            if watch is not None:
+                loop.remove_reader(watch.fd)
+                watch.close()
+
+    def iterate(self):
+        watch = self._openWatch()
+        wakeRead, wakeWrite = os.pipe()
+        def wakeup():
+            os.write(wakeWrite, b"\0")
+        self._addWakeup(wakeup)
+        try:
+            while not self._stopRequested.is_set():
+                entries = self._parseNewEntries()
+                if entries:
+                    yield entries
+                    continue
+                if watch is None:
+                    self._stopRequested.wait(self.pollInterval)
+                    continue
+                while not self._stopRequested.is_set():
+                    readable, _, _ = select.select([watch.fd, wakeRead], [], [], self.RESCAN_INTERVAL)
+                    if wakeRead in readable:
+                        os.read(wakeRead, 4096)
+                    if not readable or (watch.fd in readable and watch.changed()):
+                        break
+        finally:
+            # Once removed, stop() no longer writes to the pipe
+            self._removeWakeup(wakeup)
+            os.close(wakeRead)
+            os.close(wakeWrite)
+            if watch is not None:
+                watch.close()
+
+    def start(self, callback):
+        """
+            Call callback with every batch of entries from a daemon thread
+        """
+        def run():
+            for entries in self.iterate():
+                callback(entries)
+        self._stopRequested.clear()
+        self._thread = threading.Thread(target=run, name=f"LogFollower {self.parser.logFilePath}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopRequested.set()
+        with self._lock:
+            for wakeup in self._wakeups:
+                wakeup()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+            self._thread = None
+
+    def close(self):
+        self.stop()
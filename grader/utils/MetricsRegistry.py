@@ -0,0 +1,173 @@
+import bisect
+import threading
+import weakref
+
+class MetricsRegistry:
+    """
+        Counters, gauges and histograms rendered in the Prometheus text
+        exposition format.
+
+        Updates take no lock: every thread accumulates into its own shard and
+        the shards are only summed when the metrics are rendered. Shards of
+        threads that exit are folded into a retired total, so nothing is lost
+        when ThreadingHTTPServer's per-connection threads come and go.
+    """
+
+    def __init__(self):
+        self.metrics = []
+        self._local = threading.local()
+        self._liveShards = {}
+        self._retired = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name, documentation, labelNames=()):
+        return self._register(Counter(self, name, documentation, labelNames))
+
+    def gauge(self, name, documentation, labelNames=()):
+        return self._register(Gauge(self, name, documentation, labelNames))
+
+    def histogram(self, name, documentation, buckets, labelNames=()):
+        return self._register(Histogram(self, name, documentation, labelNames, buckets))
+
+    def _register(self, metric):
+        if any(existing.name == metric.name for existing in self.metrics):
+            raise ValueError(f"metric {metric.name} already registered")
+        self.metrics.append(metric)
+        return metric
+
+    def shard(self):
+        """
+            The calling thread's own {(metric, labelValues): value} table
+        """
+        try:
+            return self._local.shard
+        except AttributeError:
+            pass
+        shard = {}
+        owner = _ShardOwner()
+        with self._lock:
+            self._liveShards[id(owner)] = shard
+        # The thread-local owner goes away when the thread exits
+        weakref.finalize(owner, self._retireShard, id(owner), shard)
+        self._local.owner = owner
+        self._local.shard = shard
+        return shard
+
+    def _retireShard(self, ownerId, shard):
+        with self._lock:
+            self._liveShards.pop(ownerId, None)
+            _mergeShard(self._retired, shard)
+
+    def collect(self):
+        """
+            Sum of all shards, {(metric, labelValues): value}
+        """
+        with self._lock:
+            total = {}
+            _mergeShard(total, self._retired)
+            for shard in self._liveShards.values():
+                # Copying a plain dict doesn't release the GIL, so the owning
+                # thread can't resize it under our feet
+                _mergeShard(total, dict(shard))
+        return total
+
+    def render(self):
+        values = self.collect()
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.TYPE}")
+            series = sorted((labelValues, value) for (owner, labelValues), value in values.items() if owner is metric)
+            for labelValues, value in series:
+                lines.extend(metric.renderSeries(labelValues, value))
+        return "\n".join(lines) + "\n"
+
+class _ShardOwner:
+    pass
+
+def _mergeShard(total, shard):
+    for key, value in shard.items():
+        if isinstance(value, list):
+            existing = total.get(key)
+            total[key] = list(value) if existing is None else [a + b for a, b in zip(existing, value)]
+        else:
+            total[key] = total.get(key, 0) + value
+
+def _formatLabels(labelNames, labelValues, extra=()):
+    pairs = list(zip(labelNames, labelValues)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f"{name}=\"{_escapeLabelValue(value)}\"" for name, value in pairs) + "}"
+
+def _escapeLabelValue(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _formatValue(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+class Counter:
+    TYPE = "counter"
+
+    def __init__(self, registry, name, documentation, labelNames):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelNames = tuple(labelNames)
+
+    def inc(self, *labelValues, amount=1):
+        if len(labelValues) != len(self.labelNames):
+            raise ValueError
+        shard = self.registry.shard()
+        key = (self, labelValues)
+        shard[key] = shard.get(key, 0) + amount
+
+    def renderSeries(self, labelValues, value):
+        return [f"{self.name}{_formatLabels(self.labelNames, labelValues)} {_formatValue(value)}"]
+
+class Gauge(Counter):
+    """
+        A value that goes up and down. Being sharded per thread it only
+        supports relative updates
+    """
+    TYPE = "gauge"
+
+    def dec(self, *labelValues, amount=1):
+        self.inc(*labelValues, amount=-amount)
+
+class Histogram:
+    TYPE = "histogram"
+
+    def __init__(self, registry, name, documentation, labelNames, buckets):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelNames = tuple(labelNames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labelValues):
+        if len(labelValues) != len(self.labelNames):
+            raise ValueError
+        shard = self.registry.shard()
+        key = (self, labelValues)
+        # Per-bucket (non-cumulative) counts, the +Inf count, then the sum
+        counts = shard.get(key)
+        if counts is None:
+            counts = shard[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def renderSeries(self, labelValues, counts):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts[:-1]):
+            cumulative += count
+            labels = _formatLabels(self.labelNames, labelValues, [("le", _formatValue(bound))])
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _formatLabels(self.labelNames, labelValues)
+        lines.append(f"{self.name}_sum{labels} {_formatValue(counts[-1])}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
@@ -1,5 +1,7 @@
 from typing import NamedTuple
 
+from utils.LogFileTail import LogFileTail
+
 class NameserverLogFileEntry(NamedTuple):
     clientIP: str
     domainName: str
@@ -10,17 +12,21 @@ class NameserverLogFileParser:
     def __init__(self, logFilePath):
         self.logFilePath = logFilePath
         self.lastParsedEntryIdx = -1
+        self.logFileTail = LogFileTail(logFilePath)
 
-    def parseNewEntries(self):
-        logEntries = []
-        with open(self.logFilePath, "r") as logFile:
-            for idx, line in enumerate(logFile):
-                if idx > self.lastParsedEntryIdx:
-                    entry = self._parseEntry(line)
-                    logEntries.append(entry)
-                    self.lastParsedEntryIdx = idx
+    def parseNewEntries(self, includePartial=True):
+        """
+            Entries logged since the last call, read from where it stopped, a
+            last line missing its newline included unless includePartial is
+            false (see LogFileTail)
+        """
+        logEntries = [self._parseEntry(line) for line in self.logFileTail.readNewLines(includePartial=includePartial)]
+        self.lastParsedEntryIdx = self.logFileTail.lineCount - 1
         return logEntries
 
+    def close(self):
+        self.logFileTail.close()
+
     def _parseEntry(self, line):
         tokens = line.rstrip("\n").split(" ")
         return NameserverLogFileEntry(
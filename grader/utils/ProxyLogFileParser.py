@@ -1,6 +1,10 @@
+import numpy as np
+
 from typing import NamedTuple
 from pint import Quantity
 
+from utils.LogFileTail import LogFileTail
+
 class ProxyLogFileEntry(NamedTuple):
     browserIP: str
     segmentName: str
@@ -10,30 +14,202 @@ class ProxyLogFileEntry(NamedTuple):
     averageConnectionThroughput: Quantity
     bitrateChosen: Quantity
 
+def splitColumns(lines, fieldCount):
+    """
+        First fieldCount space-separated fields of every line, column by
+        column; raises ValueError if a line has fewer fields
+    """
+    # One split of the whole batch, rather than a list per line, when every
+    # line has exactly fieldCount fields: the lines are joined with a NUL
+    # field between them, which then has to be found right after every
+    # fieldCount fields and nowhere else
+    text = " \0 ".join(lines)
+    fields = text.split(" ")
+    stride = fieldCount + 1
+    if (len(fields) == stride * len(lines) - 1 and "\n" not in text
+            and text.count("\0") == len(lines) - 1
+            and fields[fieldCount::stride].count("\0") == len(lines) - 1):
+        return [fields[idx::stride] for idx in range(fieldCount)]
+    rows = [line.rstrip("\n").split(" ") for line in lines if line.strip()]
+    if any(len(row) < fieldCount for row in rows):
+        raise ValueError("log entry with missing fields")
+    return [[row[idx] for row in rows] for idx in range(fieldCount)]
+
+class InternedColumn:
+    """
+        Column of strings stored as int32 codes into the tuple of its
+        distinct values. Comparing it to a string gives a boolean mask
+    """
+
+    __slots__ = ("codes", "values")
+
+    def __init__(self, codes, values):
+        self.codes = codes
+        self.values = values
+
+    @classmethod
+    def fromStrings(cls, strings):
+        index = {}
+        codes = np.fromiter((index.setdefault(string, len(index)) for string in strings), dtype=np.int32)
+        return cls(codes, tuple(index))
+
+    @classmethod
+    def concatenate(cls, columns):
+        index = {}
+        codes = []
+        for column in columns:
+            remap = np.array([index.setdefault(value, len(index)) for value in column.values], dtype=np.int32)
+            codes.append(remap[column.codes] if len(remap) else column.codes)
+        return cls(np.concatenate(codes) if codes else np.empty(0, dtype=np.int32), tuple(index))
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, (int, np.integer)):
+            return self.values[self.codes[idx]]
+        return InternedColumn(self.codes[idx], self.values)
+
+    def __iter__(self):
+        return map(self.values.__getitem__, self.codes.tolist())
+
+    def __eq__(self, value):
+        try:
+            return self.codes == self.values.index(value)
+        except ValueError:
+            return np.zeros(len(self.codes), dtype=bool)
+
+    def __ne__(self, value):
+        return ~(self == value)
+
+    __hash__ = None
+
+    def isin(self, values):
+        wanted = [code for code, value in enumerate(self.values) if value in values]
+        return np.isin(self.codes, wanted)
+
+class ProxyLogTable:
+    """
+        Proxy log entries stored column by column: the IPs and segment names
+        as InternedColumns, the numeric fields as float64 arrays of their
+        magnitudes in the units miProxy logs them in. Reading a numeric field
+        gives a Quantity wrapping the whole array, its unit attached once, so
+        that checks compare all entries at once, e.g.
+        numpy.all(table.bitrateChosen <= targetBitrate).
+
+        The table is a sequence of ProxyLogFileEntry: an integer index builds
+        the entry on demand, and iterating builds them one at a time. A slice,
+        an index array or a boolean mask selects a table of entries.
+    """
+
+    STRING_FIELDS = ("browserIP", "segmentName", "adapatationProxyIP")
+    UNITS = {
+        "segmentTransferTime": "seconds",
+        "segmentTransferThroughput": "kilobits / second",
+        "averageConnectionThroughput": "kilobits / second",
+        "bitrateChosen": "kilobits / second",
+    }
+
+    def __init__(self, strings, magnitudes):
+        """
+            strings: field name -> InternedColumn, magnitudes: field name ->
+            float64 array, all of the same length
+        """
+        self.strings = strings
+        self.magnitudes = magnitudes
+
+    @classmethod
+    def fromRows(cls, rows):
+        """
+            Table of (browser IP, segment name, proxy IP, transfer time s,
+            throughput Kbps, average throughput Kbps, bitrate Kbps) rows, the
+            numbers given as floats or as their text in the log
+        """
+        columns = list(zip(*rows))
+        if len(columns) < len(cls.STRING_FIELDS) + len(cls.UNITS):
+            if not columns:
+                return cls.empty()
+            raise ValueError("proxy log entry with missing fields")
+        return cls.fromColumns(columns)
+
+    @classmethod
+    def fromColumns(cls, columns):
+        if not len(columns[0]):
+            return cls.empty()
+        numeric = np.array(columns[len(cls.STRING_FIELDS):len(cls.STRING_FIELDS) + len(cls.UNITS)],
+                           dtype=np.float64)
+        return cls(
+            {field: InternedColumn.fromStrings(column) for field, column in zip(cls.STRING_FIELDS, columns)},
+            dict(zip(cls.UNITS, numeric))
+        )
+
+    @classmethod
+    def fromLines(cls, lines):
+        return cls.fromColumns(splitColumns(lines, len(cls.STRING_FIELDS) + len(cls.UNITS)))
+
+    @classmethod
+    def empty(cls):
+        return cls(
+            {field: InternedColumn(np.empty(0, dtype=np.int32), ()) for field in cls.STRING_FIELDS},
+            {field: np.empty(0) for field in cls.UNITS}
+        )
+
+    @classmethod
+    def concatenate(cls, tables):
+        tables = list(tables)
+        if not tables:
+            return cls.empty()
+        return cls(
+            {field: InternedColumn.concatenate([table.strings[field] for table in tables])
+             for field in cls.STRING_FIELDS},
+            {field: np.concatenate([table.magnitudes[field] for table in tables]) for field in cls.UNITS}
+        )
+
+    def __getattr__(self, name):
+        # Only called for names that are not attributes: the columns
+        if name in self.UNITS:
+            return Quantity(self.magnitudes[name], self.UNITS[name])
+        if name in self.STRING_FIELDS:
+            return self.strings[name]
+        raise AttributeError(name)
+
+    def __len__(self):
+        return len(self.magnitudes["bitrateChosen"])
+
+    def __getitem__(self, idx):
+        if isinstance(idx, (int, np.integer)):
+            return ProxyLogFileEntry(
+                *(self.strings[field][idx] for field in self.STRING_FIELDS),
+                *(Quantity(float(self.magnitudes[field][idx]), unit) for field, unit in self.UNITS.items())
+            )
+        return ProxyLogTable(
+            {field: column[idx] for field, column in self.strings.items()},
+            {field: column[idx] for field, column in self.magnitudes.items()}
+        )
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+    def __repr__(self):
+        return f"ProxyLogTable({len(self)} entries)"
+
 class ProxyLogFileParser:
 
     def __init__(self, logFilePath):
         self.logFilePath = logFilePath
         self.lastParsedEntryIdx = -1
+        self.logFileTail = LogFileTail(logFilePath)
 
-    def parseNewEntries(self):
-        logEntries = []
-        with open(self.logFilePath, "r") as logFile:
-            for idx, line in enumerate(logFile):
-                if idx > self.lastParsedEntryIdx:
-                    entry = self._parseEntry(line)
-                    logEntries.append(entry)
-                    self.lastParsedEntryIdx = idx
+    def parseNewEntries(self, includePartial=True):
+        """
+            ProxyLogTable of the entries logged since the last call, read from
+            where it stopped, a last line missing its newline included unless
+            includePartial is false (see LogFileTail)
+        """
+        logEntries = ProxyLogTable.fromLines(self.logFileTail.readNewLines(includePartial=includePartial))
+        self.lastParsedEntryIdx = self.logFileTail.lineCount - 1
         return logEntries
 
-    def _parseEntry(self, line):
-        tokens = line.rstrip("\n").split(" ")
-        return ProxyLogFileEntry(
-            browserIP=tokens[0],
-            segmentName=tokens[1],
-            adapatationProxyIP=tokens[2],
-            segmentTransferTime=Quantity(float(tokens[3]), "seconds"),
-            segmentTransferThroughput=Quantity(float(tokens[4]), "kilobits / second"),
-            averageConnectionThroughput=Quantity(float(tokens[5]), "kilobits / second"),
-            bitrateChosen=Quantity(float(tokens[6]), "kilobits / second")
-        )
+    def close(self):
+        self.logFileTail.close()
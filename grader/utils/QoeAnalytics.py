@@ -0,0 +1,225 @@
+import os
+import posixpath
+
+from typing import NamedTuple
+
+import numpy as np
+
+from utils.HlsPlaylist import MediaPlaylist, PlaylistCache, segmentUrlPaths
+
+class SegmentDurations:
+    """
+        #EXTINF duration of segments by URL path, read from the media
+        playlists next to them under the web server's content path (NaN for
+        segments no playlist lists)
+    """
+
+    def __init__(self, contentPath, playlistCache=None):
+        self.contentPath = contentPath
+        self.playlistCache = playlistCache if playlistCache is not None else PlaylistCache()
+        self.durations = {}
+        self.loadedDirectories = set()
+
+    def lookup(self, segmentNames):
+        """
+            float64 array of the durations of segmentNames, in seconds
+        """
+        for directory in {posixpath.dirname(name) for name in segmentNames} - self.loadedDirectories:
+            self._loadDirectory(directory)
+        return np.array([self.durations.get(name, np.nan) for name in segmentNames], dtype=np.float64)
+
+    def _loadDirectory(self, directory):
+        self.loadedDirectories.add(directory)
+        localDirectory = os.path.join(self.contentPath, directory.lstrip("/"))
+        try:
+            fileNames = os.listdir(localDirectory)
+        except OSError:
+            return
+        for fileName in fileNames:
+            if not fileName.endswith(".m3u8"):
+                continue
+            try:
+                playlist = self.playlistCache.load(os.path.join(localDirectory, fileName))
+            except (OSError, ValueError, UnicodeDecodeError):
+                continue
+            if isinstance(playlist, MediaPlaylist):
+                urlPaths = segmentUrlPaths(posixpath.join(directory, fileName), playlist)
+                self.durations.update(zip(urlPaths, playlist.segments.durations))
+
+def _number(value):
+    # NaN has no JSON representation
+    return None if np.isnan(value) else float(value)
+
+class QoeResult(NamedTuple):
+    browserIPs: tuple            # (S,) one session per browser IP
+    segments: np.ndarray         # (S,) segments fetched
+    mediaTime: np.ndarray        # (S,) seconds of media fetched
+    averageBitrate: np.ndarray   # (S,) Kbps, weighted by segment duration
+    switches: np.ndarray         # (S,) bitrate changes between consecutive segments
+    switchMagnitude: np.ndarray  # (S,) mean Kbps of a change, 0 without any
+    timeToSteady: np.ndarray     # (S,) media seconds before the first steady run, NaN if none or unknown
+    steady: np.ndarray           # (S,) whether a steady run was reached, known whatever the durations
+    riskyFraction: np.ndarray    # (S,) fraction of segments that took longer to fetch than to play
+    rebufferDeficit: np.ndarray  # (S,) seconds those fetches exceeded their segment duration by, in total
+    estimateError: np.ndarray    # (S,) mean |estimate - throughput| / throughput, NaN without samples
+    estimateBias: np.ndarray     # (S,) mean (estimate - throughput) / throughput, NaN without samples
+    estimateSamples: np.ndarray  # (S,)
+
+    def rows(self):
+        """
+            Metrics of every session as a dict, None where NaN
+        """
+        for idx, browserIP in enumerate(self.browserIPs):
+            yield {
+                "browserIP": browserIP,
+                "segments": int(self.segments[idx]),
+                "mediaTime": _number(self.mediaTime[idx]),
+                "averageBitrate": _number(self.averageBitrate[idx]),
+                "switches": int(self.switches[idx]),
+                "switchMagnitude": _number(self.switchMagnitude[idx]),
+                "timeToSteady": _number(self.timeToSteady[idx]),
+                "steady": bool(self.steady[idx]),
+                "riskyFraction": _number(self.riskyFraction[idx]),
+                "rebufferDeficit": _number(self.rebufferDeficit[idx]),
+                "estimateError": _number(self.estimateError[idx]),
+                "estimateBias": _number(self.estimateBias[idx]),
+            }
+
+    def summary(self):
+        """
+            Fleet-level metrics over all sessions, entries weighted alike;
+            sessions whose metric is NaN are left out of it, and a metric no
+            session has is None. unknownDurations counts the sessions with
+            segments of unknown duration
+        """
+        def ratio(numerator, denominator):
+            return _number(numerator / denominator) if denominator else None
+        switches = self.switches.sum()
+        samples = self.estimateSamples.sum()
+        steady = self.timeToSteady[~np.isnan(self.timeToSteady)]
+        assessed = ~np.isnan(self.riskyFraction)
+        return {
+            "sessions": len(self.browserIPs),
+            "segments": int(self.segments.sum()),
+            "unknownDurations": int(np.isnan(self.mediaTime).sum()),
+            "mediaHours": float(np.nansum(self.mediaTime) / 3600),
+            "averageBitrate": ratio(np.nansum(self.averageBitrate * self.mediaTime), np.nansum(self.mediaTime)),
+            "switchesPerSession": ratio(switches, len(self.browserIPs)),
+            "switchMagnitude": ratio((self.switchMagnitude * self.switches).sum(), switches),
+            "medianTimeToSteady": float(np.median(steady)) if len(steady) else None,
+            "neverSteady": int((~self.steady).sum()),
+            "riskyFraction": ratio((self.riskyFraction * self.segments)[assessed].sum(), self.segments[assessed].sum()),
+            "rebufferDeficit": float(self.rebufferDeficit[assessed].sum()) if assessed.any() else None,
+            "estimateError": ratio(np.nansum(self.estimateError * self.estimateSamples), samples),
+            "estimateBias": ratio(np.nansum(self.estimateBias * self.estimateSamples), samples),
+        }
+
+class QoeAnalytics:
+    """
+        Quality of experience of every browser session in a ProxyLogTable
+        (the entries of one browser IP, in log order), computed with array
+        operations over all entries at once:
+
+        - average bitrate, weighted by the #EXTINF duration of each segment
+        - bitrate switches between consecutive segments and their mean size
+        - time to steady state: media seconds before the first run of
+          steadyRun segments at the same bitrate
+        - rebuffer risk: segments whose transfer took longer than their
+          duration, which drains the player's buffer, and by how much
+        - throughput-estimate error: the average throughput logged after a
+          segment is the estimate miProxy chooses the next bitrate from,
+          compared to the throughput that next segment then got
+
+        Segments of unknown duration (see SegmentDurations) count as
+        defaultSegmentDuration seconds, NaN by default, which leaves the
+        duration-based metrics of their session NaN.
+    """
+
+    STEADY_RUN = 5 # segments
+
+    def __init__(self, segmentDurations=None, defaultSegmentDuration=np.nan, steadyRun=STEADY_RUN):
+        if steadyRun < 1:
+            raise ValueError
+        self.segmentDurations = segmentDurations
+        self.defaultSegmentDuration = defaultSegmentDuration
+        self.steadyRun = steadyRun
+
+    def sessions(self, table):
+        browsers = table.strings["browserIP"]
+        # Entries of each session together, still in log order; NumPy radix
+        # sorts 16-bit keys, which most logs have few enough browsers for
+        keys = browsers.codes.astype(np.uint16) if len(browsers.values) <= 1 << 16 else browsers.codes
+        order = np.argsort(keys, kind="stable")
+        codes = browsers.codes[order]
+        count = len(codes)
+        if not count:
+            counts, values = np.empty(0, dtype=np.int64), np.empty(0)
+            flags = np.empty(0, dtype=bool)
+            return QoeResult((), counts, values, values, counts, values, values, flags, *([values] * 4), counts)
+        bitrates = table.magnitudes["bitrateChosen"][order]
+        transferTimes = table.magnitudes["segmentTransferTime"][order]
+        throughputs = table.magnitudes["segmentTransferThroughput"][order]
+        estimates = table.magnitudes["averageConnectionThroughput"][order]
+        durations = self._durations(table.strings["segmentName"])[order]
+
+        starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+        segments = np.diff(np.r_[starts, count])
+        sessionOf = np.repeat(np.arange(len(starts)), segments)
+        first = np.zeros(count, dtype=bool)
+        first[starts] = True
+
+        mediaTime = np.add.reduceat(durations, starts)
+        averageBitrate = np.add.reduceat(bitrates * durations, starts) / mediaTime
+
+        previousBitrates = np.r_[bitrates[:1], bitrates[:-1]]
+        changed = ~first & (bitrates != previousBitrates)
+        switches = np.add.reduceat(changed, starts)
+        switchSizes = np.add.reduceat(np.where(changed, np.abs(bitrates - previousBitrates), 0.0), starts)
+        switchMagnitude = np.divide(switchSizes, switches, out=np.zeros(len(starts)), where=switches > 0)
+
+        # Runs of segments at the same bitrate; every session starts one
+        runStarts = np.flatnonzero(first | changed)
+        runLengths = np.diff(np.r_[runStarts, count])
+        steadyStarts = np.where(runLengths >= self.steadyRun, runStarts, count)
+        firstSteady = np.minimum.reduceat(steadyStarts, np.searchsorted(runStarts, starts))
+        elapsed = np.cumsum(durations) - durations
+        elapsed -= elapsed[starts][sessionOf]
+        steady = firstSteady < count
+        timeToSteady = np.where(steady, elapsed[np.minimum(firstSteady, count - 1)], np.nan)
+
+        risky = transferTimes > durations
+        unknown = np.add.reduceat(np.isnan(durations), starts) > 0
+        riskyFraction = np.where(unknown, np.nan, np.add.reduceat(risky, starts) / segments)
+        rebufferDeficit = np.where(unknown, np.nan,
+                                   np.add.reduceat(np.where(risky, transferTimes - durations, 0.0), starts))
+
+        previousEstimates = np.r_[estimates[:1], estimates[:-1]]
+        sampled = ~first & (throughputs > 0)
+        errors = np.divide(previousEstimates - throughputs, throughputs, out=np.zeros(count), where=sampled)
+        estimateSamples = np.add.reduceat(sampled, starts)
+        estimateError = np.add.reduceat(np.abs(errors), starts) / np.where(estimateSamples > 0, estimateSamples, np.nan)
+        estimateBias = np.add.reduceat(errors, starts) / np.where(estimateSamples > 0, estimateSamples, np.nan)
+
+        return QoeResult(
+            browserIPs=tuple(browsers.values[code] for code in codes[starts]),
+            segments=segments,
+            mediaTime=mediaTime,
+            averageBitrate=averageBitrate,
+            switches=switches,
+            switchMagnitude=switchMagnitude,
+            timeToSteady=timeToSteady,
+            steady=steady,
+            riskyFraction=riskyFraction,
+            rebufferDeficit=rebufferDeficit,
+            estimateError=estimateError,
+            estimateBias=estimateBias,
+            estimateSamples=estimateSamples
+        )
+
+    def _durations(self, segmentNames):
+        if self.segmentDurations is None:
+            valueDurations = np.full(len(segmentNames.values), np.nan)
+        else:
+            valueDurations = self.segmentDurations.lookup(segmentNames.values)
+        valueDurations[np.isnan(valueDurations)] = self.defaultSegmentDuration
+        return valueDurations[segmentNames.codes]
@@ -0,0 +1,50 @@
+import logging
+import logging.handlers
+import queue
+
+class QueuedLogging:
+    """
+        Moves the handlers of the given loggers behind a queue, so that the
+        threads logging only enqueue records while a listener thread per
+        logger does the formatting and the writing.
+
+        Handlers are restored (and the queues flushed) by stop(), so records
+        logged after it are written synchronously again.
+    """
+
+    def __init__(self, *loggers):
+        self.loggers = loggers or (logging.getLogger(),)
+        self._listeners = []
+        self._previousHandlers = []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def start(self):
+        for logger in self.loggers:
+            handlers = list(logger.handlers)
+            if not handlers:
+                continue
+            for handler in handlers:
+                logger.removeHandler(handler)
+            recordQueue = queue.SimpleQueue()
+            logger.addHandler(logging.handlers.QueueHandler(recordQueue))
+            listener = logging.handlers.QueueListener(recordQueue, *handlers, respect_handler_level=True)
+            listener.start()
+            self._listeners.append(listener)
+            self._previousHandlers.append((logger, handlers))
+
+    def stop(self):
+        for listener in self._listeners:
+            listener.stop()
+        for logger, handlers in self._previousHandlers:
+            for handler in list(logger.handlers):
+                logger.removeHandler(handler)
+            for handler in handlers:
+                logger.addHandler(handler)
+        self._listeners = []
+        self._previousHandlers = []
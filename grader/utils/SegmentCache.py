@@ -0,0 +1,117 @@
+import os
+import stat
+import threading
+import time
+
+from collections import OrderedDict
+from typing import NamedTuple
+
+class SegmentCacheEntry(NamedTuple):
+    data: bytes
+    size: int
+    mtime: float
+    mtimeNs: int
+    validatedAt: float
+
+class SegmentCache:
+    """
+        Bounded LRU cache of file contents keyed by resolved path.
+
+        Entries are revalidated against the file's mtime and size at most once
+        every revalidateInterval seconds, so hot segments are served without
+        touching the filesystem at all in between.
+    """
+
+    REVALIDATE_INTERVAL = 1.0 # seconds
+
+    def __init__(self, maxBytes, maxEntryBytes=None, revalidateInterval=REVALIDATE_INTERVAL):
+        if maxBytes <= 0:
+            raise ValueError
+        self.maxBytes = maxBytes
+        self.maxEntryBytes = maxEntryBytes if maxEntryBytes is not None else maxBytes
+        self.revalidateInterval = revalidateInterval
+        self.currentBytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        """
+            Return the cache entry for path, loading it on a miss. Returns None
+            if path is not a cacheable regular file (missing, directory, too large)
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and now - entry.validatedAt < self.revalidateInterval:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return entry
+        try:
+            fileStat = os.stat(path)
+        except OSError:
+            self.invalidate(path)
+            return None
+        if entry is not None and entry.mtimeNs == fileStat.st_mtime_ns and entry.size == fileStat.st_size:
+            entry = entry._replace(validatedAt=now)
+            with self._lock:
+                if path in self._entries:
+                    self._entries[path] = entry
+                    self._entries.move_to_end(path)
+                self.hits += 1
+            return entry
+        if entry is not None:
+            self.invalidate(path)
+        if not stat.S_ISREG(fileStat.st_mode) or fileStat.st_size > self.maxEntryBytes:
+            return None
+        try:
+            with open(path, "rb") as file:
+                data = file.read()
+        except OSError:
+            return None
+        entry = SegmentCacheEntry(
+            data=data,
+            size=len(data),
+            mtime=fileStat.st_mtime,
+            mtimeNs=fileStat.st_mtime_ns,
+            validatedAt=now
+        )
+        with self._lock:
+            self.misses += 1
+            previous = self._entries.pop(path, None)
+            if previous is not None:
+                self.currentBytes -= previous.size
+            self._entries[path] = entry
+            self.currentBytes += entry.size
+            while self.currentBytes > self.maxBytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.currentBytes -= evicted.size
+                self.evictions += 1
+        return entry
+
+    def invalidate(self, path):
+        with self._lock:
+            entry = self._entries.pop(path, None)
+            if entry is not None:
+                self.currentBytes -= entry.size
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.currentBytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.currentBytes,
+                "maxBytes": self.maxBytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
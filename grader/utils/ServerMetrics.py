@@ -0,0 +1,79 @@
+import re
+import time
+import urllib.parse
+
+from http import HTTPStatus
+
+from utils.MetricsRegistry import MetricsRegistry
+from utils.StaticContent import StaticResponse
+
+class ServerMetrics:
+    """
+        Request metrics of the web server, exposed at /metrics in the
+        Prometheus text format: requests by status and rendition, bytes
+        served, time-to-first-byte and total transfer time histograms, open
+        connections and connection limit hits. With --workers every worker
+        reports only what it served itself.
+    """
+
+    ENDPOINT = "/metrics"
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+    RENDITION_PATTERN = re.compile(r"_(\d+p)_\d+\.ts$")
+    NO_RENDITION = "none"
+    TTFB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+    TRANSFER_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+    def __init__(self, registry=None):
+        self.registry = registry if registry is not None else MetricsRegistry()
+        self.requests = self.registry.counter(
+            "webserver_requests_total", "Requests served, by response status and segment rendition",
+            ("status", "rendition"))
+        self.bytesSent = self.registry.counter(
+            "webserver_response_bytes_total", "Response body bytes served, by segment rendition", ("rendition",))
+        self.timeToFirstByte = self.registry.histogram(
+            "webserver_time_to_first_byte_seconds", "Time from request received to response head sent",
+            self.TTFB_BUCKETS, ("rendition",))
+        self.transferTime = self.registry.histogram(
+            "webserver_response_duration_seconds", "Time from request received to response body sent",
+            self.TRANSFER_BUCKETS, ("rendition",))
+        self.activeConnections = self.registry.gauge(
+            "webserver_active_connections", "Client connections currently open")
+        self.limitHits = self.registry.counter(
+            "webserver_connection_limit_hits_total", "Connections shed or closed by a connection limit", ("limit",))
+
+    def rendition(self, target):
+        match = self.RENDITION_PATTERN.search(urllib.parse.urlsplit(target).path)
+        return match.group(1) if match else self.NO_RENDITION
+
+    def connectionOpened(self):
+        self.activeConnections.inc()
+
+    def connectionClosed(self):
+        self.activeConnections.dec()
+
+    def limitHit(self, limit):
+        self.limitHits.inc(limit)
+
+    def requestFinished(self, target, status, bytesSent, receivedAt, headSentAt):
+        """
+            Record a completed request; receivedAt and headSentAt are
+            time.perf_counter() readings
+        """
+        finishedAt = time.perf_counter()
+        rendition = self.rendition(target)
+        self.requests.inc(str(int(status)), rendition)
+        self.bytesSent.inc(rendition, amount=bytesSent)
+        if headSentAt is not None:
+            self.timeToFirstByte.observe(headSentAt - receivedAt, rendition)
+        self.transferTime.observe(finishedAt - receivedAt, rendition)
+
+    def addEndpoint(self, content):
+        def handleMetricsRequest(method, target, headers):
+            if method not in ("GET", "HEAD"):
+                return content.errorResponse(HTTPStatus.METHOD_NOT_ALLOWED, "Use GET", [("Allow", "GET")])
+            body = self.registry.render().encode("utf-8")
+            return StaticResponse(HTTPStatus.OK, [
+                ("Content-Type", self.CONTENT_TYPE),
+                ("Content-Length", str(len(body))),
+            ], body)
+        content.addEndpoint(self.ENDPOINT, handleMetricsRequest)
@@ -0,0 +1,335 @@
+import email.utils
+import http.server
+import json
+import mimetypes
+import mmap
+import os
+import posixpath
+import urllib.parse
+
+from http import HTTPStatus
+from typing import NamedTuple
+
+from utils.ByteRange import ByteRange
+from utils.ContentIndex import ContentIndex, ContentIndexEntry, normalizeUrlPath
+
+class FileBody(NamedTuple):
+    file: object
+    offset: int
+    count: int
+
+    def close(self):
+        self.file.close()
+
+class MappedBody:
+
+    def __init__(self, file, offset, count):
+        self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.map)[offset:offset + count]
+        file.close()
+
+    def close(self):
+        self.view.release()
+        self.map.close()
+
+def iterBodyChunks(body, chunkSize):
+    """
+        Yield the bytes of a response body in chunks of at most chunkSize
+    """
+    if isinstance(body, FileBody):
+        body.file.seek(body.offset)
+        remaining = body.count
+        while remaining > 0 and (chunk := body.file.read(min(remaining, chunkSize))):
+            yield chunk
+            remaining -= len(chunk)
+        return
+    if isinstance(body, MappedBody):
+        body = body.view
+    if body is None:
+        return
+    view = memoryview(body)
+    for start in range(0, len(view), chunkSize):
+        yield view[start:start + chunkSize]
+
+class StaticResponse(NamedTuple):
+    status: HTTPStatus
+    headers: list
+    body: object = None # None, a bytes-like object, FileBody or MappedBody
+    message: str = None # set for error responses
+
+    @property
+    def contentLength(self):
+        return next((int(value) for name, value in self.headers if name.lower() == "content-length"), 0)
+
+    def close(self):
+        if isinstance(self.body, (FileBody, MappedBody)):
+            self.body.close()
+
+class StaticContent:
+    """
+        Resolves GET/HEAD requests for files under a content root into
+        StaticResponses, independently of the engine that writes them out.
+
+        Handles validators (ETag/Last-Modified), conditional requests
+        (If-None-Match/If-Modified-Since) and single byte ranges. Full bodies
+        are left to the engine as a FileBody (so it can sendfile() them),
+        ranged bodies are sliced from a memory mapping of the file, and files
+        held by the segment cache are served from memory. Text assets are sent
+        gzip/brotli encoded when a CompressedAssetStore is given and the
+        client accepts it. With a content index, files are looked up in it
+        instead of being stat()ed per request. Server endpoints registered
+        with addEndpoint() or addPrefixEndpoint() take precedence over files.
+        resolve() returns None for directories without an index file.
+    """
+
+    INDEX_FILES = ("index.html", "index.htm")
+    INDEX_ENDPOINT = "/_server/index"
+    INDEX_RELOAD_ENDPOINT = "/_server/index/reload"
+
+    def __init__(self, contentPath, segmentCache=None, useIndex=False, compressedAssets=None):
+        self.contentPath = os.fspath(contentPath)
+        self.segmentCache = segmentCache
+        self.compressedAssets = compressedAssets
+        self.contentIndex = None
+        self.endpoints = {}
+        self.prefixEndpoints = []
+        if useIndex:
+            self.contentIndex = ContentIndex(self.contentPath, self.guessType)
+            self.addEndpoint(self.INDEX_ENDPOINT, self._describeIndex)
+            if compressedAssets is not None:
+                compressedAssets.precompress(self.contentIndex)
+
+    def addEndpoint(self, urlPath, handler):
+        """
+            Serve urlPath with handler(method, target, headers) -> StaticResponse
+        """
+        self.endpoints[urlPath] = handler
+
+    def addPrefixEndpoint(self, prefix, handler):
+        """
+            Serve every URL path starting with prefix with handler(method, target, headers)
+        """
+        self.prefixEndpoints.append((prefix, handler))
+
+    def resolve(self, method, target, headers):
+        urlPath = urllib.parse.urlsplit(target).path
+        endpoint = self.endpoints.get(urlPath)
+        if endpoint is not None:
+            return endpoint(method, target, headers)
+        for prefix, handler in self.prefixEndpoints:
+            if urlPath.startswith(prefix):
+                return handler(method, target, headers)
+        if method not in ("GET", "HEAD"):
+            return self.errorResponse(HTTPStatus.NOT_IMPLEMENTED, f"Unsupported method ({method!r})")
+        if self.contentIndex is not None:
+            key = normalizeUrlPath(urlPath)
+            info = self.contentIndex.lookup(key)
+            if info is not None and not urlPath.endswith("/"):
+                return self._respondWithIndexedFile(method, headers, key, info)
+            if not self.contentIndex.isDirectory(key):
+                return self.errorResponse(HTTPStatus.NOT_FOUND, "File not found")
+        path = self.translatePath(urlPath)
+        entry = self.segmentCache.get(path) if self.segmentCache is not None else None
+        if entry is not None:
+            info = ContentIndexEntry.create(path, entry.size, entry.mtime, entry.mtimeNs, self.guessType(path))
+            return self._respond(method, headers, info, memoryview(entry.data))
+        if os.path.isdir(path):
+            if not urlPath.endswith("/"):
+                parts = urllib.parse.urlsplit(target)
+                location = urllib.parse.urlunsplit((parts[0], parts[1], parts[2] + "/", parts[3], parts[4]))
+                return StaticResponse(HTTPStatus.MOVED_PERMANENTLY, [("Location", location), ("Content-Length", "0")])
+            for index in self.INDEX_FILES:
+                indexPath = os.path.join(path, index)
+                if os.path.isfile(indexPath):
+                    path = indexPath
+                    break
+            else:
+                return None
+        try:
+            file = open(path, "rb")
+        except OSError:
+            return self.errorResponse(HTTPStatus.NOT_FOUND, "File not found")
+        try:
+            info = ContentIndexEntry.fromStat(path, os.fstat(file.fileno()), self.guessType(path))
+            return self._respond(method, headers, info, file)
+        except Exception:
+            file.close()
+            raise
+
+    def _respondWithIndexedFile(self, method, headers, key, info):
+        # The index only supplies the validators while they still match what
+        # is actually about to be sent; stale entries get refreshed on the way
+        entry = self.segmentCache.get(info.path) if self.segmentCache is not None else None
+        if entry is not None:
+            info = self.contentIndex.refresh(key, info, entry.size, entry.mtime, entry.mtimeNs)
+            return self._respond(method, headers, info, memoryview(entry.data))
+        try:
+            file = open(info.path, "rb")
+        except OSError:
+            return self.errorResponse(HTTPStatus.NOT_FOUND, "File not found")
+        try:
+            fileStat = os.fstat(file.fileno())
+            info = self.contentIndex.refresh(key, info, fileStat.st_size, fileStat.st_mtime, fileStat.st_mtime_ns)
+            return self._respond(method, headers, info, file)
+        except Exception:
+            file.close()
+            raise
+
+    def respondFromMemory(self, method, headers, info, data):
+        """
+            Build the response for content that only exists in memory, described
+            by info, with the same validator and range handling as files. It is
+            never compressed
+        """
+        return self._respond(method, headers, info, memoryview(data), compress=False)
+
+    def _respond(self, method, headers, info, source, compress=True):
+        """
+            Build the response for the file described by info, whose content
+            is either an open file or a memoryview of its cached bytes
+        """
+        size = info.size
+        compressible = (compress and self.compressedAssets is not None
+                        and self.compressedAssets.isCompressible(info.path, size))
+        encoding = None
+        if compressible and "Range" not in headers:
+            encoding = self.compressedAssets.negotiate(headers.get("Accept-Encoding"))
+        variant = None
+        if encoding is not None:
+            variant = self.compressedAssets.get(info, encoding, lambda: self._readSource(source))
+        responseHeaders = [
+            ("Content-type", info.contentType),
+            ("Last-Modified", info.lastModified),
+            ("ETag", variant.etag if variant is not None else info.etag),
+            ("Accept-Ranges", "bytes"),
+        ]
+        if compressible:
+            responseHeaders.append(("Vary", "Accept-Encoding"))
+        etag = variant.etag if variant is not None else info.etag
+        # Conditionals come before Range (RFC 9110 13.2.2): a ranged
+        # revalidation of an unchanged file gets a 304 too
+        if self._notModified(headers, etag, info.mtime):
+            self._closeSource(source)
+            return StaticResponse(HTTPStatus.NOT_MODIFIED, responseHeaders)
+        if variant is not None:
+            self._closeSource(source)
+            responseHeaders.append(("Content-Encoding", variant.encoding))
+            responseHeaders.append(("Content-Length", str(len(variant.data))))
+            return StaticResponse(HTTPStatus.OK, responseHeaders, memoryview(variant.data))
+        byteRange = None
+        rangeHeader = headers.get("Range")
+        if rangeHeader is not None and method == "GET":
+            ifRange = headers.get("If-Range")
+            if ifRange is None or ByteRange.ifRangeMatches(ifRange, info.etag, info.mtime):
+                try:
+                    byteRange = ByteRange.parse(rangeHeader, size)
+                except ValueError as error:
+                    self._closeSource(source)
+                    return self.errorResponse(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE, str(error),
+                                              [("Content-Range", f"bytes */{size}")])
+        if byteRange is None:
+            responseHeaders.append(("Content-Length", str(size)))
+            if isinstance(source, memoryview):
+                body = source
+            else:
+                body = FileBody(source, 0, size)
+            return StaticResponse(HTTPStatus.OK, responseHeaders, body)
+        responseHeaders.append(("Content-Range", byteRange.contentRange(size)))
+        responseHeaders.append(("Content-Length", str(byteRange.length)))
+        if isinstance(source, memoryview):
+            body = source[byteRange.start:byteRange.end + 1]
+        else:
+            body = MappedBody(source, byteRange.start, byteRange.length)
+        return StaticResponse(HTTPStatus.PARTIAL_CONTENT, responseHeaders, body)
+
+    def addIndexReloadEndpoint(self):
+        """
+            Let POST /_server/index/reload rescan the content path. It is
+            unauthenticated, and every call walks the whole tree
+        """
+        if self.contentIndex is None:
+            raise ValueError("no content index to reload")
+        self.addEndpoint(self.INDEX_RELOAD_ENDPOINT, self._reloadIndex)
+
+    def _describeIndex(self, method, target, headers):
+        return self.jsonResponse(self.contentIndex.describe())
+
+    def _reloadIndex(self, method, target, headers):
+        if method != "POST":
+            return self.errorResponse(HTTPStatus.METHOD_NOT_ALLOWED, "Use POST to reload the index", [("Allow", "POST")])
+        self.contentIndex.reload()
+        return self.jsonResponse(self.contentIndex.describe())
+
+    def jsonResponse(self, payload, status=HTTPStatus.OK):
+        body = json.dumps(payload, indent=2).encode("utf-8") + b"\n"
+        return StaticResponse(status, [
+            ("Content-Type", "application/json"),
+            ("Content-Length", str(len(body))),
+        ], body)
+
+    def errorResponse(self, status, message, headers=()):
+        body = (http.server.DEFAULT_ERROR_MESSAGE % {
+            "code": status.value,
+            "message": message,
+            "explain": status.description
+        }).encode("UTF-8", "replace")
+        return StaticResponse(status, [
+            ("Content-Type", http.server.DEFAULT_ERROR_CONTENT_TYPE),
+            ("Content-Length", str(len(body))),
+            *headers
+        ], body, message)
+
+    def _notModified(self, headers, etag, mtime):
+        # If-None-Match takes precedence over If-Modified-Since (RFC 9110 13.2.2)
+        ifNoneMatch = headers.get("If-None-Match")
+        if ifNoneMatch is not None:
+            if ifNoneMatch.strip() == "*":
+                return True
+            tags = [tag.strip().removeprefix("W/") for tag in ifNoneMatch.split(",")]
+            return etag.removeprefix("W/") in tags
+        ifModifiedSince = headers.get("If-Modified-Since")
+        if ifModifiedSince is None:
+            return False
+        try:
+            date = email.utils.parsedate_to_datetime(ifModifiedSince)
+        except (TypeError, ValueError, IndexError, OverflowError):
+            return False
+        return int(mtime) <= date.timestamp()
+
+    @staticmethod
+    def _readSource(source):
+        if isinstance(source, memoryview):
+            return source
+        source.seek(0)
+        return source.read()
+
+    @staticmethod
+    def _closeSource(source):
+        if not isinstance(source, memoryview):
+            source.close()
+
+    def translatePath(self, urlPath):
+        # Same rules as SimpleHTTPRequestHandler.translate_path()
+        trailingSlash = urlPath.rstrip().endswith("/")
+        urlPath = urllib.parse.unquote(urlPath, errors="surrogatepass")
+        urlPath = posixpath.normpath(urlPath)
+        path = self.contentPath
+        for word in filter(None, urlPath.split("/")):
+            if os.path.dirname(word) or word in (os.curdir, os.pardir):
+                continue
+            path = os.path.join(path, word)
+        if trailingSlash:
+            path += "/"
+        return path
+
+    def guessType(self, path):
+        # Same rules as SimpleHTTPRequestHandler.guess_type()
+        _, ext = posixpath.splitext(path)
+        extensionsMap = http.server.SimpleHTTPRequestHandler.extensions_map
+        if ext in extensionsMap:
+            return extensionsMap[ext]
+        ext = ext.lower()
+        if ext in extensionsMap:
+            return extensionsMap[ext]
+        guess, _ = mimetypes.guess_type(path)
+        return guess or "application/octet-stream"
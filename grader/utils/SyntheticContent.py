@@ -0,0 +1,146 @@
+import functools
+import random
+import re
+import urllib.parse
+import zlib
+
+from http import HTTPStatus
+from typing import NamedTuple
+
+from utils.ContentIndex import ContentIndexEntry
+from utils.HlsPlaylist import Rendition
+
+class SyntheticTitle(NamedTuple):
+    name: str
+    renditions: tuple
+    segmentDurations: tuple
+
+class SyntheticContent:
+    """
+        A catalog of virtual HLS titles for load tests, served under
+        /synthetic/ without any file behind them.
+
+        Every title (its ladder, duration and segment durations) and every
+        segment size is derived from the seed, so the same seed always yields
+        the same catalog. Segments are sized after their rendition's BANDWIDTH
+        and #EXTINF duration and are all slices of one shared buffer of MPEG-TS
+        null packets, so the catalog costs the same memory whether it has ten
+        titles or ten thousand. Titles are generated when first requested and
+        only the most recently used ones are kept.
+
+            /synthetic/                                      catalog description (JSON)
+            /synthetic/title00042/title00042.m3u8            master playlist
+            /synthetic/title00042/title00042_240p.m3u8       media playlist
+            /synthetic/title00042/title00042_240p_0003.ts    segment
+    """
+
+    PREFIX = "/synthetic/"
+    PATH_PATTERN = re.compile(r"^/synthetic/(title\d{5})/(?:\1\.m3u8|\1_(\d+)p\.m3u8|\1_(\d+)p_(\d{4})\.ts)$")
+    # Same ladders as the titles in www, (NAME, RESOLUTION, BANDWIDTH)
+    LADDERS = (
+        (("1080", "1920x1080", 40000000), ("720", "854x720", 24000000), ("480", "854x480", 10000000),
+         ("360", "854x360", 6000000), ("240", "426x240", 3000000)),
+        (("1080", "1920x1080", 13000000), ("480", "854x480", 4000000), ("240", "426x240", 1300000)),
+    )
+    MIN_TITLE_DURATION = 60 # seconds
+    MAX_TITLE_DURATION = 600
+    MIN_SEGMENT_DURATION = 2 # seconds
+    MAX_SEGMENT_DURATION = 6
+    FRAME_RATE = 24 # segment durations are whole frames
+    MIN_FILL = 0.6 # lowest fraction of the declared bandwidth a segment uses
+    TS_NULL_PACKET = b"\x47\x1f\xff\x10" + b"\xff" * 184
+    TITLE_CACHE_SIZE = 1024
+    EPOCH = 1700000000 # Last-Modified of every synthetic file, plus the seed
+
+    def __init__(self, content, numTitles, seed=0):
+        if numTitles < 1 or numTitles > 99999:
+            raise ValueError
+        self.content = content
+        self.numTitles = numTitles
+        self.seed = seed
+        self.mtime = self.EPOCH + seed % 1000000
+        maxBandwidth = max(bandwidth for ladder in self.LADDERS for _, _, bandwidth in ladder)
+        maxSegmentSize = maxBandwidth * self.MAX_SEGMENT_DURATION // 8
+        packets = -(-maxSegmentSize // len(self.TS_NULL_PACKET))
+        self.payload = memoryview(self.TS_NULL_PACKET * packets)
+        self.title = functools.lru_cache(maxsize=self.TITLE_CACHE_SIZE)(self._makeTitle)
+        self.playlist = functools.lru_cache(maxsize=self.TITLE_CACHE_SIZE)(self._renderPlaylist)
+        content.addPrefixEndpoint(self.PREFIX.rstrip("/"), self.resolve)
+
+    def resolve(self, method, target, headers):
+        if method not in ("GET", "HEAD"):
+            return self.content.errorResponse(HTTPStatus.NOT_IMPLEMENTED, f"Unsupported method ({method!r})")
+        urlPath = urllib.parse.unquote(urllib.parse.urlsplit(target).path)
+        if urlPath in (self.PREFIX, self.PREFIX.rstrip("/")):
+            return self.content.jsonResponse(self.describe())
+        match = self.PATH_PATTERN.match(urlPath)
+        if match is None or int(match.group(1)[len("title"):]) >= self.numTitles:
+            return self.content.errorResponse(HTTPStatus.NOT_FOUND, "File not found")
+        title = self.title(int(match.group(1)[len("title"):]))
+        renditionName = match.group(2) or match.group(3)
+        if renditionName is not None and renditionName not in (rendition.name for rendition in title.renditions):
+            return self.content.errorResponse(HTTPStatus.NOT_FOUND, "File not found")
+        if match.group(4) is None:
+            data = self.playlist(title.name, renditionName)
+        else:
+            index = int(match.group(4))
+            if index >= len(title.segmentDurations):
+                return self.content.errorResponse(HTTPStatus.NOT_FOUND, "File not found")
+            data = self.payload[:self.segmentSize(title, renditionName, index)]
+        info = ContentIndexEntry.create(urlPath, len(data), self.mtime, self.mtime * 10**9,
+                                        self.content.guessType(urlPath))
+        return self.content.respondFromMemory(method, headers, info, data)
+
+    def _makeTitle(self, index):
+        rng = random.Random(f"{self.seed}/{index}")
+        name = f"title{index:05d}"
+        ladder = rng.choice(self.LADDERS)
+        duration = rng.uniform(self.MIN_TITLE_DURATION, self.MAX_TITLE_DURATION)
+        segmentDurations = []
+        while sum(segmentDurations) < duration:
+            frames = rng.randint(self.MIN_SEGMENT_DURATION * self.FRAME_RATE, self.MAX_SEGMENT_DURATION * self.FRAME_RATE)
+            segmentDurations.append(frames / self.FRAME_RATE)
+        renditions = tuple(
+            Rendition(bandwidth=bandwidth, resolution=resolution, name=renditionName,
+                      uri=f"{name}_{renditionName}p.m3u8")
+            for renditionName, resolution, bandwidth in ladder
+        )
+        return SyntheticTitle(name=name, renditions=renditions, segmentDurations=tuple(segmentDurations))
+
+    def segmentSize(self, title, renditionName, index):
+        """
+            Bytes of a segment: its share of the rendition's bandwidth, using
+            between MIN_FILL and all of it, in whole TS packets
+        """
+        bandwidth = next(rendition.bandwidth for rendition in title.renditions if rendition.name == renditionName)
+        fill = self.MIN_FILL + (1 - self.MIN_FILL) * zlib.crc32(
+            f"{self.seed}/{title.name}/{renditionName}/{index}".encode()) / 2**32
+        size = int(bandwidth * title.segmentDurations[index] * fill / 8)
+        packetSize = len(self.TS_NULL_PACKET)
+        return max(size - size % packetSize, packetSize)
+
+    def _renderPlaylist(self, titleName, renditionName):
+        title = self.title(int(titleName[len("title"):]))
+        lines = ["#EXTM3U", "#EXT-X-VERSION:3"]
+        if renditionName is None:
+            for rendition in title.renditions:
+                lines.append(f"#EXT-X-STREAM-INF:BANDWIDTH={rendition.bandwidth},"
+                             f"RESOLUTION={rendition.resolution},NAME=\"{rendition.name}\"")
+                lines.append(rendition.uri)
+        else:
+            lines.append(f"#EXT-X-TARGETDURATION:{self.MAX_SEGMENT_DURATION}")
+            lines.append("#EXT-X-MEDIA-SEQUENCE:0")
+            for index, duration in enumerate(title.segmentDurations):
+                lines.append(f"#EXTINF:{duration:.6f},")
+                lines.append(f"{title.name}_{renditionName}p_{index:04d}.ts")
+            lines.append("#EXT-X-ENDLIST")
+        return ("\n".join(lines) + "\n").encode("utf-8")
+
+    def describe(self):
+        return {
+            "titles": self.numTitles,
+            "seed": self.seed,
+            "payloadBufferBytes": len(self.payload),
+            "cachedTitles": self.title.cache_info().currsize,
+            "example": f"{self.PREFIX}title00000/title00000.m3u8",
+        }
@@ -0,0 +1,23 @@
+class ThroughputEstimator:
+    """
+        miProxy's bitrate adaptation: an EWMA of the segment throughputs,
+        T = gain * T_new + (1 - gain) * T, starting at the lowest bitrate of
+        the title, picks the highest bitrate b with T >= multiplier * b (or the
+        lowest bitrate if none qualifies). Throughputs and bitrates are in
+        bits/second.
+    """
+
+    def __init__(self, gain, multiplier, initialThroughput):
+        if not 0 < gain <= 1 or multiplier <= 0:
+            raise ValueError
+        self.gain = gain
+        self.multiplier = multiplier
+        self.throughput = float(initialThroughput)
+
+    def update(self, throughput):
+        self.throughput = self.gain * throughput + (1 - self.gain) * self.throughput
+        return self.throughput
+
+    def chooseBitrate(self, bitrates):
+        eligible = [bitrate for bitrate in bitrates if self.throughput >= self.multiplier * bitrate]
+        return max(eligible) if eligible else min(bitrates)
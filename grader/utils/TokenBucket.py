@@ -0,0 +1,36 @@
+import threading
+import time
+
+class TokenBucket:
+    """
+        Thread-safe token bucket metering bytes.
+
+        reserve() never blocks: it takes the tokens right away (going into
+        debt if needed) and returns how long the caller has to wait before
+        sending, which lets threads sleep and coroutines await alike.
+    """
+
+    def __init__(self, rate, burst):
+        if rate <= 0 or burst <= 0:
+            raise ValueError
+        self.rate = rate # bytes / second
+        self.burst = burst # bytes
+        self.tokens = burst
+        self.updatedAt = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount):
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updatedAt) * self.rate)
+            self.updatedAt = now
+            self.tokens -= amount
+            return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+    def configure(self, rate, burst):
+        if rate <= 0 or burst <= 0:
+            raise ValueError
+        with self._lock:
+            self.rate = rate
+            self.burst = burst
+            self.tokens = min(self.tokens, burst)
@@ -0,0 +1,135 @@
+import asyncio
+import collections
+import socket
+import time
+
+class PooledConnection:
+
+    def __init__(self, key, reader, writer):
+        self.key = key
+        self.reader = reader
+        self.writer = writer
+        self.requests = 0
+        self.idleSince = None
+
+    def healthy(self):
+        # EOF on an idle connection means upstream closed it while it sat in the pool
+        return not self.writer.is_closing() and not self.reader.at_eof()
+
+    def close(self):
+        self.writer.close()
+
+class UpstreamPool:
+    """
+        Keep-alive connections to upstream web servers shared by all browser
+        connections of the proxy, keyed by (IP, port) of the server, so that
+        domain names resolved to the same server share its connections.
+
+        acquire() hands out an idle connection if there is a healthy one (the
+        most recently used first) and opens a new one otherwise, waiting when
+        maxPerHost connections to that server are already in use. release()
+        puts a connection back unless the response said otherwise or maxIdle
+        connections to that server are already idle. Idle connections are
+        dropped after idleTimeout seconds, or when found closed by upstream
+        (health eviction).
+    """
+
+    MAX_IDLE = 32
+    MAX_PER_HOST = 256
+    IDLE_TIMEOUT = 30 # seconds
+
+    def __init__(self, maxIdle=MAX_IDLE, maxPerHost=MAX_PER_HOST, idleTimeout=IDLE_TIMEOUT,
+                 connectTimeout=None):
+        if maxIdle < 0 or maxPerHost < 1 or idleTimeout <= 0:
+            raise ValueError
+        self.maxIdle = maxIdle
+        self.maxPerHost = maxPerHost
+        self.idleTimeout = idleTimeout
+        self.connectTimeout = connectTimeout
+        self.idle = collections.defaultdict(collections.deque)
+        # (IP, port) -> semaphore of the connections that may still be handed out
+        self.slots = {}
+        self.activeConnections = 0
+        self.opened = 0
+        self.reused = 0
+        self.evicted = 0
+        self.expired = 0
+        self.discarded = 0
+        self.waits = 0
+
+    async def acquire(self, ip, port):
+        key = (ip, port)
+        slots = self.slots.get(key)
+        if slots is None:
+            slots = self.slots[key] = asyncio.Semaphore(self.maxPerHost)
+        if slots.locked():
+            self.waits += 1
+        await slots.acquire()
+        try:
+            connection = self._takeIdle(key)
+            if connection is not None:
+                self.reused += 1
+            else:
+                async with asyncio.timeout(self.connectTimeout):
+                    reader, writer = await asyncio.open_connection(ip, port)
+                writer.get_extra_info("socket").setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                self.opened += 1
+                connection = PooledConnection(key, reader, writer)
+            self.activeConnections += 1
+            return connection
+        except BaseException:
+            slots.release()
+            raise
+
+    def _takeIdle(self, key):
+        idle = self.idle[key]
+        now = time.monotonic()
+        while idle:
+            # Most recently used first: the likeliest to still be open upstream
+            connection = idle.pop()
+            if now - connection.idleSince > self.idleTimeout:
+                self.expired += 1
+                connection.close()
+            elif not connection.healthy():
+                self.evicted += 1
+                connection.close()
+            else:
+                return connection
+        return None
+
+    def release(self, connection, reusable=True):
+        """
+            Return a connection after its response was read in full, or with
+            reusable=False after it failed or upstream asked to close it
+        """
+        connection.requests += 1
+        self.activeConnections -= 1
+        idle = self.idle[connection.key]
+        now = time.monotonic()
+        while idle and now - idle[0].idleSince > self.idleTimeout:
+            self.expired += 1
+            idle.popleft().close()
+        if reusable and len(idle) < self.maxIdle and connection.healthy():
+            connection.idleSince = now
+            idle.append(connection)
+        else:
+            self.discarded += 1
+            connection.close()
+        self.slots[connection.key].release()
+
+    def closeIdle(self):
+        for idle in self.idle.values():
+            while idle:
+                idle.pop().close()
+
+    def stats(self):
+        return {
+            "opened": self.opened,
+            "reused": self.reused,
+            "evicted": self.evicted,
+            "expired": self.expired,
+            "discarded": self.discarded,
+            "waits": self.waits,
+            "active": self.activeConnections,
+            "idle": sum(len(idle) for idle in self.idle.values()),
+        }
@@ -0,0 +1,150 @@
+import logging
+import logging.handlers
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+import threading
+import time
+
+class WorkerPool:
+    """
+        Pre-forks numWorkers copies of a server, each binding its own listening
+        socket to the same address with SO_REUSEPORT so that the kernel spreads
+        incoming connections across processes (and thus across cores).
+
+        makeServer() is called in every worker and must return a server with
+        serve_forever()/shutdown()/server_close() bound with reuse-port enabled.
+        Worker log records are shipped to the parent and written by the
+        handlers of the parent's loggers, tagged with the worker number.
+        Workers that die are restarted; SIGTERM/SIGINT shut the whole pool
+        down gracefully and FORWARDED_SIGNALS (e.g. SIGHUP to reload the
+        content index) are passed on to every worker.
+    """
+
+    FORWARDED_SIGNALS = (signal.SIGHUP,)
+
+    SHUTDOWN_TIMEOUT = 10 # seconds before stragglers get SIGKILL
+    MIN_UPTIME = 5 # seconds; workers dying sooner are restarted with a delay
+    RESTART_DELAY = 1 # seconds
+
+    def __init__(self, numWorkers, makeServer):
+        if numWorkers < 1:
+            raise ValueError
+        self.numWorkers = numWorkers
+        self.makeServer = makeServer
+        self.context = multiprocessing.get_context("fork")
+        self.logQueue = self.context.Queue()
+        self.workers = {}
+        self.restarts = 0
+        self.stopping = False
+        self._previousHandlers = {}
+
+    def run(self):
+        listener = logging.handlers.QueueListener(self.logQueue, self._LogDispatcher())
+        listener.start()
+        self._previousHandlers = {
+            signum: signal.signal(signum, self._handleStopSignal) for signum in (signal.SIGTERM, signal.SIGINT)
+        }
+        for signum in self.FORWARDED_SIGNALS:
+            self._previousHandlers[signum] = signal.signal(signum, self._forwardSignal)
+        try:
+            for workerId in range(self.numWorkers):
+                self._startWorker(workerId)
+            self._superviseWorkers()
+        finally:
+            self._stopWorkers()
+            for signum, handler in self._previousHandlers.items():
+                signal.signal(signum, handler)
+            listener.stop()
+        logging.info(f"Worker pool stopped ({self.restarts} worker restarts)")
+
+    def _handleStopSignal(self, signum, frame):
+        self.stopping = True
+
+    def _forwardSignal(self, signum, frame):
+        for process, _ in self.workers.values():
+            if process.is_alive():
+                os.kill(process.pid, signum)
+
+    def _startWorker(self, workerId):
+        process = self.context.Process(target=self._runWorker, args=(workerId,), name=f"webserver-worker-{workerId}")
+        process.start()
+        self.workers[workerId] = (process, time.monotonic())
+        logging.info(f"Started worker {workerId} (pid {process.pid})")
+
+    def _superviseWorkers(self):
+        while not self.stopping:
+            sentinels = {process.sentinel: workerId for workerId, (process, _) in self.workers.items()}
+            ready = multiprocessing.connection.wait(list(sentinels), timeout=0.5)
+            for sentinel in ready:
+                if self.stopping:
+                    break
+                workerId = sentinels[sentinel]
+                process, startedAt = self.workers[workerId]
+                process.join()
+                logging.warning(f"Worker {workerId} (pid {process.pid}) exited with code {process.exitcode}, restarting")
+                if time.monotonic() - startedAt < self.MIN_UPTIME:
+                    time.sleep(self.RESTART_DELAY)
+                self.restarts += 1
+                self._startWorker(workerId)
+
+    def _stopWorkers(self):
+        for process, _ in self.workers.values():
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGTERM)
+        deadline = time.monotonic() + self.SHUTDOWN_TIMEOUT
+        for workerId, (process, _) in self.workers.items():
+            process.join(max(deadline - time.monotonic(), 0))
+            if process.is_alive():
+                logging.warning(f"Worker {workerId} (pid {process.pid}) did not stop in time, killing it")
+                process.kill()
+                process.join()
+
+    def _runWorker(self, workerId):
+        rootLogger = logging.getLogger()
+        # Every record ends up at the root logger and is shipped to the parent,
+        # which hands it to the handlers of the logger it was logged to
+        loggers = [rootLogger] + [
+            logger for logger in logging.root.manager.loggerDict.values()
+            if isinstance(logger, logging.Logger) and logger.handlers
+        ]
+        for logger in loggers:
+            for handler in list(logger.handlers):
+                logger.removeHandler(handler)
+            logger.propagate = True
+        queueHandler = logging.handlers.QueueHandler(self.logQueue)
+        queueHandler.addFilter(self._WorkerLogPrefix(workerId))
+        rootLogger.addHandler(queueHandler)
+        for signum, handler in self._previousHandlers.items():
+            signal.signal(signum, handler)
+        signal.signal(signal.SIGINT, signal.SIG_IGN) # the parent decides when to stop
+        server = self.makeServer()
+        def handleTerm(signum, frame):
+            # shutdown() waits for serve_forever() to return, so it can't be
+            # called from the thread serving
+            threading.Thread(target=server.shutdown, daemon=True).start()
+        signal.signal(signal.SIGTERM, handleTerm)
+        with server:
+            server.serve_forever()
+        logging.info("Worker stopped")
+
+    class _WorkerLogPrefix(logging.Filter):
+
+        def __init__(self, workerId):
+            super().__init__()
+            self.workerId = workerId
+            self.prefix = f"[worker {workerId}] "
+
+        def filter(self, record):
+            if getattr(record, "structured", False):
+                record.msg = f"{record.msg} worker={self.workerId}"
+            else:
+                record.msg = self.prefix + str(record.msg)
+            return True
+
+    class _LogDispatcher(logging.Handler):
+
+        def handle(self, record):
+            logging.getLogger(record.name).handle(record)
+            return True
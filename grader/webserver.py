@@ -9,33 +9,259 @@ logging.basicConfig(
 import http.server
 import argparse
 import functools
+import shutil
+import io
+import signal
+import threading
+import contextlib
+import time
+
+from http import HTTPStatus
+
+from utils.SegmentCache import SegmentCache
+from utils.CompressedAssetStore import CompressedAssetStore
+from utils.StaticContent import StaticContent, StaticResponse, FileBody, MappedBody, iterBodyChunks
+from utils.BandwidthShaper import BandwidthShaper
+from utils.ServerMetrics import ServerMetrics
+from utils.AccessLog import AccessLog
+from utils.QueuedLogging import QueuedLogging
+from utils.CachePolicy import CachePolicy, CacheRule
+from utils.ConnectionLimiter import ConnectionLimiter
+from utils.SyntheticContent import SyntheticContent
+from utils.LiveContent import LiveContent
+from utils.AsyncWebServer import AsyncWebServer
+from utils.WorkerPool import WorkerPool
 
 class WebServer(http.server.ThreadingHTTPServer):
 
-    def __init__(self, host, port, contentPath):
+    SHUTDOWN_GRACE_PERIOD = 5 # seconds to let in-flight requests finish on close
+    REJECTION_READ_SIZE = 64 * 1024
+
+    def __init__(self, host, port, contentPath, useSendfile=True, content=None, reusePort=False, shaper=None,
+                 metrics=None, accessLog=None, cachePolicy=None, limiter=None, backlog=None):
+        self.useSendfile = useSendfile
+        self.shaper = shaper
+        self.metrics = metrics
+        self.accessLog = accessLog if accessLog is not None else AccessLog()
+        self.cachePolicy = cachePolicy if cachePolicy is not None else CachePolicy()
+        self.content = content if content is not None else StaticContent(contentPath)
+        self.allow_reuse_port = reusePort
+        self.limiter = limiter if limiter is not None else ConnectionLimiter()
+        self._rejectionResponse = self.limiter.rejectionResponse(self.RequestHandler.EXTRA_HEADERS)
+        if backlog is not None:
+            self.request_queue_size = backlog
+        self.activeRequests = 0
+        self._activeRequestsChanged = threading.Condition()
         handler = functools.partial(self.RequestHandler, contentPath)
         httpd = super().__init__((host, port), handler)
         logging.info(f"Web server running on {host}:{port}")
         return httpd
 
+    def process_request(self, request, client_address):
+        if not self.limiter.tryAcquire():
+            self._shedConnection(request)
+            return
+        try:
+            super().process_request(request, client_address)
+        except Exception:
+            self.limiter.release()
+            raise
+
+    def process_request_thread(self, request, client_address):
+        try:
+            super().process_request_thread(request, client_address)
+        finally:
+            self.limiter.release()
+
+    def _shedConnection(self, request):
+        # Answered from the accepting thread, without waiting for the request.
+        # What has already arrived of it is read so that closing the socket
+        # doesn't reset the connection before the client gets the 503
+        request.setblocking(False)
+        try:
+            request.recv(self.REJECTION_READ_SIZE)
+        except OSError:
+            pass
+        try:
+            request.send(self._rejectionResponse)
+        except OSError:
+            pass
+        self.shutdown_request(request)
+
+    @contextlib.contextmanager
+    def trackRequest(self):
+        with self._activeRequestsChanged:
+            self.activeRequests += 1
+        try:
+            yield
+        finally:
+            with self._activeRequestsChanged:
+                self.activeRequests -= 1
+                self._activeRequestsChanged.notify_all()
+
+    def server_close(self):
+        # Idle keep-alive connections are simply dropped, but responses that are
+        # being written get a chance to complete
+        with self._activeRequestsChanged:
+            self._activeRequestsChanged.wait_for(lambda: self.activeRequests == 0, timeout=self.SHUTDOWN_GRACE_PERIOD)
+        if self.content.segmentCache is not None:
+            logging.info(f"Segment cache stats: {self.content.segmentCache.stats()}")
+        logging.info(f"Connection stats: {self.limiter.stats()}")
+        return super().server_close()
+
     class RequestHandler(http.server.SimpleHTTPRequestHandler):
 
         protocol_version = "HTTP/1.1"
+        COPY_BUFFER_SIZE = 256 * 1024
+        MAX_REQUEST_BODY_BYTES = 1024 * 1024 # request bodies are read and discarded
+        _responseStatus = None
+        EXTRA_HEADERS = (
+            # Allow cross-origin requests
+            ("Access-Control-Allow-Origin", "*"),
+            ("Access-Control-Allow-Methods", "*"),
+            ("Access-Control-Allow-Headers", "*"),
+        )
 
         def __init__(self, contentPath, *args, **kwargs):
             super().__init__(*args, directory=contentPath, **kwargs)
 
+        def setup(self):
+            # Applies to every socket operation, so a stalled client is also
+            # dropped in the middle of a request
+            self.timeout = self.server.limiter.idleTimeout
+            super().setup()
+            if self.server.metrics is not None:
+                self.server.metrics.connectionOpened()
+
+        def finish(self):
+            try:
+                super().finish()
+            finally:
+                if self.server.metrics is not None:
+                    self.server.metrics.connectionClosed()
+
+        def handle_one_request(self):
+            if self.timeout is not None:
+                try:
+                    # Wait for the next request here to tell idle connections
+                    # apart from requests that time out halfway
+                    self.rfile.peek(1)
+                except TimeoutError:
+                    self.server.limiter.idleTimedOut()
+                    self.close_connection = True
+                    return
+            super().handle_one_request()
+
         def log_message(self, format, *args):
             logging.info(format % args)
 
+        def send_response(self, code, message=None):
+            self._responseStatus = code
+            super().send_response(code, message)
+
+        def send_header(self, keyword, value):
+            if keyword.lower() == "content-length":
+                self._responseLength = int(value)
+            super().send_header(keyword, value)
+
         def end_headers(self) -> None:
-            # Prevent client-side caching
-            self.send_header("Cache-Control", "no-store, no-cache, must-revalidate")
-            # Allow cross-origin requests
-            self.send_header("Access-Control-Allow-Origin", "*")
-            self.send_header("Access-Control-Allow-Methods", "*")
-            self.send_header("Access-Control-Allow-Headers", "*")
-            return super().end_headers()
+            self.send_header("Cache-Control", self.server.cachePolicy.cacheControl(self.path, self._responseStatus))
+            for name, value in self.EXTRA_HEADERS:
+                self.send_header(name, value)
+            super().end_headers()
+            self._headSentAt = time.perf_counter()
+
+        def log_request(self, code="-", size="-"):
+            accessLog = self.server.accessLog
+            if accessLog.classic and accessLog.sample(code):
+                super().log_request(code, size)
+
+        @contextlib.contextmanager
+        def measureRequest(self):
+            self._responseStatus = None
+            self._responseLength = 0
+            self._headSentAt = None
+            receivedAt = time.perf_counter()
+            yield
+            if self._responseStatus is None:
+                return
+            bytesSent = self._responseLength if self.command != "HEAD" else 0
+            if self.server.metrics is not None:
+                self.server.metrics.requestFinished(self.path, self._responseStatus, bytesSent, receivedAt,
+                                                    self._headSentAt)
+            accessLog = self.server.accessLog
+            if accessLog.compact and accessLog.sample(self._responseStatus):
+                accessLog.logRequest(self.client_address[0], self.command, self.path, self._responseStatus, bytesSent,
+                                     time.perf_counter() - receivedAt)
+
+        def do_GET(self):
+            with self.server.trackRequest(), self.measureRequest():
+                super().do_GET()
+
+        def do_HEAD(self):
+            with self.server.trackRequest(), self.measureRequest():
+                super().do_HEAD()
+
+        def do_POST(self):
+            # Only server endpoints accept POST; the request body is discarded
+            contentLength = self.headers.get("Content-Length", "0").strip()
+            if not (contentLength.isascii() and contentLength.isdigit()):
+                self.send_error(HTTPStatus.BAD_REQUEST, f"Bad Content-Length ({contentLength!r})")
+                self.close_connection = True
+                return
+            if int(contentLength) > self.MAX_REQUEST_BODY_BYTES:
+                self.send_error(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Request body too large")
+                self.close_connection = True
+                return
+            self.rfile.read(int(contentLength))
+            self.do_GET()
+
+        def send_head(self):
+            response = self.server.content.resolve(self.command, self.path, self.headers)
+            if response is None:
+                # Directory without an index file: let SimpleHTTPRequestHandler list it
+                return super().send_head()
+            if response.message is not None:
+                self.log_error("code %d, message %s", response.status, response.message)
+            self.send_response(response.status)
+            for name, value in response.headers:
+                self.send_header(name, value)
+            self.end_headers()
+            return response
+
+        def copyfile(self, source, outputfile):
+            if isinstance(source, StaticResponse):
+                self._writeBody(source.body, outputfile)
+                return
+            if isinstance(source, io.BytesIO):
+                # In-memory bodies (e.g. directory listings) are written in one go
+                outputfile.write(source.read())
+                return
+            shutil.copyfileobj(source, outputfile, self.COPY_BUFFER_SIZE)
+
+        def _writeBody(self, body, outputfile):
+            shaper = self.server.shaper
+            if shaper is not None and shaper.active:
+                clientIp = self.client_address[0]
+                for chunk in iterBodyChunks(body, shaper.CHUNK_SIZE):
+                    delay = shaper.reserve(clientIp, len(chunk))
+                    if delay > 0:
+                        time.sleep(delay)
+                    outputfile.write(chunk)
+                return
+            if isinstance(body, FileBody) and self.server.useSendfile and outputfile is self.wfile:
+                # Let the kernel move the body straight from the page cache to the socket.
+                # socket.sendfile() falls back to plain send() for anything os.sendfile()
+                # can't handle
+                self.connection.sendfile(body.file, body.offset, body.count)
+            elif isinstance(body, FileBody):
+                for chunk in iterBodyChunks(body, self.COPY_BUFFER_SIZE):
+                    outputfile.write(chunk)
+            elif isinstance(body, MappedBody):
+                outputfile.write(body.view)
+            elif body is not None:
+                # Cached bodies are written straight from the cached bytes
+                outputfile.write(body)
 
 if __name__ == "__main__":
 
@@ -50,10 +276,124 @@ if __name__ == "__main__":
                         help="port number where to accept connections")
     parser.add_argument("--content-path", type=str, nargs="?", default=DEFAULT_CONTENT_PATH,
                         help="path to content to be served")
+    parser.add_argument("--engine", type=str, choices=["threading", "asyncio"], default="threading",
+                        help="serve connections from a thread each (threading) or from a single event loop (asyncio)")
+    parser.add_argument("--sendfile", action=argparse.BooleanOptionalAction, default=True,
+                        help="send file bodies with sendfile(2) instead of copying them through user space")
+    parser.add_argument("--cache-size", type=int, nargs="?", default=0,
+                        help="size in megabytes of the in-memory segment/manifest cache (0 disables it)")
+    parser.add_argument("--index", action=argparse.BooleanOptionalAction, default=True,
+                        help="index the content path at startup and serve requests from the index "
+                             "(reload with SIGHUP, see also --index-control)")
+    parser.add_argument("--index-control", action=argparse.BooleanOptionalAction, default=False,
+                        help="let the index be reloaded through POST /_server/index/reload; the endpoint is "
+                             "unauthenticated and every call rescans the content path, enable it on trusted "
+                             "networks only (needs --index)")
+    parser.add_argument("--workers", type=int, nargs="?", default=1,
+                        help="number of pre-forked server processes sharing the port through SO_REUSEPORT")
+    parser.add_argument("--rate-limit", type=BandwidthShaper.parseRate, nargs="?", default=None,
+                        help="total bandwidth shared by all clients, e.g. 20mbit (see --shaping-control)")
+    parser.add_argument("--client-rate-limit", type=BandwidthShaper.parseRate, nargs="?", default=None,
+                        help="bandwidth of each client IP, e.g. 4mbit (see --shaping-control)")
+    parser.add_argument("--shaping-control", action=argparse.BooleanOptionalAction, default=False,
+                        help="let the rate limits be changed at runtime through /_server/shaping; "
+                             "the endpoint is unauthenticated, enable it on trusted networks only")
+    parser.add_argument("--metrics", action=argparse.BooleanOptionalAction, default=True,
+                        help="collect request metrics and expose them at /metrics (Prometheus text format)")
+    parser.add_argument("--access-log", type=str, choices=AccessLog.FORMATS, default="classic",
+                        help="request log format: http.server's request line (classic), one structured line "
+                             "per finished request with bytes and duration (compact) or none (off)")
+    parser.add_argument("--access-log-sample", type=float, nargs="?", default=1.0,
+                        help="fraction of requests to log; error responses are always logged")
+    parser.add_argument("--cache-profile", type=str, choices=list(CachePolicy.PROFILES), default="default",
+                        help="Cache-Control policy: long-lived segments, short-lived playlists and an uncached "
+                             "player (default) or nothing cached at all (grader)")
+    parser.add_argument("--cache-rule", type=CacheRule.parse, action="append", default=[],
+                        help="PATTERN=CACHE-CONTROL rule taking precedence over the profile, "
+                             "e.g. '*.ts=public, max-age=600' (repeatable)")
+    parser.add_argument("--max-connections", type=int, nargs="?", default=None,
+                        help="concurrent connections to serve; further ones get a 503 with Retry-After")
+    parser.add_argument("--idle-timeout", type=float, nargs="?", default=None,
+                        help="seconds after which idle keep-alive (and stalled) connections are closed")
+    parser.add_argument("--retry-after", type=int, nargs="?", default=1,
+                        help="Retry-After seconds sent with the 503 of shed connections")
+    parser.add_argument("--backlog", type=int, nargs="?", default=None,
+                        help="length of the queue of connections waiting to be accepted")
+    parser.add_argument("--synthetic-titles", type=int, nargs="?", default=0,
+                        help="number of virtual titles generated under /synthetic/ for load tests (0 disables them)")
+    parser.add_argument("--synthetic-seed", type=int, nargs="?", default=0,
+                        help="seed the virtual titles are generated from")
+    parser.add_argument("--live", action=argparse.BooleanOptionalAction, default=False,
+                        help="also serve every title as a looping live stream under /live/ (needs --index)")
+    parser.add_argument("--live-window", type=int, nargs="?", default=6,
+                        help="number of segments in live media playlists")
+    parser.add_argument("--compress", action=argparse.BooleanOptionalAction, default=False,
+                        help="send playlists and player assets gzip/brotli encoded to clients that accept it")
 
     args = parser.parse_args()
 
-    with WebServer(host=args.host, port=args.port, contentPath=args.content_path) as httpd:
-        httpd.serve_forever()
+    cacheSize = args.cache_size * 1024 * 1024
+
+    # Built once up front so that pre-forked workers share the index copy-on-write
+    content = StaticContent(args.content_path,
+                            segmentCache=SegmentCache(cacheSize) if cacheSize > 0 else None,
+                            useIndex=args.index,
+                            compressedAssets=CompressedAssetStore() if args.compress else None)
+
+    if args.index_control:
+        if content.contentIndex is None:
+            parser.error("--index-control needs --index")
+        content.addIndexReloadEndpoint()
+
+    if args.live:
+        if content.contentIndex is None:
+            parser.error("--live needs --index")
+        LiveContent(content, windowSize=args.live_window)
+
+    if args.synthetic_titles > 0:
+        SyntheticContent(content, args.synthetic_titles, seed=args.synthetic_seed)
+
+    shaper = BandwidthShaper(globalRate=args.rate_limit, perClientRate=args.client_rate_limit)
+    if args.shaping_control:
+        shaper.addControlEndpoint(content)
+
+    accessLog = AccessLog(args.access_log, args.access_log_sample)
+    cachePolicy = CachePolicy(args.cache_profile, args.cache_rule)
+
+    metrics = ServerMetrics() if args.metrics else None
+    if metrics is not None:
+        metrics.addEndpoint(content)
+
+    limiter = ConnectionLimiter(maxConnections=args.max_connections, idleTimeout=args.idle_timeout,
+                                retryAfter=args.retry_after, metrics=metrics)
+    limiter.addEndpoint(content)
+
+    def makeServer():
+        if args.engine == "asyncio":
+            return AsyncWebServer(host=args.host, port=args.port, content=content,
+                                  extraHeaders=WebServer.RequestHandler.EXTRA_HEADERS,
+                                  useSendfile=args.sendfile, reusePort=args.workers > 1, shaper=shaper,
+                                  metrics=metrics, accessLog=accessLog, cachePolicy=cachePolicy,
+                                  limiter=limiter, backlog=args.backlog)
+        return WebServer(host=args.host, port=args.port, contentPath=args.content_path,
+                         useSendfile=args.sendfile, content=content, reusePort=args.workers > 1, shaper=shaper,
+                         metrics=metrics, accessLog=accessLog, cachePolicy=cachePolicy,
+                         limiter=limiter, backlog=args.backlog)
+
+    if content.contentIndex is not None:
+        signal.signal(signal.SIGHUP, lambda signum, frame: content.contentIndex.reload())
+
+    # Request threads only enqueue log records; formatting and writing happen
+    # on the listener threads
+    with QueuedLogging(logging.getLogger(), accessLog.logger):
+        if args.workers > 1:
+            WorkerPool(args.workers, makeServer).run()
+        else:
+            with makeServer() as httpd:
+                # Stop gracefully so that queued log records get written; shutdown()
+                # can't be called from the thread serving
+                signal.signal(signal.SIGTERM,
+                              lambda signum, frame: threading.Thread(target=httpd.shutdown, daemon=True).start())
+                httpd.serve_forever()
 
     logging.info(f"{args.host}:{args.port} shutting down")